@@ -0,0 +1,24 @@
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.aggregates import ACCUMULATORS, AGGREGATES_PATH, build_aggregates, read_aggregates
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compute every registered corpus aggregate in one pass and save them as one bundle."
+    )
+    parser.add_argument("--output", type=Path, default=AGGREGATES_PATH, help="Bundle file to write.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the bundle is up to date.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.force and read_aggregates(args.output) is not None:
+        print(f"✅ {args.output} is up to date")
+    else:
+        results = build_aggregates(args.output)
+        for name in ACCUMULATORS:
+            print(f"  {name}: {len(results[name]):,} entries")
+        print(f"✅ Saved aggregates to {args.output}")
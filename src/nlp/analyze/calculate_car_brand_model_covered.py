@@ -1,34 +1,36 @@
-import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.car_relevance import iter_car_records
+from utils.corpus_io import corpus_files
+
 DATA_DIR = Path("data/preprocessed_data")
 
 unique_brands = set()
 unique_models = set()
 
-for file in DATA_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            # Collect brands and models from title and selftext ner_entities
-            for section in ["preprocessed_title", "preprocessed_selftext"]:
-                ner_entities = post.get(section, {}).get("ner_entities", [])
-                for sentence_entities in ner_entities:
-                    for ent in sentence_entities:
-                        if ent.get("entity_group") == "CAR_BRAND":
-                            unique_brands.add(ent.get("word", "").lower())
-                        elif ent.get("entity_group") == "CAR_MODEL":
-                            unique_models.add(ent.get("word", "").lower())
+for file in corpus_files(DATA_DIR):
+    for post in iter_car_records(file):
+        # Collect brands and models from title and selftext ner_entities
+        for section in ["preprocessed_title", "preprocessed_selftext"]:
+            ner_entities = post.get(section, {}).get("ner_entities", [])
+            for sentence_entities in ner_entities:
+                for ent in sentence_entities:
+                    if ent.get("entity_group") == "CAR_BRAND":
+                        unique_brands.add(ent.get("word", "").lower())
+                    elif ent.get("entity_group") == "CAR_MODEL":
+                        unique_models.add(ent.get("word", "").lower())
 
-            # Collect from comments ner_entities
-            for comment in post.get("comments", []):
-                ner_entities = comment.get("preprocessed_body", {}).get("ner_entities", [])
-                for sentence_entities in ner_entities:
-                    for ent in sentence_entities:
-                        if ent.get("entity_group") == "CAR_BRAND":
-                            unique_brands.add(ent.get("word", "").lower())
-                        elif ent.get("entity_group") == "CAR_MODEL":
-                            unique_models.add(ent.get("word", "").lower())
+        # Collect from comments ner_entities
+        for comment in post.get("comments", []):
+            ner_entities = comment.get("preprocessed_body", {}).get("ner_entities", [])
+            for sentence_entities in ner_entities:
+                for ent in sentence_entities:
+                    if ent.get("entity_group") == "CAR_BRAND":
+                        unique_brands.add(ent.get("word", "").lower())
+                    elif ent.get("entity_group") == "CAR_MODEL":
+                        unique_models.add(ent.get("word", "").lower())
 
 print(f"Number of unique car brands detected: {len(unique_brands)}")
 print(f"Number of unique car models detected: {len(unique_models)}")
\ No newline at end of file
@@ -1,57 +1,18 @@
 import os
+import sys
 import json
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import Counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.aggregates import get_aggregate
 
 # Config
-INPUT_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path("data/issue_analysis")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-PROBLEM_KEYWORDS = {
-    "stall", "leak", "fail", "noise", "noisy", "grind", "overheat", "jerk",
-    "won't start", "not starting", "dies", "check engine", "misfire",
-    "vibration", "rattle", "burning", "smell", "warning light", "drain", "hard shift"
-}
-
-# Normalize multi-word expressions
-normalized_keywords = {kw.lower(): kw for kw in PROBLEM_KEYWORDS}
-single_keywords = {kw for kw in PROBLEM_KEYWORDS if " " not in kw}
-multi_keywords = {kw for kw in PROBLEM_KEYWORDS if " " in kw}
-
-issue_counter = Counter()
-
-def check_sentence_for_issue(tokens):
-    joined = " ".join(tokens)
-    found = []
-    for phrase in multi_keywords:
-        if phrase in joined:
-            found.append(phrase)
-    for token in tokens:
-        if token in single_keywords:
-            found.append(token)
-    return found
-
-def process_post(post):
-    all_sections = [
-        post.get("preprocessed_title", {}).get("cleaned_sentences_tokens", []),
-        post.get("preprocessed_selftext", {}).get("cleaned_sentences_tokens", []),
-    ]
-    for comment in post.get("comments", []):
-        all_sections.append(comment.get("preprocessed_body", {}).get("cleaned_sentences_tokens", []))
-
-    for section in all_sections:
-        for tokens in section:
-            issues = check_sentence_for_issue(tokens)
-            for issue in issues:
-                issue_counter[issue] += 1
-
-# Run on all preprocessed files
-for file in INPUT_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            process_post(post)
+# Problem keyword counts from the shared aggregates bundle (see utils/problem_keywords.py)
+issue_counter = Counter(get_aggregate("issue_counts"))
 
 # Save output
 output_file = OUTPUT_DIR / "issue_frequencies.json"
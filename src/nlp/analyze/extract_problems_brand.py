@@ -1,28 +1,27 @@
 import os
+import sys
 import json
 from pathlib import Path
 from collections import Counter
-import matplotlib.pyplot as plt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.car_catalog import get_catalog
+from utils.car_relevance import iter_car_records
+from utils.corpus_io import corpus_files
+from utils.entity_index import entity_index_available, matching_post_sentences
+from utils.problem_keywords import check_sentence_for_issue
 
 # === Ask for input ===
-brand = input("Enter car brand (e.g., toyota): ").strip().lower()
-model = input("Enter car model (leave blank for whole brand): ").strip().lower()
+catalog = get_catalog()
+brand = catalog.canonical_brand(input("Enter car brand (e.g., toyota): ").strip())
+model = input("Enter car model (leave blank for whole brand): ").strip()
+model = catalog.canonical_model(model, brand) if model else ""
 
 # === Config ===
 INPUT_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path(f"data/issue_analysis/{brand}")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-PROBLEM_KEYWORDS = {
-    "stall", "leak", "fail", "noise", "noisy", "grind", "overheat", "jerk",
-    "won't start", "not starting", "dies", "check engine", "misfire",
-    "vibration", "rattle", "burning", "smell", "warning light", "drain", "hard shift"
-}
-
-normalized_keywords = {kw.lower(): kw for kw in PROBLEM_KEYWORDS}
-single_keywords = {kw for kw in PROBLEM_KEYWORDS if " " not in kw}
-multi_keywords = {kw for kw in PROBLEM_KEYWORDS if " " in kw}
-
 issue_counter = Counter()
 
 def contains_brand_model(entities):
@@ -36,17 +35,6 @@ def contains_brand_model(entities):
                 found_model = True
     return found_brand and found_model
 
-def check_sentence_for_issue(tokens):
-    joined = " ".join(tokens)
-    found = []
-    for phrase in multi_keywords:
-        if phrase in joined:
-            found.append(phrase)
-    for token in tokens:
-        if token in single_keywords:
-            found.append(token)
-    return found
-
 def process_post(post):
     if not (
         contains_brand_model(post.get("preprocessed_title", {}).get("ner_entities", [])) or
@@ -69,11 +57,14 @@ def process_post(post):
             for issue in issues:
                 issue_counter[issue] += 1
 
-# === Run on all preprocessed files ===
-for file in INPUT_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
+# === Run on the posts the entity index points to, or on all preprocessed files ===
+if entity_index_available():
+    for tokens in matching_post_sentences(brand, model):
+        for issue in check_sentence_for_issue(tokens):
+            issue_counter[issue] += 1
+else:
+    for file in corpus_files(INPUT_DIR):
+        for post in iter_car_records(file):
             process_post(post)
 
 # === Save full issue frequencies ===
@@ -90,7 +81,8 @@ if issue_counter:
     with open(top_json_path, "w", encoding="utf-8") as f:
         json.dump(top_issues_json, f, indent=2)
 
-    # Plot top 10 issues
+    # Plot top 10 issues (matplotlib is only imported when there is something to plot)
+    import matplotlib.pyplot as plt
     labels, counts = zip(*top_issues)
 
     plt.figure(figsize=(10, 6))
@@ -1,12 +1,12 @@
 import os
+import sys
 import json
 from pathlib import Path
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-import matplotlib.pyplot as plt
-import pandas as pd
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.corpus_io import corpus_files, iter_records
+
 # Paths
 DATA_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path("data/topic_modeling")
@@ -15,21 +15,22 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 # Collect all sentences from cleaned_sentences_tokens
 corpus = []
 
-for file in tqdm(list(DATA_DIR.glob("*.json")), desc="🔍 Loading data"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            for section in ["preprocessed_title", "preprocessed_selftext"]:
-                for sent in post.get(section, {}).get("cleaned_sentences_tokens", []):
-                    corpus.append(" ".join(sent))
-            for comment in post.get("comments", []):
-                for sent in comment.get("preprocessed_body", {}).get("cleaned_sentences_tokens", []):
-                    corpus.append(" ".join(sent))
+for file in tqdm(corpus_files(DATA_DIR), desc="🔍 Loading data"):
+    for post in iter_records(file):
+        for section in ["preprocessed_title", "preprocessed_selftext"]:
+            for sent in post.get(section, {}).get("cleaned_sentences_tokens", []):
+                corpus.append(" ".join(sent))
+        for comment in post.get("comments", []):
+            for sent in comment.get("preprocessed_body", {}).get("cleaned_sentences_tokens", []):
+                corpus.append(" ".join(sent))
 
 if not corpus:
     print("⚠️ No sentences found in corpus. Please check your preprocessed data.")
     exit()
 
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.decomposition import LatentDirichletAllocation
+
 print("🧠 Vectorizing...")
 # Vectorize the text data
 vectorizer = CountVectorizer(max_df=0.95, min_df=5, stop_words='english')
@@ -55,6 +56,9 @@ with open(OUTPUT_DIR / "lda_topics.json", "w", encoding="utf-8") as f:
     json.dump(topics, f, indent=2)
 
 # Plot topics as table
+import matplotlib.pyplot as plt
+import pandas as pd
+
 plt.figure(figsize=(10, 6))
 topic_df = pd.DataFrame.from_dict(topics, orient='index', columns=[f"Word {i+1}" for i in range(10)])
 plt.table(cellText=topic_df.values, rowLabels=topic_df.index, colLabels=topic_df.columns, loc='center')
@@ -1,13 +1,16 @@
 import os
-import json
+import sys
 from pathlib import Path
 from collections import Counter
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.car_catalog import get_catalog
+from utils.sentiment_store import iter_sentiment_posts
+from utils.entity_index import entity_index_available, matching_sentences
 
 # --- Config ---
 SENTIMENT_DIR = Path("data/sentiment_analysis")
-TARGET_BRAND = input("🔍 Enter car brand to validate (e.g., kia): ").strip().lower()
+TARGET_BRAND = get_catalog().canonical_brand(input("🔍 Enter car brand to validate (e.g., kia): ").strip())
 VISUAL_PATH = Path(f"data/visualizations/brand_validation")
 VISUAL_PATH.mkdir(parents=True, exist_ok=True)
 
@@ -22,9 +25,16 @@ def extract_sentences_and_entities(section):
     min_len = min(len(sentiments), len(entities))
     return zip(sentiments[:min_len], entities[:min_len])
 
+BRAND_ENTITY_GROUPS = ("CAR_BRAND", "ORG", "MISC")
+
 def match_brand(ent):
     word = ent.get("word", "").lower()
-    return word == TARGET_BRAND and ent.get("entity_group") in {"CAR_BRAND", "ORG", "MISC"}
+    return word == TARGET_BRAND and ent.get("entity_group") in BRAND_ENTITY_GROUPS
+
+def record_negative(sentence):
+    negative_sentences.append(sentence)
+    for word in sentence.split():
+        negative_keywords[word.lower()] += 1
 
 def process_post(post):
     for key in ["title_sentiment", "selftext_sentiment"]:
@@ -32,9 +42,7 @@ def process_post(post):
         for sent, ents in extract_sentences_and_entities(section):
             if sent.get("category") == "negative":
                 if any(match_brand(e) for e in ents):
-                    negative_sentences.append(sent["sentence"])
-                    for word in sent["sentence"].split():
-                        negative_keywords[word.lower()] += 1
+                    record_negative(sent["sentence"])
 
     for comment in post.get("comments_sentiment", []):
         sentiments = comment.get("sentiment", {}).get("sentence_sentiments", [])
@@ -43,17 +51,19 @@ def process_post(post):
         for sent, ents in zip(sentiments[:min_len], entities[:min_len]):
             if sent.get("category") == "negative":
                 if any(match_brand(e) for e in ents):
-                    negative_sentences.append(sent["sentence"])
-                    for word in sent["sentence"].split():
-                        negative_keywords[word.lower()] += 1
+                    record_negative(sent["sentence"])
 
 # --- Run ---
 print(f"\n📂 Scanning {SENTIMENT_DIR} for mentions of: {TARGET_BRAND}\n")
-for file in SENTIMENT_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            process_post(post)
+if entity_index_available():
+    # Only the sentences the entity index lists for the brand are read
+    terms = [(group, TARGET_BRAND) for group in BRAND_ENTITY_GROUPS]
+    for row in matching_sentences(any_of=terms, columns=["tokens", "category"]):
+        if row["category"] == "negative":
+            record_negative(" ".join(row["tokens"]))
+else:
+    for post in iter_sentiment_posts(SENTIMENT_DIR):
+        process_post(post)
 
 total = len(negative_sentences)
 print(f"\n🔎 Found {total} negative sentence(s) mentioning '{TARGET_BRAND}'\n")
@@ -64,6 +74,7 @@ for s in negative_sentences[:20]:
 
 # --- Word Cloud ---
 if total > 0:
+    from wordcloud import WordCloud
     wc = WordCloud(width=800, height=400, background_color="white")
     wc.generate_from_frequencies(negative_keywords)
     out_path = VISUAL_PATH / f"{TARGET_BRAND}_negative_wordcloud.png"
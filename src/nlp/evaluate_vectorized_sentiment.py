@@ -0,0 +1,76 @@
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.corpus_io import corpus_files, iter_records
+from sentiment_engine import SCORE_KEYS, get_analyzer
+from sentiment_analysis import INPUT_DIR, categorize_sentiment, post_sentences
+
+# Uniform sample of `size` joined cleaned sentences from the preprocessed files (reservoir sampling).
+def sample_sentences(size, seed):
+    rng = random.Random(seed)
+    sample = []
+    seen = 0
+    for file_path in corpus_files(INPUT_DIR):
+        print(f"📥 Sampling {file_path.name}")
+        for post in iter_records(file_path):
+            for sentence in post_sentences(post):
+                seen += 1
+                if len(sample) < size:
+                    sample.append(sentence)
+                else:
+                    slot = rng.randrange(seen)
+                    if slot < size:
+                        sample[slot] = sentence
+    return sample
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the vectorized VADER scorer with polarity_scores().")
+    parser.add_argument("--sample", type=int, default=50000, help="Number of preprocessed sentences to sample.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--max-compound-diff", type=float, default=None,
+                        help="Exit with status 1 if any compound score differs from the reference by more than this.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sentences = sample_sentences(args.sample, args.seed)
+    print(f"🔎 Comparing on {len(sentences):,} sampled sentences")
+
+    sia = get_analyzer()
+    start = time.perf_counter()
+    reference = [tuple(sia.polarity_scores(sentence)[key] for key in SCORE_KEYS) for sentence in sentences]
+    reference_seconds = time.perf_counter() - start
+
+    # Building the lookup arrays is a one-off cost per process and not part of the timed run
+    from vader_vectorized import VectorizedVader
+    vectorized = VectorizedVader(sia)
+    start = time.perf_counter()
+    scores = vectorized.score(sentences)
+    seconds = time.perf_counter() - start
+
+    compound = SCORE_KEYS.index("compound")
+    diffs = [abs(ref[compound] - got[compound]) for ref, got in zip(reference, scores)]
+    identical = sum(ref == got for ref, got in zip(reference, scores))
+    same_category = sum(
+        categorize_sentiment(ref[compound]) == categorize_sentiment(got[compound]) for ref, got in zip(reference, scores)
+    )
+    total = len(sentences) or 1
+    print(f"vader      {len(sentences) / reference_seconds:10.1f} sentences/s")
+    print(f"vectorized {len(sentences) / seconds:10.1f} sentences/s ({reference_seconds / seconds:.1f}x)")
+    print(f"identical scores: {identical:,} ({identical / total:.2%}), same category: {same_category / total:.2%}")
+    print(f"compound difference: max {max(diffs, default=0.0):.4f}, mean {sum(diffs) / total:.6f}")
+    worst = sorted(range(len(sentences)), key=lambda i: diffs[i], reverse=True)[:5]
+    for i in worst:
+        if diffs[i] > 0:
+            print(f"  {reference[i][compound]:+.4f} vs {scores[i][compound]:+.4f}: {sentences[i][:100]}")
+
+    if args.max_compound_diff is not None and max(diffs, default=0.0) > args.max_compound_diff:
+        print(f"❌ Compound scores differ by more than {args.max_compound_diff}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
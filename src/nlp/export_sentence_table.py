@@ -0,0 +1,34 @@
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.sentence_table import (
+    PREPROCESSED_DIR, SENTIMENT_DIR, SENTENCE_TABLE_PATH, build_sentence_table, sentence_table_available
+)
+from utils.entity_index import ENTITY_INDEX_PATH, build_entity_index, entity_index_available
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Flatten preprocessed and sentiment output into a columnar sentence table (Parquet) "
+                    "and build the entity index over it."
+    )
+    parser.add_argument("--output", type=Path, default=SENTENCE_TABLE_PATH, help="Parquet file to write.")
+    parser.add_argument("--index", type=Path, default=ENTITY_INDEX_PATH, help="Entity index file to write.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the table and index are up to date.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.force and sentence_table_available(args.output):
+        print(f"✅ {args.output} is up to date")
+    else:
+        rows = build_sentence_table(args.output, PREPROCESSED_DIR, SENTIMENT_DIR)
+        print(f"✅ Saved {rows:,} sentences to {args.output}")
+
+    if not args.force and entity_index_available(args.index, args.output):
+        print(f"✅ {args.index} is up to date")
+    else:
+        header = build_entity_index(args.index, args.output)
+        terms = sum(len(words) for words in header["postings"]["sentence"].values())
+        print(f"✅ Indexed {terms:,} entities over {header['sentences']:,} sentences in {args.index}")
@@ -0,0 +1,214 @@
+# Calibration of preprocessing parallelism for the machine it runs on.
+#
+#   python src/nlp/preprocess/calibration.py [--sample-threads 400] [--batch-sizes 16 32 64]
+#
+# Throughput depends on how the CPUs are split between worker processes and torch
+# intra-op threads, and on the NER batch size. The calibration benchmarks every
+# workers x threads x batch size combination that fits the CPU count on a sample of the
+# raw threads, each in a fresh subprocess, and records sentences/second and peak RSS.
+# The fastest combination (within --max-rss-mb, if given) is saved in
+# data/cache/calibration.json under the node type (machine, CPU count, memory) and the
+# NER profile/backend it was measured with. preprocess.py picks it up for any of
+# --workers, --torch-threads and --batch-size not given on the command line.
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.checkpoint import atomic_write_json
+from utils.corpus_io import RecordWriter, iter_chunks, iter_records
+
+CALIBRATION_PATH = Path("data/cache/calibration.json")
+# Bumped whenever the benchmark or the saved settings change meaning
+CALIBRATION_VERSION = 1
+RAW_REDDIT_DIR = Path("data/raw_data")
+RAW_CARTALK_FILE = Path("data/raw_data/cartalk_general_discussion.json")
+# Threads per benchmark chunk; the first chunk of each run is treated as warm-up
+CALIBRATION_CHUNK_SIZE = 8
+
+def total_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+# Identifies a node type: nodes with the same architecture, CPU count and memory share settings.
+def node_signature() -> str:
+    return f"{platform.machine()}|cpus:{os.cpu_count()}|mem_mb:{total_memory_mb()}"
+
+def settings_key(ner_profile: str, ner_backend: str) -> str:
+    return f"{ner_profile}|{ner_backend}"
+
+def read_calibration(path=CALIBRATION_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    if calibration.get("calibration_version") != CALIBRATION_VERSION:
+        return {}
+    return calibration
+
+# Best {workers, torch_threads, batch_size} saved for this node type, or None if not calibrated.
+def load_calibration(ner_profile: str, ner_backend: str, path=CALIBRATION_PATH):
+    node = read_calibration(path).get("nodes", {}).get(node_signature(), {})
+    entry = node.get(settings_key(ner_profile, ner_backend))
+    return entry["best"] if entry else None
+
+def save_calibration(ner_profile, ner_backend, best, results, path=CALIBRATION_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    calibration = read_calibration(path) or {"calibration_version": CALIBRATION_VERSION, "nodes": {}}
+    calibration["nodes"].setdefault(node_signature(), {})[settings_key(ner_profile, ner_backend)] = {
+        "best": best,
+        "results": results,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    atomic_write_json(path, calibration, indent=2)
+
+def count_sentences(records) -> int:
+    total = 0
+    for record in records:
+        total += len(record["preprocessed_title"]["cleaned_sentences_tokens"])
+        total += len(record["preprocessed_selftext"]["cleaned_sentences_tokens"])
+        for comment in record["comments"]:
+            total += len(comment["preprocessed_body"]["cleaned_sentences_tokens"])
+    return total
+
+def powers_of_two(limit):
+    value = 1
+    while value <= limit:
+        yield value
+        value *= 2
+
+# (workers, torch_threads) pairs that do not oversubscribe the CPUs.
+def parallelism_grid(cpus, workers=None, threads=None):
+    workers = workers or list(powers_of_two(cpus))
+    threads = threads or list(powers_of_two(cpus))
+    return [(w, t) for w in workers for t in threads if w * t <= cpus]
+
+# Writes the first `sample_threads` raw threads of one source to a JSONL file for the benchmark runs.
+def write_sample(path, sample_threads):
+    reddit_files = sorted(RAW_REDDIT_DIR.glob("reddit_*.json"))
+    source, files = ("reddit", reddit_files) if reddit_files else ("cartalk", [RAW_CARTALK_FILE])
+    threads = (thread for file_path in files if file_path.exists() for thread in iter_records(file_path))
+    with RecordWriter(path) as writer:
+        written = 0
+        for thread in islice(threads, sample_threads):
+            writer.write(thread)
+            written += 1
+    return source, written
+
+# One benchmark run in this process. Throughput is measured after the first chunk, so model
+# loading and worker start-up are not counted.
+def run_benchmark(sample_path, source, workers, torch_threads, batch_size, ner_profile, ner_backend):
+    from preprocess import iter_preprocessed_chunks
+    from lemma_cache import LEMMA_SNAPSHOT_PATH
+    from ner_batching import NER_MAX_BATCH_TOKENS
+
+    threads = list(iter_records(sample_path))
+    tasks = ((chunk, None) for chunk in iter_chunks(threads, CALIBRATION_CHUNK_SIZE))
+    lemma_snapshot = LEMMA_SNAPSHOT_PATH if LEMMA_SNAPSHOT_PATH.exists() else None
+    start = None
+    sentences = 0
+    for chunk_result in iter_preprocessed_chunks(tasks, source, batch_size, NER_MAX_BATCH_TOKENS, workers,
+                                                 torch_threads, None, ner_profile, lemma_snapshot, None, ner_backend):
+        if start is None:
+            start = time.perf_counter()
+            continue
+        sentences += count_sentences(chunk_result)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+
+    # ru_maxrss is in KiB on Linux. For pools, count every worker at the largest one's peak.
+    own_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if workers > 1 else 0
+    return {
+        "workers": workers,
+        "torch_threads": torch_threads,
+        "batch_size": batch_size,
+        "sentences": sentences,
+        "sentences_per_second": round(sentences / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round((own_rss + workers * worker_rss) / 1024, 1),
+    }
+
+# Runs one combination in a fresh interpreter, so torch thread settings and memory peaks
+# of earlier combinations do not leak into it.
+def run_isolated(sample_path, source, workers, torch_threads, batch_size, args):
+    command = [
+        sys.executable, str(Path(__file__).resolve()), "--run-one", "--sample-file", str(sample_path),
+        "--source", source, "--workers", str(workers), "--threads", str(torch_threads),
+        "--batch-sizes", str(batch_size), "--ner-profile", args.ner_profile, "--ner-backend", args.ner_backend,
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def parse_args():
+    from ner_cascade import NER_PROFILES, DEFAULT_NER_PROFILE
+    from ner_backends import NER_BACKENDS, DEFAULT_NER_BACKEND
+    parser = argparse.ArgumentParser(description="Benchmark and save the best preprocessing parallelism settings.")
+    parser.add_argument("--sample-threads", type=int, default=400, help="Raw threads in the benchmark sample.")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Worker counts to try (default: powers of two up to the CPU count).")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="Torch threads per worker to try (default: powers of two up to the CPU count).")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64],
+                        help="NER batch sizes to try.")
+    parser.add_argument("--max-rss-mb", type=float, default=None,
+                        help="Ignore combinations whose peak RSS exceeds this.")
+    parser.add_argument("--ner-profile", choices=NER_PROFILES, default=DEFAULT_NER_PROFILE)
+    parser.add_argument("--ner-backend", choices=NER_BACKENDS, default=DEFAULT_NER_BACKEND)
+    parser.add_argument("--output", type=Path, default=CALIBRATION_PATH)
+    # Internal: run a single combination and print its result as JSON
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sample-file", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--source", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.run_one:
+        result = run_benchmark(args.sample_file, args.source, args.workers[0], args.threads[0], args.batch_sizes[0],
+                               args.ner_profile, args.ner_backend)
+        print(json.dumps(result))
+        return
+
+    cpus = os.cpu_count() or 1
+    grid = [(w, t, b) for w, t in parallelism_grid(cpus, args.workers, args.threads) for b in args.batch_sizes]
+    print(f"🎛️ Calibrating {len(grid)} combinations on {node_signature()}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = Path(tmp_dir) / "calibration_sample.jsonl"
+        source, sampled = write_sample(sample_path, args.sample_threads)
+        print(f"📥 Sampled {sampled:,} {source} threads")
+        for workers, torch_threads, batch_size in grid:
+            result = run_isolated(sample_path, source, workers, torch_threads, batch_size, args)
+            if result is None:
+                print(f"⚠️ workers={workers} threads={torch_threads} batch={batch_size} failed")
+                continue
+            results.append(result)
+            print(f"workers={workers:<3} threads={torch_threads:<3} batch={batch_size:<4} "
+                  f"{result['sentences_per_second']:9.1f} sentences/s  peak RSS {result['peak_rss_mb']:,.0f} MB")
+
+    eligible = [r for r in results if args.max_rss_mb is None or r["peak_rss_mb"] <= args.max_rss_mb]
+    if not eligible:
+        print("❌ No combination finished within the limits; nothing saved")
+        sys.exit(1)
+    best = max(eligible, key=lambda r: r["sentences_per_second"])
+    settings = {key: best[key] for key in ("workers", "torch_threads", "batch_size")}
+    save_calibration(args.ner_profile, args.ner_backend, settings, results, args.output)
+    print(f"✅ Best: {settings} at {best['sentences_per_second']:.1f} sentences/s, saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import sys
+import time
+import argparse
+
+from text_preprocessing import find_car_entities_batch, set_ner_backend, get_ner_pipeline, NER_BATCH_SIZE
+from ner_backends import NER_BACKENDS, DEFAULT_NER_BACKEND
+from evaluate_ner_profiles import sample_sentences, precision_recall
+
+def f1_score(precision: float, recall: float) -> float:
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+# Entities of every sentence with the full NER profile on one backend, and the seconds it took.
+def run_backend(sentences, backend, threads, batch_size):
+    set_ner_backend(backend, threads)
+    # Loading (or exporting) the model is not part of the timed run
+    get_ner_pipeline()
+    start = time.perf_counter()
+    entities = find_car_entities_batch(sentences, batch_size=batch_size, profile="full")
+    return entities, time.perf_counter() - start
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare NER backends against the fp32 torch model.")
+    parser.add_argument("--sample", type=int, default=2000, help="Number of raw sentences to sample.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--batch-size", type=int, default=NER_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for every backend.")
+    parser.add_argument("--backends", nargs="+", choices=[b for b in NER_BACKENDS if b != DEFAULT_NER_BACKEND],
+                        default=[b for b in NER_BACKENDS if b != DEFAULT_NER_BACKEND])
+    parser.add_argument("--min-f1", type=float, default=None,
+                        help="Exit with status 1 if any backend's entity F1 against fp32 is below this.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sentences = sample_sentences(args.sample, args.seed)
+    print(f"🔎 Evaluating on {len(sentences):,} sampled sentences")
+
+    reference, reference_seconds = run_backend(sentences, DEFAULT_NER_BACKEND, args.threads, args.batch_size)
+    print(f"{DEFAULT_NER_BACKEND:<6} {len(sentences) / reference_seconds:8.1f} sentences/s")
+
+    failed = []
+    for backend in args.backends:
+        try:
+            predicted, seconds = run_backend(sentences, backend, args.threads, args.batch_size)
+        except ImportError as e:
+            print(f"{backend:<6} skipped: {e}")
+            continue
+        precision, recall = precision_recall(reference, predicted)
+        f1 = f1_score(precision, recall)
+        print(
+            f"{backend:<6} {len(sentences) / seconds:8.1f} sentences/s ({reference_seconds / seconds:.1f}x), "
+            f"agreement with fp32: precision {precision:.3f}, recall {recall:.3f}, F1 {f1:.3f}"
+        )
+        if args.min_f1 is not None and f1 < args.min_f1:
+            failed.append(backend)
+
+    if failed:
+        print(f"❌ Below the F1 threshold of {args.min_f1}: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.corpus_io import iter_records
+
+from text_preprocessing import find_car_entities_batch, split_sentences, warm_up, NER_BATCH_SIZE
+from ner_cascade import NER_PROFILES, reset_cascade_stats, bert_share
+from incremental import iter_thread_comments
+
+RAW_REDDIT_DIR = Path("data/raw_data")
+RAW_CARTALK_FILE = Path("data/raw_data/cartalk_general_discussion.json")
+
+def raw_files():
+    files = sorted(RAW_REDDIT_DIR.glob("reddit_*.json"))
+    if RAW_CARTALK_FILE.exists():
+        files.append(RAW_CARTALK_FILE)
+    return files
+
+# Uniform sample of `size` sentences from every title, selftext and comment (reservoir sampling).
+def sample_sentences(size, seed):
+    rng = random.Random(seed)
+    sample = []
+    seen = 0
+    for file_path in raw_files():
+        print(f"📥 Sampling {file_path.name}")
+        for thread in iter_records(file_path):
+            texts = [thread.get("title", ""), thread.get("selftext", "")]
+            texts.extend(comment["body"] for comment in iter_thread_comments(thread))
+            for text in texts:
+                for sentence in split_sentences(text or ""):
+                    seen += 1
+                    if len(sample) < size:
+                        sample.append(sentence)
+                    else:
+                        slot = rng.randrange(seen)
+                        if slot < size:
+                            sample[slot] = sentence
+    return sample
+
+def entity_keys(entities, groups=None):
+    return Counter(
+        (ent["word"].lower(), ent["entity_group"]) for ent in entities
+        if groups is None or ent["entity_group"] in groups
+    )
+
+# Micro-averaged precision and recall of `predicted` against `reference` entities per sentence.
+def precision_recall(reference, predicted, groups=None):
+    true_positives = expected = found = 0
+    for ref, pred in zip(reference, predicted):
+        ref_keys, pred_keys = entity_keys(ref, groups), entity_keys(pred, groups)
+        true_positives += sum((ref_keys & pred_keys).values())
+        expected += sum(ref_keys.values())
+        found += sum(pred_keys.values())
+    precision = true_positives / found if found else 1.0
+    recall = true_positives / expected if expected else 1.0
+    return precision, recall
+
+def run_profile(sentences, profile, batch_size):
+    reset_cascade_stats()
+    start = time.perf_counter()
+    entities = find_car_entities_batch(sentences, batch_size=batch_size, profile=profile)
+    elapsed = time.perf_counter() - start
+    return entities, elapsed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the fast and cascade NER profiles against full mode.")
+    parser.add_argument("--sample", type=int, default=2000, help="Number of raw sentences to sample.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--batch-size", type=int, default=NER_BATCH_SIZE)
+    parser.add_argument("--profiles", nargs="+", choices=[p for p in NER_PROFILES if p != "full"],
+                        default=[p for p in NER_PROFILES if p != "full"])
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sentences = sample_sentences(args.sample, args.seed)
+    # Load the model up front so it does not count towards the full profile's time
+    warm_up()
+    print(f"🔎 Evaluating on {len(sentences):,} sampled sentences")
+
+    reference, full_seconds = run_profile(sentences, "full", args.batch_size)
+    print(f"full     {len(sentences) / full_seconds:8.1f} sentences/s")
+
+    car_groups = {"CAR_BRAND", "CAR_MODEL"}
+    for profile in args.profiles:
+        predicted, seconds = run_profile(sentences, profile, args.batch_size)
+        share = bert_share()
+        precision, recall = precision_recall(reference, predicted)
+        car_precision, car_recall = precision_recall(reference, predicted, car_groups)
+        print(
+            f"{profile:<8} {len(sentences) / seconds:8.1f} sentences/s ({full_seconds / seconds:.1f}x), "
+            f"BERT on {share:.1%} of sentences\n"
+            f"         all entities: precision {precision:.3f}, recall {recall:.3f}\n"
+            f"         car entities: precision {car_precision:.3f}, recall {car_recall:.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
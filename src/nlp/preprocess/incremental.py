@@ -0,0 +1,113 @@
+# Incremental preprocessing support.
+#
+# Next to every preprocessed output file we keep a manifest with the content hash
+# of each thread, its title, selftext and every comment (by comment id). On the
+# next run only new threads are preprocessed in full; for edited threads the
+# unchanged title/selftext/comments are taken from the existing output and only
+# the new or edited parts go through preprocess_sentences again.
+import sys
+import json
+import hashlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.checkpoint import atomic_write_json
+
+MANIFEST_VERSION = 1
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+# Comments with a body, in the same order the thread preprocessors emit them.
+# Works for raw threads (nested replies) and preprocessed ones (already flat).
+def iter_thread_comments(thread):
+    def recursive_iter(comments_list):
+        for comment in comments_list:
+            if comment.get("body", ""):
+                yield comment
+            yield from recursive_iter(comment.get("replies", []))
+    yield from recursive_iter(thread.get("comments", []))
+
+# Hashes of one thread and all of its parts.
+def thread_fingerprint(thread):
+    title_hash = content_hash(thread.get("title", ""))
+    selftext_hash = content_hash(thread.get("selftext", ""))
+    comments = [(comment.get("id", ""), content_hash(comment["body"])) for comment in iter_thread_comments(thread)]
+    digest = hashlib.sha256()
+    for part in [title_hash, selftext_hash] + [f"{cid}:{h}" for cid, h in comments]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\n")
+    return {
+        "hash": digest.hexdigest()[:16],
+        "title": title_hash,
+        "selftext": selftext_hash,
+        "comments": dict(comments)
+    }
+
+def manifest_path(directory, stem: str) -> Path:
+    return Path(directory) / "manifests" / f"{stem}.manifest.json"
+
+# Loads the manifest for an output file. Returns None if it is missing or was written by a
+# different preprocessing version (NER model, car catalog), which forces a full rebuild.
+def load_manifest(directory, stem: str, version: str):
+    path = manifest_path(directory, stem)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("manifest_version") != MANIFEST_VERSION or manifest.get("preprocessing_version") != version:
+        return None
+    return manifest["threads"]
+
+# Written atomically, so an interrupted run never leaves a truncated manifest behind.
+def save_manifest(directory, stem: str, version: str, threads_manifest):
+    path = manifest_path(directory, stem)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(path, {
+        "manifest_version": MANIFEST_VERSION,
+        "preprocessing_version": version,
+        "threads": threads_manifest
+    })
+
+# Splits a chunk of raw threads into ones whose existing output can be reused as-is and ones
+# that need preprocessing. For edited threads, `known` maps the text of every unchanged part
+# to its existing preprocessed result so it is not recomputed.
+def plan_incremental_update(threads, existing_by_id, manifest):
+    reused = {}
+    pending = []
+    known = {}
+    stats = {"unchanged": 0, "edited": 0, "new": 0}
+
+    for index, thread in enumerate(threads):
+        thread_id = thread.get("id", "")
+        previous = manifest.get(thread_id)
+        record = existing_by_id.get(thread_id)
+
+        if previous is None or record is None:
+            stats["new"] += 1
+            pending.append(index)
+            continue
+        fingerprint = thread_fingerprint(thread)
+        if previous["hash"] == fingerprint["hash"]:
+            stats["unchanged"] += 1
+            reused[index] = record
+            continue
+
+        stats["edited"] += 1
+        pending.append(index)
+        if previous["title"] == fingerprint["title"]:
+            known[thread.get("title", "")] = record["preprocessed_title"]
+        if previous["selftext"] == fingerprint["selftext"]:
+            known[thread.get("selftext", "")] = record["preprocessed_selftext"]
+        for comment in record.get("comments", []):
+            comment_id = comment.get("id", "")
+            current_hash = fingerprint["comments"].get(comment_id)
+            if current_hash is not None and previous["comments"].get(comment_id) == current_hash:
+                known[comment["body"]] = comment["preprocessed_body"]
+
+    return reused, pending, known, stats
+
+# Puts reused and freshly processed records of a chunk back into raw order.
+def merge_chunk(threads, reused, processed):
+    processed_iter = iter(processed)
+    return [reused[index] if index in reused else next(processed_iter) for index in range(len(threads))]
@@ -0,0 +1,82 @@
+# Memoized lemmatization over an interned vocabulary.
+#
+# Token frequencies are Zipfian: a few thousand words make up almost every WordNet lookup.
+# LemmaCache answers those from a read-only snapshot {token: lemma} of the most frequent
+# words, precomputed once and loaded by every worker, and everything else from a bounded
+# per-process LRU memo. Tokens and lemmas are interned with sys.intern, so the token lists
+# of all sentences share one string object per distinct lemma. Lemmas are identical with
+# or without the cache; it only saves repeated lookups.
+import sys
+import json
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from utils.checkpoint import atomic_write_json
+
+LEMMA_SNAPSHOT_PATH = Path("data/cache/lemma_snapshot.json")
+# Bumped whenever tokens are normalized differently before lemmatization
+LEMMA_SNAPSHOT_VERSION = 1
+LEMMA_MEMO_SIZE = 100_000
+LEMMA_SNAPSHOT_SIZE = 50_000
+
+# Running totals for the current process, reported after each file
+lemma_stats = {"lookups": 0, "snapshot_hits": 0, "misses": 0}
+
+def reset_lemma_stats():
+    for key in lemma_stats:
+        lemma_stats[key] = 0
+
+def lemma_hit_rate() -> float:
+    lookups = lemma_stats["lookups"]
+    return 1.0 - lemma_stats["misses"] / lookups if lookups else 0.0
+
+def format_lemma_report() -> str:
+    return (
+        f"lemma cache: {lemma_stats['lookups']:,} lookups, {lemma_hit_rate():.1%} hit rate "
+        f"({lemma_stats['snapshot_hits']:,} from the snapshot), {lemma_stats['misses']:,} WordNet calls"
+    )
+
+class LemmaCache:
+    def __init__(self, lemmatize_fn, max_size=LEMMA_MEMO_SIZE):
+        self.lemmatize_fn = lemmatize_fn
+        self.snapshot = {}
+        self.memo = lru_cache(maxsize=max_size)(self.compute)
+
+    def compute(self, token: str) -> str:
+        lemma_stats["misses"] += 1
+        return sys.intern(self.lemmatize_fn(token))
+
+    def lemmatize(self, token: str) -> str:
+        lemma_stats["lookups"] += 1
+        lemma = self.snapshot.get(token)
+        if lemma is not None:
+            lemma_stats["snapshot_hits"] += 1
+            return lemma
+        return self.memo(token)
+
+    def load_snapshot(self, lemmas):
+        self.snapshot = {sys.intern(token): sys.intern(lemma) for token, lemma in lemmas.items()}
+
+# Snapshot of the lemmas of the `size` most frequent tokens in `token_lists`.
+def build_lemma_snapshot(token_lists, lemmatize_fn, size=LEMMA_SNAPSHOT_SIZE):
+    counts = Counter()
+    for tokens in token_lists:
+        counts.update(tokens)
+    return {token: lemmatize_fn(token) for token, _ in counts.most_common(size)}
+
+def save_lemma_snapshot(lemmas, path=LEMMA_SNAPSHOT_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(path, {"snapshot_version": LEMMA_SNAPSHOT_VERSION, "lemmas": lemmas})
+
+# Lemmas of a saved snapshot, or None if it is missing or was built by another normalization.
+def read_lemma_snapshot(path=LEMMA_SNAPSHOT_PATH):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("snapshot_version") != LEMMA_SNAPSHOT_VERSION:
+        return None
+    return snapshot.get("lemmas")
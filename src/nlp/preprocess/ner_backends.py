@@ -0,0 +1,92 @@
+# Inference backends for the token-classification NER model.
+#
+#   torch  fp32 PyTorch model, the reference
+#   int8   the same model with its Linear layers dynamically quantized to int8 (torch only)
+#   onnx   the model exported to an ONNX Runtime graph through optimum; the export is saved
+#          under data/cache/onnx/ and reused by later runs. It is written to a temporary
+#          directory and moved into place under a lock file, so processes starting together
+#          export once and never load a half-written model.
+#
+# Every backend returns a model that the transformers "ner" pipeline accepts, so entity
+# output keeps the same structure whichever backend runs. int8 and onnx results can differ
+# slightly from fp32; evaluate_ner_backends.py measures their agreement and speed.
+import os
+import shutil
+import fcntl
+import tempfile
+from pathlib import Path
+
+NER_BACKENDS = ("torch", "int8", "onnx")
+DEFAULT_NER_BACKEND = "torch"
+ONNX_EXPORT_DIR = Path("data/cache/onnx")
+
+def validate_ner_backend(backend: str) -> str:
+    if backend not in NER_BACKENDS:
+        raise ValueError(f"Unknown NER backend '{backend}', expected one of {NER_BACKENDS}")
+    return backend
+
+def load_torch_model(model_name: str):
+    from transformers import AutoModelForTokenClassification
+    return AutoModelForTokenClassification.from_pretrained(model_name)
+
+def load_int8_model(model_name: str):
+    import torch
+    model = load_torch_model(model_name)
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def import_onnx_runtime():
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForTokenClassification
+    except ImportError:
+        raise ImportError("The onnx NER backend needs optimum and onnxruntime: pip install optimum[onnxruntime]")
+    return onnxruntime, ORTModelForTokenClassification
+
+def onnx_export_path(model_name: str, export_dir=ONNX_EXPORT_DIR) -> Path:
+    return Path(export_dir) / model_name.replace("/", "__")
+
+# Directory of the model's ONNX export, exporting it if missing. The check and export run
+# under an exclusive lock; the export is saved to a temporary directory and renamed into place.
+def ensure_onnx_export(model_name: str, export_dir=ONNX_EXPORT_DIR) -> Path:
+    export_path = onnx_export_path(model_name, export_dir)
+    if (export_path / "model.onnx").exists():
+        return export_path
+    _, ORTModelForTokenClassification = import_onnx_runtime()
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(export_path.with_name(export_path.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if (export_path / "model.onnx").exists():
+            return export_path
+        print(f"📦 Exporting {model_name} to ONNX in {export_path}")
+        tmp_path = Path(tempfile.mkdtemp(prefix=f".{export_path.name}.", dir=export_path.parent))
+        try:
+            ORTModelForTokenClassification.from_pretrained(model_name, export=True).save_pretrained(tmp_path)
+            # Left behind by an export interrupted before exports were atomic
+            if export_path.exists():
+                shutil.rmtree(export_path)
+            os.replace(tmp_path, export_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+    return export_path
+
+# ONNX Runtime model, exported on first use. `threads` sets the intra-op thread count.
+def load_onnx_model(model_name: str, threads=None, export_dir=ONNX_EXPORT_DIR):
+    onnxruntime, ORTModelForTokenClassification = import_onnx_runtime()
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+    export_path = ensure_onnx_export(model_name, export_dir)
+    return ORTModelForTokenClassification.from_pretrained(export_path, session_options=session_options)
+
+def load_ner_model(model_name: str, backend: str = DEFAULT_NER_BACKEND, threads=None):
+    validate_ner_backend(backend)
+    if backend == "onnx":
+        return load_onnx_model(model_name, threads)
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    if backend == "int8":
+        return load_int8_model(model_name)
+    return load_torch_model(model_name)
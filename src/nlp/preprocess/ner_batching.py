@@ -0,0 +1,62 @@
+# Length-bucketed batch scheduling for the NER pipeline.
+#
+# Sentences are sorted by their BERT token length and packed into batches whose
+# padded size (longest member x batch size) stays under a token budget, so short
+# sentences are never padded up to a long one.
+
+# Default padded-token budget per NER forward pass
+NER_MAX_BATCH_TOKENS = 4096
+
+# Running totals used to report how much of the NER compute went to padding
+padding_stats = {"batches": 0, "sentences": 0, "real_tokens": 0, "padded_tokens": 0}
+
+# Counts wordpiece tokens (including [CLS]/[SEP]) per sentence with the NER tokenizer.
+def sentence_token_lengths(sentences, tokenizer):
+    encoded = tokenizer(list(sentences), add_special_tokens=True)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+# Groups sentence indices into batches sized by padded-token budget instead of sentence count.
+def plan_token_budget_batches(lengths, max_batch_tokens=NER_MAX_BATCH_TOKENS, max_batch_size=None):
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    current = []
+    for idx in order:
+        # Lengths are ascending, so the newest member is always the longest
+        padded_size = lengths[idx] * (len(current) + 1)
+        full = max_batch_size is not None and len(current) >= max_batch_size
+        if current and (padded_size > max_batch_tokens or full):
+            batches.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        batches.append(current)
+
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+        padding_stats["batches"] += 1
+        padding_stats["sentences"] += len(batch)
+        padding_stats["real_tokens"] += sum(lengths[i] for i in batch)
+        padding_stats["padded_tokens"] += longest * len(batch)
+    return batches
+
+# Plans NER batches for raw sentences using the tokenizer's token lengths.
+def plan_ner_batches(sentences, tokenizer, max_batch_tokens=NER_MAX_BATCH_TOKENS, max_batch_size=None):
+    lengths = sentence_token_lengths(sentences, tokenizer)
+    return plan_token_budget_batches(lengths, max_batch_tokens, max_batch_size)
+
+# Share of processed tokens that were padding (0.0 means no wasted compute).
+def padding_ratio() -> float:
+    padded = padding_stats["padded_tokens"]
+    if not padded:
+        return 0.0
+    return 1.0 - padding_stats["real_tokens"] / padded
+
+def reset_padding_stats():
+    for key in padding_stats:
+        padding_stats[key] = 0
+
+def format_padding_report() -> str:
+    return (
+        f"{padding_stats['sentences']:,} sentences in {padding_stats['batches']:,} NER batches, "
+        f"padding ratio {padding_ratio():.1%}"
+    )
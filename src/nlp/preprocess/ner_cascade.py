@@ -0,0 +1,55 @@
+# Entity extraction profiles and the cheap prefilter of the NER cascade.
+#
+# BERT is by far the most expensive step of preprocessing, yet most comment sentences
+# are lowercase chatter with no capitalized words, no digits and no catalog names, where
+# it finds nothing (and CAR_BRAND/CAR_MODEL labels come from the catalog anyway). The
+# profiles trade BERT coverage for speed:
+#
+#   full     every sentence goes through BERT, then the catalog matches are merged in
+#   cascade  only sentences flagged by might_carry_entities() go through BERT; the rest
+#            get the catalog matches alone
+#   fast     no BERT at all, only the catalog gazetteer and context rules
+#
+# evaluate_ner_profiles.py measures the recall and precision of fast/cascade against full.
+
+NER_PROFILES = ("full", "cascade", "fast")
+DEFAULT_NER_PROFILE = "full"
+
+# Running totals for the current process: sentences seen and those sent to BERT
+cascade_stats = {"sentences": 0, "bert_sentences": 0}
+
+def validate_ner_profile(profile: str) -> str:
+    if profile not in NER_PROFILES:
+        raise ValueError(f"Unknown NER profile '{profile}', expected one of {NER_PROFILES}")
+    return profile
+
+# True if a word-tokenized sentence may hold an entity BERT would find: a capitalized word, a
+# digit or a catalog match. The first word of a sentence is capitalized anyway ("Just",
+# "Honestly"), so it only counts if it has further capitals ("BMW", "McLaren"); a sentence-initial
+# name is still caught by the catalog match. Catalog names that are also common words ("i",
+# "is") do not count on their own.
+def might_carry_entities(tokens, gazetteer, common_words) -> bool:
+    first_word = True
+    for token in tokens:
+        if any(c.isdigit() for c in token):
+            return True
+        if token[:1].isupper() and token != "I":
+            if not first_word or any(c.isupper() for c in token[1:]):
+                return True
+        if any(c.isalpha() for c in token):
+            first_word = False
+    return any(name not in common_words for _, _, (_, name) in gazetteer.iter_matches(tokens))
+
+def reset_cascade_stats():
+    for key in cascade_stats:
+        cascade_stats[key] = 0
+
+def bert_share() -> float:
+    sentences = cascade_stats["sentences"]
+    return cascade_stats["bert_sentences"] / sentences if sentences else 0.0
+
+def format_cascade_report() -> str:
+    return (
+        f"NER cascade: {cascade_stats['bert_sentences']:,} of {cascade_stats['sentences']:,} sentences "
+        f"sent to BERT ({bert_share():.1%})"
+    )
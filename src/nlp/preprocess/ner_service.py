@@ -0,0 +1,313 @@
+# Long-running local NER service that keeps the BERT model loaded between runs.
+#
+#   python src/nlp/preprocess/ner_service.py                       # Unix socket in data/cache/ner_service/
+#   python src/nlp/preprocess/ner_service.py --address localhost:6010
+#
+# Clients send batches of sentences as length-prefixed JSON frames and get back exactly
+# what find_car_entities_batch() returns in-process. Nothing received is unpickled, and a
+# connection is served only after its first frame presents the install's key, a random
+# secret kept in data/cache/ner_service.key (mode 0600) and readable only by the pipeline
+# user. TCP addresses must be loopback; the Unix socket is created with mode 0600 in a 0700
+# directory. Each connection is served by its own
+# thread, which queues the batch and waits for the result. One inference thread drains the
+# queue and merges pending batches into a single find_car_entities_batch() call, so small
+# requests from several preprocessing workers share NER forward passes. The queue is bounded:
+# when it is full, the connection threads block and so do their clients (back-pressure).
+#
+# The service answers a handshake with its preprocessing_version(). connect_ner_service()
+# only returns a client when that matches the caller's version (same model, backend, catalog
+# and NER profile), and returns None when the service is not running, so callers fall back
+# to in-process inference.
+import os
+import sys
+import hmac
+import json
+import queue
+import socket
+import struct
+import secrets
+import argparse
+import ipaddress
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.corpus_io import json_default
+
+DEFAULT_NER_SERVICE_ADDRESS = "data/cache/ner_service/ner.sock"
+# Per-install secret of the connection handshake, created by the first service start
+NER_SERVICE_KEY_PATH = Path("data/cache/ner_service.key")
+# Frames are a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 << 20
+# Batches waiting for inference before new requests block
+MAX_PENDING_REQUESTS = 64
+# Sentences merged into one find_car_entities_batch() call
+MAX_MERGED_SENTENCES = 1024
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# "host:port" for a TCP socket on a loopback address, anything else is a Unix socket path.
+def parse_address(address):
+    if isinstance(address, tuple):
+        host, port = address
+    else:
+        host, sep, port = str(address).rpartition(":")
+        if not (sep and port.isdigit()):
+            return str(address)
+        host = host.strip("[]") or "localhost"
+    if not is_loopback(host):
+        raise ValueError(f"NER service address {address} is not a loopback address")
+    return host, int(port)
+
+# The install's service key, created (mode 0600) if `create` and missing; None if there is none.
+def service_key(path=NER_SERVICE_KEY_PATH, create=False):
+    path = Path(path)
+    if create and not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+    try:
+        return path.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+def send_message(sock, message):
+    data = json.dumps(message, default=json_default).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+def recv_exactly(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        data += chunk
+    return bytes(data)
+
+def recv_message(sock):
+    (size,) = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {size:,} bytes exceeds the {MAX_FRAME_BYTES:,} byte limit")
+    return json.loads(recv_exactly(sock, size).decode("utf-8"))
+
+def open_socket(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection(address)
+
+class NERClient:
+    def __init__(self, address=DEFAULT_NER_SERVICE_ADDRESS, key=None):
+        self.address = parse_address(address)
+        self.key = key
+        self.conn = open_socket(self.address)
+
+    def request(self, message):
+        send_message(self.conn, message)
+        reply = recv_message(self.conn)
+        if "error" in reply:
+            raise RuntimeError(f"NER service error: {reply['error']}")
+        return reply
+
+    # Authenticates the connection and returns the service's preprocessing version.
+    def version(self) -> str:
+        return self.request({"op": "hello", "key": self.key})["version"]
+
+    # Entities of each text, plus how many of the texts the service sent through BERT.
+    def find_car_entities_batch(self, texts):
+        reply = self.request({"op": "extract", "texts": list(texts)})
+        return reply["entities"], reply["bert_sentences"]
+
+    def close(self):
+        self.conn.close()
+
+# Client for a running service built with the same preprocessing version, or None.
+def connect_ner_service(address=DEFAULT_NER_SERVICE_ADDRESS, expected_version=None, key_path=NER_SERVICE_KEY_PATH):
+    key = service_key(key_path)
+    if key is None:
+        return None
+    try:
+        client = NERClient(address, key)
+    except OSError:
+        return None
+    try:
+        version = client.version()
+    except (OSError, EOFError, ValueError, RuntimeError):
+        client.close()
+        return None
+    if expected_version is not None and version != expected_version:
+        print(f"⚠️ NER service at {address} runs '{version}', expected '{expected_version}'; not using it")
+        client.close()
+        return None
+    return client
+
+class NERService:
+    def __init__(self, address=DEFAULT_NER_SERVICE_ADDRESS, max_pending=MAX_PENDING_REQUESTS,
+                 max_merged_sentences=MAX_MERGED_SENTENCES, batch_size=None, max_batch_tokens=None,
+                 key_path=NER_SERVICE_KEY_PATH):
+        self.address = parse_address(address)
+        self.key_path = key_path
+        self.requests = queue.Queue(maxsize=max_pending)
+        self.max_merged_sentences = max_merged_sentences
+        self.batch_options = {
+            key: value for key, value in (("batch_size", batch_size), ("max_batch_tokens", max_batch_tokens))
+            if value is not None
+        }
+        self.served = {"requests": 0, "sentences": 0, "inference_calls": 0}
+
+    # Takes one queued request plus whatever else is already waiting, up to the sentence limit.
+    def next_requests(self):
+        pending = [self.requests.get()]
+        sentences = len(pending[0][0])
+        while sentences < self.max_merged_sentences:
+            try:
+                texts, reply = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            pending.append((texts, reply))
+            sentences += len(texts)
+        return pending
+
+    def inference_loop(self):
+        from text_preprocessing import run_ner_batch
+        while True:
+            pending = self.next_requests()
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                entities, bert_flags = run_ner_batch(texts, **self.batch_options)
+            except Exception as e:
+                for _, reply in pending:
+                    reply.put({"error": repr(e)})
+                continue
+            self.served["inference_calls"] += 1
+            start = 0
+            for request_texts, reply in pending:
+                end = start + len(request_texts)
+                reply.put({"entities": entities[start:end], "bert_sentences": sum(bert_flags[start:end])})
+                start = end
+
+    def handle_connection(self, conn, version, key):
+        with conn:
+            authenticated = False
+            while True:
+                try:
+                    message = recv_message(conn)
+                except (EOFError, OSError, ValueError):
+                    return
+                if not isinstance(message, dict):
+                    send_message(conn, {"error": "expected a JSON object"})
+                    return
+                op = message.get("op")
+                if not authenticated:
+                    # hmac.compare_digest keeps the comparison time independent of the key
+                    if op != "hello" or not hmac.compare_digest(str(message.get("key", "")), key):
+                        print("⚠️ Rejected connection: bad or missing key")
+                        send_message(conn, {"error": "authentication failed"})
+                        return
+                    authenticated = True
+                    send_message(conn, {"version": version})
+                elif op == "extract":
+                    texts = message.get("texts")
+                    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                        send_message(conn, {"error": "texts must be a list of strings"})
+                        continue
+                    reply = queue.Queue(maxsize=1)
+                    # Blocks while the queue is full, which in turn blocks the client
+                    self.requests.put((texts, reply))
+                    self.served["requests"] += 1
+                    self.served["sentences"] += len(texts)
+                    send_message(conn, reply.get())
+                elif op == "hello":
+                    send_message(conn, {"version": version})
+                else:
+                    send_message(conn, {"error": f"unknown op {op!r}"})
+
+    # Listening socket: a Unix socket only the current user can open, or a loopback TCP port.
+    def listen(self):
+        if not isinstance(self.address, str):
+            host, _ = self.address
+            family = socket.AF_INET6 if ":" in host else socket.AF_INET
+            return socket.create_server(self.address, family=family)
+        socket_path = Path(self.address)
+        socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # A socket file left behind by a previous service would make bind() fail
+        socket_path.unlink(missing_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            listener.bind(str(socket_path))
+        finally:
+            os.umask(umask)
+        os.chmod(socket_path, 0o600)
+        listener.listen()
+        return listener
+
+    def serve_forever(self):
+        from text_preprocessing import preprocessing_version, warm_up
+        warm_up()
+        version = preprocessing_version()
+        key = service_key(self.key_path, create=True)
+        threading.Thread(target=self.inference_loop, daemon=True).start()
+        with self.listen() as listener:
+            print(f"🛰️ NER service ({version}) listening on {self.address}")
+            while True:
+                try:
+                    conn, _ = listener.accept()
+                except OSError as e:
+                    print(f"⚠️ Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self.handle_connection, args=(conn, version, key), daemon=True).start()
+
+def parse_args():
+    from ner_cascade import NER_PROFILES, DEFAULT_NER_PROFILE
+    from ner_backends import NER_BACKENDS, DEFAULT_NER_BACKEND
+    parser = argparse.ArgumentParser(description="Serve NER for preprocessing with the model kept loaded.")
+    parser.add_argument("--address", default=DEFAULT_NER_SERVICE_ADDRESS,
+                        help="Unix socket path, or host:port for a TCP socket on a loopback address.")
+    parser.add_argument("--ner-profile", choices=NER_PROFILES, default=DEFAULT_NER_PROFILE,
+                        help="Must match the --ner-profile of the preprocessing runs that use the service.")
+    parser.add_argument("--ner-backend", choices=NER_BACKENDS, default=DEFAULT_NER_BACKEND,
+                        help="Must match the --ner-backend of the preprocessing runs that use the service.")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_REQUESTS,
+                        help="Queued requests before clients are made to wait.")
+    parser.add_argument("--max-merged-sentences", type=int, default=MAX_MERGED_SENTENCES,
+                        help="Sentences from queued requests merged into one NER run.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Maximum sentences per NER forward pass.")
+    parser.add_argument("--max-batch-tokens", type=int, default=None, help="Padded-token budget per NER batch.")
+    parser.add_argument("--torch-threads", type=int, default=None,
+                        help="Torch (or ONNX Runtime) intra-op threads.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    from text_preprocessing import set_ner_profile, set_ner_backend
+    set_ner_profile(args.ner_profile)
+    set_ner_backend(args.ner_backend, args.torch_threads)
+    service = NERService(args.address, args.max_pending, args.max_merged_sentences, args.batch_size,
+                         args.max_batch_tokens)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n✅ Served {service.served['requests']:,} requests ({service.served['sentences']:,} sentences) "
+              f"in {service.served['inference_calls']:,} NER runs")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
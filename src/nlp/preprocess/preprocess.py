@@ -1,18 +1,52 @@
 import os
-import json
+import sys
+import atexit
+import argparse
+import multiprocessing
+from collections import Counter, deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-import numpy as np
 from tqdm import tqdm
 
-from text_preprocessing import preprocess_sentences
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.checkpoint import ChunkCheckpoint, input_signature, run_fingerprint
+from utils.car_relevance import add_car_relevance
+from utils.corpus_io import (
+    CORPUS_FORMATS, RecordWriter, corpus_path, corpus_stem, find_corpus_file, iter_chunks, iter_records, json_default
+)
+
+from text_preprocessing import (
+    preprocess_sentences, preprocess_sentences_batch, enable_sentence_cache, close_sentence_cache, enable_lemma_snapshot, preprocessing_version,
+    set_ner_profile, set_ner_backend, enable_ner_service, warm_up, ner_model_name, NER_BATCH_SIZE
+)
+from ner_batching import NER_MAX_BATCH_TOKENS, format_padding_report, reset_padding_stats, padding_stats
+from sentence_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_CACHE_MAX_MB, cache_stats, reset_cache_stats, format_cache_report
+)
+from lemma_cache import LEMMA_SNAPSHOT_PATH, lemma_stats, reset_lemma_stats, format_lemma_report
+from ner_service import DEFAULT_NER_SERVICE_ADDRESS, connect_ner_service
+from calibration import load_calibration
+from ner_backends import NER_BACKENDS, DEFAULT_NER_BACKEND, ensure_onnx_export
+from ner_cascade import NER_PROFILES, DEFAULT_NER_PROFILE, cascade_stats, reset_cascade_stats, format_cascade_report
+from incremental import (
+    iter_thread_comments, thread_fingerprint, load_manifest, save_manifest, plan_incremental_update, merge_chunk
+)
 
 RAW_REDDIT_DIR = Path("data/raw_data")
 RAW_CARTALK_FILE = Path("data/raw_data/cartalk_general_discussion.json")
 PREPROCESSED_DIR = Path("data/preprocessed_data")
 PREPROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
+# Number of threads whose sentences are gathered into one batched NER run
+THREAD_CHUNK_SIZE = 64
+
+# Raw threads sampled to build a missing lemma snapshot
+LEMMA_SAMPLE_THREADS = 2000
+
 # Flatten nested Reddit comments into a flat list.
-def flatten_reddit_comments(comments):
+def flatten_reddit_comments(comments, preprocess_fn=preprocess_sentences):
     flat_comments = []
     def recursive_flatten(comments_list):
         for comment in comments_list:
@@ -23,7 +57,7 @@ def flatten_reddit_comments(comments):
                 "id": comment.get("id", ""),
                 "body": body,
                 "created_utc": comment.get("created_utc", None),
-                "preprocessed_body": preprocess_sentences(body)
+                "preprocessed_body": preprocess_fn(body)
             })
             replies = comment.get("replies", [])
             if replies:
@@ -32,11 +66,11 @@ def flatten_reddit_comments(comments):
     return flat_comments
 
 # Preprocess Reddit thread text and comments.
-def preprocess_reddit_thread(thread):
+def preprocess_reddit_thread(thread, preprocess_fn=preprocess_sentences):
     title = thread.get("title", "")
     selftext = thread.get("selftext", "")
 
-    flat_comments = flatten_reddit_comments(thread.get("comments", []))
+    flat_comments = flatten_reddit_comments(thread.get("comments", []), preprocess_fn)
     processed_comments = []
     for comment in flat_comments:
         preprocessed = comment["preprocessed_body"]
@@ -50,8 +84,8 @@ def preprocess_reddit_thread(thread):
             }
         })
 
-    title_processed = preprocess_sentences(title)
-    selftext_processed = preprocess_sentences(selftext)
+    title_processed = preprocess_fn(title)
+    selftext_processed = preprocess_fn(selftext)
 
     return {
         "id": thread.get("id", ""),
@@ -70,7 +104,7 @@ def preprocess_reddit_thread(thread):
     }
 
 # Preprocess CarTalk thread text and comments.
-def preprocess_cartalk_thread(thread):
+def preprocess_cartalk_thread(thread, preprocess_fn=preprocess_sentences):
     title = thread.get("title", "")
     selftext = thread.get("selftext", "")
 
@@ -79,7 +113,7 @@ def preprocess_cartalk_thread(thread):
         body = comment.get("body", "")
         if not body:
             continue
-        preprocessed = preprocess_sentences(body)
+        preprocessed = preprocess_fn(body)
         processed_comments.append({
             "id": comment.get("id", ""),
             "body": body,
@@ -90,8 +124,8 @@ def preprocess_cartalk_thread(thread):
             }
         })
 
-    title_processed = preprocess_sentences(title)
-    selftext_processed = preprocess_sentences(selftext)
+    title_processed = preprocess_fn(title)
+    selftext_processed = preprocess_fn(selftext)
 
     return {
         "id": thread.get("id", ""),
@@ -109,47 +143,365 @@ def preprocess_cartalk_thread(thread):
         }
     }
 
-# Convert numpy types to native Python types for JSON serialization.
-def make_json_serializable(obj):
-    if isinstance(obj, dict):
-        return {k: make_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [make_json_serializable(v) for v in obj]
-    elif isinstance(obj, (np.float32, np.float64)):
-        return float(obj)
-    elif isinstance(obj, (np.int32, np.int64)):
-        return int(obj)
+THREAD_PREPROCESSORS = {
+    "reddit": preprocess_reddit_thread,
+    "cartalk": preprocess_cartalk_thread,
+}
+
+# Collect every text of a thread that the thread preprocessors will pass to preprocess_sentences.
+def collect_thread_texts(thread):
+    texts = [thread.get("title", ""), thread.get("selftext", "")]
+    texts.extend(comment["body"] for comment in iter_thread_comments(thread))
+    return texts
+
+# Texts of the first `limit` threads across the raw files.
+def iter_sample_texts(files, limit):
+    threads = (thread for file_path in files for thread in iter_records(file_path))
+    for thread in islice(threads, limit):
+        yield from collect_thread_texts(thread)
+
+# Preprocess a chunk of threads with one batched NER pass over all of their sentences.
+# Texts found in `known` (already preprocessed) are reused instead of recomputed.
+def preprocess_threads_batched(threads, source, batch_size=NER_BATCH_SIZE, max_batch_tokens=NER_MAX_BATCH_TOKENS,
+                               known=None):
+    results = dict(known or {})
+    unique_texts = list(dict.fromkeys(
+        text for thread in threads for text in collect_thread_texts(thread) if text not in results
+    ))
+    processed = preprocess_sentences_batch(unique_texts, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    results.update(zip(unique_texts, processed))
+    preprocess_thread = THREAD_PREPROCESSORS[source]
+    return [preprocess_thread(thread, results.__getitem__) for thread in threads]
+
+# Preprocess one chunk of threads, serially or with a batched NER pass.
+def preprocess_chunk(threads, source, batch_size=NER_BATCH_SIZE, max_batch_tokens=NER_MAX_BATCH_TOKENS, known=None):
+    if batch_size <= 1:
+        known = known or {}
+        preprocess_fn = lambda text: known[text] if text in known else preprocess_sentences(text)
+        preprocess_thread = THREAD_PREPROCESSORS[source]
+        return [preprocess_thread(t, preprocess_fn) for t in threads]
+    return preprocess_threads_batched(threads, source, batch_size, max_batch_tokens, known)
+
+# Limit torch intra-op threads so that several processes can share the machine.
+def set_torch_threads(torch_threads):
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+# Loads this process's resources: the NER model is skipped under the fast profile or when a
+# running NER service takes the inference.
+def init_resources(ner_profile=DEFAULT_NER_PROFILE, lemma_snapshot=None, ner_service=None,
+                   ner_backend=DEFAULT_NER_BACKEND, threads=None):
+    set_ner_profile(ner_profile)
+    set_ner_backend(ner_backend, threads)
+    use_service = bool(ner_service) and enable_ner_service(ner_service)
+    warm_up(ner=ner_profile != "fast" and not use_service)
+    if lemma_snapshot:
+        enable_lemma_snapshot(lemma_snapshot)
+
+# Sets up everything a process needs to preprocess chunks: torch threads, resources and the
+# sentence cache.
+def init_process(torch_threads, cache_config, ner_profile=DEFAULT_NER_PROFILE, lemma_snapshot=None, ner_service=None,
+                 ner_backend=DEFAULT_NER_BACKEND):
+    set_torch_threads(torch_threads)
+    init_resources(ner_profile, lemma_snapshot, ner_service, ner_backend, torch_threads)
+    if cache_config:
+        enable_sentence_cache(**cache_config)
+
+# Pool initializer. Loads the NLTK resources (and the NER model if needed) once per spawned
+# worker; every chunk the worker receives afterwards reuses them.
+def init_worker(torch_threads, cache_config, ner_profile=DEFAULT_NER_PROFILE, lemma_snapshot=None, ner_service=None,
+                ner_backend=DEFAULT_NER_BACKEND):
+    init_process(torch_threads, cache_config, ner_profile, lemma_snapshot, ner_service, ner_backend)
+    if cache_config:
+        # Workers have no other shutdown hook; this runs when the pool shuts them down
+        atexit.register(close_sentence_cache)
+
+# Pool task: preprocess a chunk and hand back this worker's padding, cache, cascade and lemma stats for it.
+def run_worker_chunk(task):
+    threads, source, batch_size, max_batch_tokens, known = task
+    reset_padding_stats()
+    reset_cache_stats()
+    reset_cascade_stats()
+    reset_lemma_stats()
+    preprocessed = preprocess_chunk(threads, source, batch_size, max_batch_tokens, known)
+    return preprocessed, dict(padding_stats), dict(cache_stats), dict(cascade_stats), dict(lemma_stats)
+
+def merge_stats(totals, worker_stats):
+    for key, value in worker_stats.items():
+        totals[key] += value
+
+# Like pool.map, but submits at most `max_in_flight` tasks ahead of the consumer so that a
+# streamed input is never read into memory all at once. Results are yielded in task order.
+def iter_pool_results(pool, fn, tasks, max_in_flight):
+    in_flight = deque()
+    for task in tasks:
+        in_flight.append(pool.submit(fn, task))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+# Pool of spawned (not forked) preprocessing workers, so each gets a clean torch runtime. Every
+# worker loads its resources once in init_worker(); callers preprocessing several files should
+# start one pool and pass it to iter_preprocessed_chunks() for all of them.
+def start_worker_pool(workers, torch_threads=None, cache_config=None, ner_profile=DEFAULT_NER_PROFILE,
+                      lemma_snapshot=None, ner_service=None, ner_backend=DEFAULT_NER_BACKEND):
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                               initargs=(torch_threads, cache_config, ner_profile, lemma_snapshot, ner_service,
+                                         ner_backend))
+
+# Yield preprocessed chunks in order for an iterable of (threads, known) tasks, computed
+# in-process or across a pool of worker processes. `pool` (from start_worker_pool() with the
+# same settings) is reused if given; otherwise a pool is started for these tasks alone. In-process,
+# `initialized` means the caller already ran init_process() with the same settings.
+def iter_preprocessed_chunks(tasks, source, batch_size=NER_BATCH_SIZE, max_batch_tokens=NER_MAX_BATCH_TOKENS,
+                             workers=1, torch_threads=None, cache_config=None, ner_profile=DEFAULT_NER_PROFILE,
+                             lemma_snapshot=None, ner_service=None, ner_backend=DEFAULT_NER_BACKEND, pool=None,
+                             initialized=False):
+    if workers <= 1:
+        if not initialized:
+            init_process(torch_threads, cache_config, ner_profile, lemma_snapshot, ner_service, ner_backend)
+        for threads, known in tasks:
+            yield preprocess_chunk(threads, source, batch_size, max_batch_tokens, known)
+        return
+
+    if pool is None:
+        with start_worker_pool(workers, torch_threads, cache_config, ner_profile, lemma_snapshot, ner_service,
+                               ner_backend) as pool:
+            yield from iter_preprocessed_chunks(tasks, source, batch_size, max_batch_tokens, workers, pool=pool)
+        return
+
+    worker_tasks = ((threads, source, batch_size, max_batch_tokens, known) for threads, known in tasks)
+    for chunk_result, chunk_padding, chunk_cache, chunk_cascade, chunk_lemmas in iter_pool_results(
+            pool, run_worker_chunk, worker_tasks, max_in_flight=workers * 2):
+        merge_stats(padding_stats, chunk_padding)
+        merge_stats(cache_stats, chunk_cache)
+        merge_stats(cascade_stats, chunk_cascade)
+        merge_stats(lemma_stats, chunk_lemmas)
+        yield chunk_result
+
+# Preprocess a list of threads in memory. Results are returned in the original thread order.
+def preprocess_threads(threads, source, batch_size=NER_BATCH_SIZE, max_batch_tokens=NER_MAX_BATCH_TOKENS,
+                       workers=1, torch_threads=None, cache_config=None, chunk_size=THREAD_CHUNK_SIZE,
+                       ner_profile=DEFAULT_NER_PROFILE, lemma_snapshot=None, ner_service=None,
+                       ner_backend=DEFAULT_NER_BACKEND):
+    tasks = ((chunk, None) for chunk in iter_chunks(threads, chunk_size))
+    preprocessed = []
+    for chunk_result in iter_preprocessed_chunks(tasks, source, batch_size, max_batch_tokens, workers, torch_threads,
+                                                 cache_config, ner_profile, lemma_snapshot, ner_service, ner_backend):
+        preprocessed.extend(chunk_result)
+    return preprocessed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preprocess raw Reddit and CarTalk threads.")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Maximum sentences per NER forward pass; 1 runs the original per-sentence path "
+                             f"(default: calibrated, else {NER_BATCH_SIZE}).")
+    parser.add_argument("--max-batch-tokens", type=int, default=NER_MAX_BATCH_TOKENS,
+                        help="Padded-token budget per NER batch; sentences are grouped by token length.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of preprocessing processes, each with its own copy of the NER model "
+                             "(default: calibrated, else 1).")
+    parser.add_argument("--torch-threads", type=int, default=None,
+                        help="Torch intra-op threads per process (default: calibrated, else torch's own choice); "
+                             "also sets the ONNX Runtime intra-op threads with --ner-backend onnx.")
+    parser.add_argument("--no-calibration", action="store_true",
+                        help="Ignore the settings saved by calibration.py for this node type.")
+    parser.add_argument("--ner-backend", choices=NER_BACKENDS, default=DEFAULT_NER_BACKEND,
+                        help="NER inference backend: fp32 torch, dynamically quantized int8 torch, or ONNX Runtime. "
+                             "See evaluate_ner_backends.py for their agreement with fp32.")
+    parser.add_argument("--cache-path", type=Path, default=DEFAULT_CACHE_PATH,
+                        help="SQLite file caching per-sentence tokens and entities across runs.")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_MB,
+                        help="Size limit of the sentence cache; least recently used entries are evicted.")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the sentence cache.")
+    parser.add_argument("--chunk-size", type=int, default=THREAD_CHUNK_SIZE,
+                        help="Threads per processing chunk; each finished chunk is checkpointed to disk.")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="Write chunks straight to the output instead of committing them for resumable runs.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only preprocess new or edited threads/comments and merge them into existing outputs.")
+    parser.add_argument("--ner-profile", choices=NER_PROFILES, default=DEFAULT_NER_PROFILE,
+                        help="full: BERT on every sentence; cascade: BERT only on sentences a prefilter flags; "
+                             "fast: catalog matching only. See evaluate_ner_profiles.py for their accuracy.")
+    parser.add_argument("--lemma-snapshot", type=Path, default=LEMMA_SNAPSHOT_PATH,
+                        help="Precomputed lemmas of the most frequent tokens, shared by all workers; "
+                             "built from a sample of the raw threads if missing.")
+    parser.add_argument("--no-lemma-snapshot", action="store_true",
+                        help="Only memoize lemmas per process, without a precomputed snapshot.")
+    parser.add_argument("--ner-service", nargs="?", const=DEFAULT_NER_SERVICE_ADDRESS, default=None,
+                        help="Send NER to a running ner_service.py (optionally at the given socket path or "
+                             "loopback host:port) instead of loading the model; falls back to in-process NER if it "
+                             "is not up.")
+    parser.add_argument("--format", choices=CORPUS_FORMATS, default="json",
+                        help="Output format: a JSON array (default) or one thread per line, optionally gzipped.")
+    return parser.parse_args()
+
+# Fills --workers, --torch-threads and --batch-size left unset from the calibration saved for
+# this node type, NER profile and backend, falling back to the built-in defaults.
+def apply_calibration(args):
+    calibrated = None if args.no_calibration else load_calibration(args.ner_profile, args.ner_backend)
+    defaults = {"workers": 1, "torch_threads": None, "batch_size": NER_BATCH_SIZE}
+    applied = []
+    for key, default in defaults.items():
+        if getattr(args, key) is None:
+            value = calibrated.get(key, default) if calibrated else default
+            setattr(args, key, value)
+            if calibrated:
+                applied.append(f"{key}={value}")
+    if applied:
+        print(f"🎛️ Calibrated settings: {', '.join(applied)}")
+
+# Preprocess one raw file (fully or incrementally) and save its output. Threads are streamed
+# from the raw file chunk by chunk and written out as soon as their chunk is done.
+def process_raw_file(file_path, source, args, cache_config, desc, lemma_snapshot=None, pool=None, initialized=False):
+    print(f"🧼 Preprocessing {file_path.name}...")
+    stem = corpus_stem(file_path)
+    output_path = corpus_path(PREPROCESSED_DIR, stem, args.format)
+    version = preprocessing_version()
+    reset_padding_stats()
+    reset_cache_stats()
+    reset_cascade_stats()
+    reset_lemma_stats()
+
+    manifest = load_manifest(PREPROCESSED_DIR, stem, version) if args.incremental else None
+    existing_path = find_corpus_file(PREPROCESSED_DIR, stem)
+    existing_by_id = {}
+    if manifest is not None and existing_path is not None:
+        existing_by_id = {record.get("id", ""): record for record in iter_records(existing_path)}
     else:
-        return obj
+        manifest = None
+
+    checkpoint = None
+    first_chunk = 0
+    if not args.no_checkpoint:
+        manifest_key = input_signature(existing_path) if manifest is not None else None
+        run_key = run_fingerprint(input_signature(file_path), version, args.chunk_size, manifest_key)
+        checkpoint = ChunkCheckpoint(output_path, run_key)
+        first_chunk = checkpoint.committed_count()
+        if first_chunk:
+            print(f"⏩ Resuming after {first_chunk:,} committed chunks")
+
+    incremental_stats = Counter()
+    prepared = deque()
+
+    # Split each raw chunk into reusable records and threads that need preprocessing
+    def iter_tasks():
+        for index, chunk in enumerate(iter_chunks(iter_records(file_path), args.chunk_size)):
+            if index < first_chunk:
+                continue
+            if manifest is None:
+                reused, pending, known = {}, chunk, None
+            else:
+                reused, pending_indices, known, stats = plan_incremental_update(chunk, existing_by_id, manifest)
+                pending = [chunk[i] for i in pending_indices]
+                incremental_stats.update(stats)
+            prepared.append((chunk, reused))
+            yield pending, known
+
+    written_ids = set()
+    threads_manifest = {}
+
+    def write_output(writer, records):
+        for record in records:
+            # Also fills in the metadata for records reused from an output written before it existed
+            record = add_car_relevance(record)
+            writer.write(record)
+            written_ids.add(record.get("id", ""))
+            threads_manifest[record.get("id", "")] = thread_fingerprint(record)
 
-# Save preprocessed data to JSON file.
-def save_preprocessed(data, output_path):
-    serializable_data = make_json_serializable(data)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(serializable_data, f, ensure_ascii=False, indent=2)
+    with RecordWriter(output_path) as writer:
+        with tqdm(desc=desc, unit="threads", initial=first_chunk * args.chunk_size) as progress:
+            results = iter_preprocessed_chunks(iter_tasks(), source, args.batch_size, args.max_batch_tokens,
+                                               args.workers, args.torch_threads, cache_config, args.ner_profile,
+                                               lemma_snapshot, args.ner_service, args.ner_backend, pool,
+                                               initialized)
+            for index, processed in enumerate(results, first_chunk):
+                chunk, reused = prepared.popleft()
+                records = merge_chunk(chunk, reused, processed)
+                if checkpoint:
+                    checkpoint.commit(index, records, default=json_default)
+                else:
+                    write_output(writer, records)
+                progress.update(len(chunk))
+
+        if checkpoint:
+            write_output(writer, checkpoint.iter_records())
+        # Keep previously preprocessed threads that are no longer in the raw file
+        write_output(writer, (record for thread_id, record in existing_by_id.items()
+                              if thread_id not in written_ids))
+
+    # Saved on full runs too, so a later --incremental run never matches hashes of an older output
+    save_manifest(PREPROCESSED_DIR, stem, version, threads_manifest)
+    if checkpoint:
+        checkpoint.clear()
+    if manifest is not None:
+        print(f"♻️ {incremental_stats['unchanged']:,} unchanged, {incremental_stats['edited']:,} edited, "
+              f"{incremental_stats['new']:,} new threads")
+    if args.batch_size > 1:
+        print(f"📏 {format_padding_report()}")
+    if cache_config:
+        print(f"🗃️ {format_cache_report()}")
+    print(f"🔤 {format_lemma_report()}")
+    if args.ner_profile != "full":
+        print(f"🪜 {format_cascade_report()}")
+    print(f"✅ Done preprocessing {file_path.name}!")
 
 # Preprocess Reddit and CarTalk raw data files and save outputs.
 def main():
-    # Process Reddit files
+    args = parse_args()
+    apply_calibration(args)
+    # Set in this process too: the output manifest and checkpoints are keyed by preprocessing_version()
+    set_ner_profile(args.ner_profile)
+    set_ner_backend(args.ner_backend, args.torch_threads)
+    cache_config = None if args.no_cache else {"path": args.cache_path, "max_mb": args.cache_max_mb}
+
+    use_service = False
+    if args.ner_service:
+        client = connect_ner_service(args.ner_service, preprocessing_version())
+        if client is None:
+            print(f"⚠️ No compatible NER service at {args.ner_service}, loading the NER model in-process")
+        else:
+            print(f"🛰️ Using the NER service at {args.ner_service}")
+            client.close()
+            use_service = True
+
+    # Export once here, before any worker starts and looks for the model
+    if args.ner_backend == "onnx" and args.ner_profile != "fast" and not use_service:
+        ensure_onnx_export(ner_model_name)
+
     reddit_files = list(RAW_REDDIT_DIR.glob("reddit_*.json"))
-    for file_path in reddit_files:
-        print(f"🧼 Preprocessing {file_path.name}...")
-        with open(file_path, "r", encoding="utf-8") as f:
-            threads = json.load(f)
-        preprocessed = [preprocess_reddit_thread(t) for t in tqdm(threads, desc=f"Processing {file_path.name}")]
-        output_path = PREPROCESSED_DIR / file_path.name
-        save_preprocessed(preprocessed, output_path)
-        print(f"✅ Done preprocessing {file_path.name}!")
-
-    # Process CarTalk
-    if RAW_CARTALK_FILE.exists():
-        print(f"🧼 Preprocessing {RAW_CARTALK_FILE.name}...")
-        with open(RAW_CARTALK_FILE, "r", encoding="utf-8") as f:
-            threads = json.load(f)
-        preprocessed = [preprocess_cartalk_thread(t) for t in tqdm(threads, desc="Processing CarTalk")]
-        output_path = PREPROCESSED_DIR / RAW_CARTALK_FILE.name
-        save_preprocessed(preprocessed, output_path)
-        print(f"✅ Done preprocessing {RAW_CARTALK_FILE.name}!")
+    raw_files = reddit_files + ([RAW_CARTALK_FILE] if RAW_CARTALK_FILE.exists() else [])
+
+    # Build the lemma snapshot once here so every worker just loads it
+    lemma_snapshot = None if args.no_lemma_snapshot else args.lemma_snapshot
+    if lemma_snapshot:
+        entries = enable_lemma_snapshot(lemma_snapshot, sample_texts=iter_sample_texts(raw_files, LEMMA_SAMPLE_THREADS))
+        print(f"🔤 Lemma snapshot: {entries:,} tokens")
+
+    # One pool (or this process, when serial) for all files, so torch and the NER model load only once
+    pool = None
+    if args.workers > 1:
+        pool = start_worker_pool(args.workers, args.torch_threads, cache_config, args.ner_profile, lemma_snapshot,
+                                 args.ner_service, args.ner_backend)
+    else:
+        init_process(args.torch_threads, cache_config, args.ner_profile, lemma_snapshot, args.ner_service,
+                     args.ner_backend)
+    try:
+        with pool or nullcontext():
+            # Process Reddit files
+            for file_path in reddit_files:
+                process_raw_file(file_path, "reddit", args, cache_config, desc=f"Processing {file_path.name}",
+                                 lemma_snapshot=lemma_snapshot, pool=pool, initialized=True)
+
+            # Process CarTalk
+            if RAW_CARTALK_FILE.exists():
+                process_raw_file(RAW_CARTALK_FILE, "cartalk", args, cache_config, desc="Processing CarTalk",
+                                 lemma_snapshot=lemma_snapshot, pool=pool, initialized=True)
+    finally:
+        close_sentence_cache()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,180 @@
+# Persistent, content-addressed cache of per-sentence preprocessing results.
+#
+# Entries are keyed by a hash of the raw sentence together with a namespace that
+# identifies everything the result depends on (NER model name, car_data.json
+# version), so changing either simply stops old entries from being hit. Values
+# hold the cleaned tokens and filtered NER entities of one sentence. The store is
+# a single SQLite file in WAL mode, so several worker processes can share it.
+#
+# The total size of the stored values is kept in a meta row that triggers update in
+# the same transaction as every insert, update and delete, so checking the size limit
+# is a single-row read and only an eviction scans the table. Hits do not write: their
+# last_used times are buffered and saved with the next write, or on close().
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path("data/cache/sentence_cache.sqlite")
+DEFAULT_CACHE_MAX_MB = 2048
+
+# Evicting down to this fraction of the size limit avoids evicting on every write
+EVICTION_TARGET = 0.9
+EVICTION_BATCH = 1000
+# Buffered last_used updates that force a write even without new entries
+MAX_PENDING_TOUCHES = 50_000
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+
+# Running totals for the current process, reported after each file
+cache_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+def reset_cache_stats():
+    for key in cache_stats:
+        cache_stats[key] = 0
+
+def cache_hit_rate() -> float:
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    return cache_stats["hits"] / lookups if lookups else 0.0
+
+def format_cache_report() -> str:
+    return (
+        f"sentence cache: {cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses "
+        f"({cache_hit_rate():.1%} hit rate), {cache_stats['evictions']:,} evicted"
+    )
+
+# numpy scalars (BERT scores) are stored as plain Python numbers
+def _to_builtin(obj):
+    return obj.item()
+
+class SentenceCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, namespace="", max_mb=DEFAULT_CACHE_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentences ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sentences_last_used ON sentences(last_used)")
+        self.conn.commit()
+        # Seeding the total (one scan, for caches created before it existed) and creating the
+        # triggers happen in one transaction, so no write can slip in between
+        self.conn.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO cache_meta (name, value)
+                SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM sentences;
+            CREATE TRIGGER IF NOT EXISTS sentences_size_insert AFTER INSERT ON sentences BEGIN
+                UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS sentences_size_update AFTER UPDATE OF size ON sentences BEGIN
+                UPDATE cache_meta SET value = value + NEW.size - OLD.size WHERE name = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS sentences_size_delete AFTER DELETE ON sentences BEGIN
+                UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_bytes';
+            END;
+            COMMIT;
+        """)
+        # {key: last_used} of hits not yet written, see touch()
+        self.pending_touches = {}
+
+    def key(self, sentence: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\n{sentence}".encode("utf-8")).hexdigest()
+
+    # Returns {sentence: (tokens, entities)} for every sentence found in the cache.
+    def get_many(self, sentences):
+        keys = {self.key(s): s for s in dict.fromkeys(sentences)}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), LOOKUP_CHUNK):
+            chunk = key_list[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM sentences WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, value in rows:
+                record = json.loads(value)
+                found[keys[key]] = (record["tokens"], record["entities"])
+            self.touch(key for key, _ in rows)
+        cache_stats["hits"] += len(found)
+        cache_stats["misses"] += len(keys) - len(found)
+        return found
+
+    def get(self, sentence: str):
+        return self.get_many([sentence]).get(sentence)
+
+    # Records a hit's last_used time without writing it yet.
+    def touch(self, keys):
+        now = time.time()
+        for key in keys:
+            self.pending_touches[key] = now
+        if len(self.pending_touches) >= MAX_PENDING_TOUCHES:
+            self.write_touches()
+            self.conn.commit()
+
+    # Writes the buffered last_used times into the current transaction.
+    def write_touches(self):
+        if self.pending_touches:
+            self.conn.executemany(
+                "UPDATE sentences SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self.pending_touches.items()]
+            )
+            self.pending_touches = {}
+
+    # Stores {sentence: (tokens, entities)} and evicts least recently used entries if over the limit.
+    def put_many(self, results):
+        now = time.time()
+        rows = []
+        for sentence, (tokens, entities) in results.items():
+            value = json.dumps({"tokens": tokens, "entities": entities}, ensure_ascii=False, default=_to_builtin)
+            rows.append((self.key(sentence), value, len(value), now))
+        if not rows:
+            return
+        self.write_touches()
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the size trigger
+        self.conn.executemany(
+            "INSERT INTO sentences (key, value, size, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, last_used = excluded.last_used",
+            rows
+        )
+        self.conn.commit()
+        cache_stats["writes"] += len(rows)
+        self.evict()
+
+    def put(self, sentence: str, tokens, entities):
+        self.put_many({sentence: (tokens, entities)})
+
+    def total_bytes(self) -> int:
+        return self.conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICTION_TARGET
+        while total > target:
+            rows = self.conn.execute(
+                "SELECT key, size FROM sentences ORDER BY last_used LIMIT ?", (EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                victims.append((key,))
+                total -= size
+            self.conn.executemany("DELETE FROM sentences WHERE key = ?", victims)
+            cache_stats["evictions"] += len(victims)
+        self.conn.commit()
+
+    def close(self):
+        self.write_touches()
+        self.conn.commit()
+        self.conn.close()
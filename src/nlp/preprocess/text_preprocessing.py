@@ -1,13 +1,23 @@
+# Heavy resources (NLTK corpora, WordNet, the BERT NER model, the car catalog) are loaded on
+# first use through the get_* functions below, so importing this module is cheap and tools
+# that only need clean_text() never pay for them. warm_up() loads them ahead of time.
 import re
+import sys
 import string
-import json
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from pathlib import Path
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import nltk
 
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+from ner_batching import plan_ner_batches, NER_MAX_BATCH_TOKENS
+from sentence_cache import SentenceCache, DEFAULT_CACHE_PATH, DEFAULT_CACHE_MAX_MB
+from ner_cascade import DEFAULT_NER_PROFILE, cascade_stats, might_carry_entities, validate_ner_profile
+from ner_service import DEFAULT_NER_SERVICE_ADDRESS, connect_ner_service
+from ner_backends import DEFAULT_NER_BACKEND, load_ner_model, validate_ner_backend
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from utils.car_catalog import get_catalog
+from utils.phrase_matcher import build_car_gazetteer
+from lemma_cache import LemmaCache, LEMMA_SNAPSHOT_PATH, build_lemma_snapshot, read_lemma_snapshot, save_lemma_snapshot
 
 # Download necessary NLTK data once
 # nltk.download('punkt')
@@ -15,26 +25,73 @@ from transformers import AutoTokenizer, AutoModelForTokenClassification, pipelin
 # nltk.download('wordnet')
 # nltk.download('omw-1.4')
 
-stop_words = set(stopwords.words('english'))
-lemmatizer = WordNetLemmatizer()
-
-# Load pretrained BERT NER model and tokenizer
+# Pretrained BERT NER model
 ner_model_name = "dslim/bert-base-NER"
-tokenizer = AutoTokenizer.from_pretrained(ner_model_name)
-model = AutoModelForTokenClassification.from_pretrained(ner_model_name)
-ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
-
-# Load car brands and models dictionary for augmentation
-car_data_path = Path("data/car_data.json")
-with open(car_data_path, "r", encoding="utf-8") as f:
-    car_data = json.load(f)
-
-brands = car_data.get("brands", {})
-brand_names = set(brand.lower() for brand in brands.keys())
-model_names = set()
-for models_list in brands.values():
-    for model in models_list:
-        model_names.add(model.lower())
+
+# Upper bound on sentences per NER forward pass in batched mode
+NER_BATCH_SIZE = 32
+
+# Treebank contractions that can still apply after clean_text() has removed apostrophes
+CLEANED_CONTRACTIONS = [
+    re.compile(pattern) for pattern in (
+        r"\b(can)(not)\b", r"\b(gim)(me)\b", r"\b(gon)(na)\b", r"\b(got)(ta)\b", r"\b(lem)(me)\b",
+        r"\b(wan)(na)(?=\s)",
+    )
+]
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+# Memoized, interning front of the WordNet lemmatizer; see enable_lemma_snapshot()
+@lru_cache(maxsize=None)
+def get_lemma_cache() -> LemmaCache:
+    from nltk.stem import WordNetLemmatizer
+    return LemmaCache(WordNetLemmatizer().lemmatize)
+
+# The Treebank tokenizer behind word_tokenize, applied to one sentence without re-splitting it
+@lru_cache(maxsize=None)
+def get_word_tokenizer():
+    from nltk.tokenize import NLTKWordTokenizer
+    return NLTKWordTokenizer()
+
+def split_sentences(text: str):
+    from nltk.tokenize import sent_tokenize
+    return sent_tokenize(text)
+
+@lru_cache(maxsize=None)
+def get_ner_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(ner_model_name)
+
+# NER pipeline on the given inference backend (torch, int8 or onnx, see ner_backends.py)
+@lru_cache(maxsize=None)
+def load_ner_pipeline(backend: str, threads=None):
+    from transformers import pipeline
+    model = load_ner_model(ner_model_name, backend, threads)
+    return pipeline("ner", model=model, tokenizer=get_ner_tokenizer(), aggregation_strategy="simple")
+
+def get_ner_pipeline():
+    return load_ner_pipeline(ner_backend, ner_threads)
+
+# Token trie over the car catalog, so multi-word names ("land cruiser", "model 3") match too
+@lru_cache(maxsize=None)
+def get_car_gazetteer():
+    return build_car_gazetteer(get_catalog(), get_word_tokenizer().tokenize)
+
+# Loads every resource now instead of on first use, e.g. in a worker before it takes tasks.
+# With ner=False the BERT model is left unloaded (the fast NER profile never needs it).
+def warm_up(ner: bool = True):
+    get_stop_words()
+    get_lemma_cache().lemmatize_fn("cars")
+    split_sentences("Warm up.")
+    get_car_gazetteer()
+    if ner:
+        get_ner_pipeline()
+
+# Bumped whenever dictionary matching or the context rules change the entities produced for a sentence
+GAZETTEER_VERSION = 2
 
 # Set of ambiguous tokens to exclude unless strong context found
 AMBIGUOUS_TOKENS = {
@@ -44,6 +101,89 @@ AMBIGUOUS_TOKENS = {
 
 ALWAYS_EXCLUDE = {"i", "is"}
 
+# Optional persistent cache of per-sentence results, see enable_sentence_cache()
+sentence_cache = None
+
+# Entity extraction profile (full, cascade or fast), see ner_cascade.py and set_ner_profile()
+ner_profile = DEFAULT_NER_PROFILE
+
+# Connection to a running NER service and its address, see enable_ner_service()
+ner_client = None
+ner_service_address = None
+# Reconnection attempts after a failed service request before falling back to in-process NER
+NER_SERVICE_RETRIES = 1
+
+# NER inference backend and its thread count (None keeps the library default), see set_ner_backend()
+ner_backend = DEFAULT_NER_BACKEND
+ner_threads = None
+
+# Identifies everything per-sentence results depend on: the NER model and backend, the car_data.json
+# version, the dictionary matching rules and the NER profile. The fp32 torch backend is the default
+# and is left out, so versions from before backends existed stay valid.
+def preprocessing_version() -> str:
+    model = ner_model_name if ner_backend == DEFAULT_NER_BACKEND else f"{ner_model_name}@{ner_backend}"
+    return f"{model}|car_data:{get_catalog().version}|gazetteer:{GAZETTEER_VERSION}|ner:{ner_profile}"
+
+# Selects the NER inference backend. Like the profile, set it before enable_sentence_cache().
+def set_ner_backend(backend: str, threads=None):
+    global ner_backend, ner_threads
+    ner_backend = validate_ner_backend(backend)
+    ner_threads = threads
+
+# Selects the NER profile. Call before enable_sentence_cache() so cached results are namespaced by it.
+def set_ner_profile(profile: str):
+    global ner_profile
+    ner_profile = validate_ner_profile(profile)
+
+# Sends entity extraction to a running NER service (ner_service.py) instead of loading the model
+# in this process. Returns False, keeping in-process inference, if no compatible service answers.
+def enable_ner_service(address=DEFAULT_NER_SERVICE_ADDRESS) -> bool:
+    global ner_client, ner_service_address
+    if ner_client is not None:
+        ner_client.close()
+    ner_service_address = address
+    ner_client = connect_ner_service(address, preprocessing_version())
+    return ner_client is not None
+
+# Entities from the NER service, with the service's BERT count added to cascade_stats. A failed
+# request is retried on a fresh connection; if the service stays unreachable, returns None and
+# inference runs in-process from now on.
+def service_entities(texts):
+    global ner_client
+    for attempt in range(NER_SERVICE_RETRIES + 1):
+        try:
+            entities, bert_sentences = ner_client.find_car_entities_batch(texts)
+        except (OSError, EOFError, ValueError, RuntimeError) as e:
+            print(f"⚠️ NER service request failed ({e})")
+            ner_client.close()
+            ner_client = None
+            if attempt == NER_SERVICE_RETRIES:
+                break
+            print(f"🔁 Reconnecting to the NER service at {ner_service_address}")
+            ner_client = connect_ner_service(ner_service_address, preprocessing_version())
+            if ner_client is None:
+                break
+            continue
+        cascade_stats["sentences"] += len(texts)
+        cascade_stats["bert_sentences"] += bert_sentences
+        return entities
+    print("⚠️ NER service unavailable, falling back to in-process inference for the rest of this run")
+    return None
+
+# Opens the on-disk sentence cache; entries are namespaced by preprocessing_version().
+def enable_sentence_cache(path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_CACHE_MAX_MB):
+    global sentence_cache
+    close_sentence_cache()
+    sentence_cache = SentenceCache(path, namespace=preprocessing_version(), max_mb=max_mb)
+    return sentence_cache
+
+# Closes the sentence cache, saving the last_used times of hits it has not written yet.
+def close_sentence_cache():
+    global sentence_cache
+    if sentence_cache is not None:
+        sentence_cache.close()
+        sentence_cache = None
+
 # Text cleanup
 def clean_text(text: str) -> str:
     # Lowercase the text
@@ -64,11 +204,21 @@ def clean_text(text: str) -> str:
 
     return text
 
-# Checks if an ambiguous token appears in a car-related context within the sentence.
-def is_valid_car_context(token: str, sentence: str, entity_group: str) -> bool:
+# Treebank tokens of a raw sentence with their (start, end) character offsets. Computed once per
+# sentence and shared by the BERT prefilter, gazetteer matching, context checks and NER alignment.
+def tokenize_with_offsets(sentence: str):
+    try:
+        spans = list(get_word_tokenizer().span_tokenize(sentence))
+    except ValueError:
+        # Offsets could not be aligned (unusual quoting); tokens are still usable without them
+        return get_word_tokenizer().tokenize(sentence), None
+    return [sentence[start:end] for start, end in spans], spans
+
+# Checks if an ambiguous token appears in a car-related context within the sentence's lowercased tokens.
+def is_valid_car_context(token: str, words, entity_group: str) -> bool:
     if token in AMBIGUOUS_TOKENS:
         window_size = 3
-        words = sentence.lower().split()
+        catalog = get_catalog()
         if token not in words:
             return False
         idxs = [i for i, w in enumerate(words) if w == token]
@@ -79,7 +229,7 @@ def is_valid_car_context(token: str, sentence: str, entity_group: str) -> bool:
             for w in context_window:
                 if w.isdigit() and 1900 <= int(w) <= 2030:
                     return True
-            if any(w in brand_names or w in model_names for w in context_window):
+            if any(w in catalog.brand_names or w in catalog.model_names for w in context_window):
                 return True
         return False
     return True
@@ -87,34 +237,100 @@ def is_valid_car_context(token: str, sentence: str, entity_group: str) -> bool:
 # Corrects entity group to CAR_BRAND or CAR_MODEL if word matches known brands/models.
 def fix_entity_group(ent, word: str) -> str:
     word_lower = word.lower()
-    if word_lower in brand_names:
+    catalog = get_catalog()
+    if word_lower in catalog.brand_names:
         return "CAR_BRAND"
-    elif word_lower in model_names:
+    elif word_lower in catalog.model_names:
         return "CAR_MODEL"
     return ent.get("entity_group", "")
 
+# Adds token_start/token_end to a BERT entity from its character offsets: the tokens overlapping it.
+def align_entity_tokens(ent, spans):
+    if spans is None or ent.get("start") is None or ent.get("end") is None:
+        return
+    ends = [end for _, end in spans]
+    starts = [start for start, _ in spans]
+    ent["token_start"] = bisect_right(ends, ent["start"])
+    ent["token_end"] = max(bisect_left(starts, ent["end"]), ent["token_start"])
+
+# True if the sentence goes through BERT under the given profile.
+def needs_bert(tokens, profile: str) -> bool:
+    if profile == "full":
+        return True
+    if profile == "fast":
+        return False
+    return might_carry_entities(tokens, get_car_gazetteer(), get_stop_words())
+
 # Extracts and filters car-related entities from text using NER and dictionary matching.
-def find_car_entities(text: str):
-    bert_entities = ner_pipeline(text)
-    tokens = word_tokenize(text)
-    
+def find_car_entities(text: str, profile: str = None):
+    if ner_client is not None and profile in (None, ner_profile):
+        entities = service_entities([text])
+        if entities is not None:
+            return entities[0]
+    tokens, spans = tokenize_with_offsets(text)
+    use_bert = needs_bert(tokens, profile or ner_profile)
+    cascade_stats["sentences"] += 1
+    cascade_stats["bert_sentences"] += use_bert
+    return filter_car_entities(text, get_ner_pipeline()(text) if use_bert else [], tokens, spans)
+
+# Runs NER over many sentences in length-bucketed batches and filters each sentence's entities.
+# Sentences the profile keeps away from BERT only get dictionary matches.
+def find_car_entities_batch(texts, batch_size: int = NER_BATCH_SIZE, max_batch_tokens: int = NER_MAX_BATCH_TOKENS,
+                            profile: str = None):
+    texts = list(texts)
+    if not texts:
+        return []
+    # The service runs the configured profile; any other profile is computed here
+    if ner_client is not None and profile in (None, ner_profile):
+        entities = service_entities(texts)
+        if entities is not None:
+            return entities
+    return run_ner_batch(texts, batch_size, max_batch_tokens, profile)[0]
+
+# In-process part of find_car_entities_batch(): the entities of each text and, per text,
+# whether it went through BERT (the NER service reports these counts back to its clients).
+def run_ner_batch(texts, batch_size: int = NER_BATCH_SIZE, max_batch_tokens: int = NER_MAX_BATCH_TOKENS,
+                  profile: str = None):
+    profile = profile or ner_profile
+    tokenized = [tokenize_with_offsets(text) for text in texts]
+    bert_outputs = [[] for _ in texts]
+    bert_flags = [needs_bert(tokens, profile) for tokens, _ in tokenized]
+    bert_indices = [i for i, flag in enumerate(bert_flags) if flag]
+    cascade_stats["sentences"] += len(texts)
+    cascade_stats["bert_sentences"] += len(bert_indices)
+    if bert_indices:
+        bert_texts = [texts[i] for i in bert_indices]
+        ner_pipeline = get_ner_pipeline()
+        for batch in plan_ner_batches(bert_texts, get_ner_tokenizer(), max_batch_tokens, batch_size):
+            outputs = ner_pipeline([bert_texts[i] for i in batch], batch_size=len(batch))
+            for i, entities in zip(batch, outputs):
+                bert_outputs[bert_indices[i]] = entities
+    entities = [
+        filter_car_entities(text, entities, tokens, spans)
+        for text, entities, (tokens, spans) in zip(texts, bert_outputs, tokenized)
+    ]
+    return entities, bert_flags
+
+# Merges raw BERT entities with dictionary matches and drops noisy ones. `tokens` and `spans`
+# come from tokenize_with_offsets(text) and are computed here if not given.
+def filter_car_entities(text: str, bert_entities, tokens=None, spans=None):
+    if tokens is None:
+        tokens, spans = tokenize_with_offsets(text)
+    words = [token.lower() for token in tokens]
+
     for ent in bert_entities:
         ent["entity_group"] = fix_entity_group(ent, ent["word"])
-
-    tokens_lower = [t.lower() for t in tokens]
-    matched_brands = [t for t in tokens_lower if t in brand_names]
-    matched_models = [t for t in tokens_lower if t in model_names]
+        align_entity_tokens(ent, spans)
 
     existing_words = set(ent['word'].lower() for ent in bert_entities)
 
-    for brand in matched_brands:
-        if brand not in existing_words:
-            bert_entities.append({"word": brand, "entity_group": "CAR_BRAND", "score": 1.0})
-            existing_words.add(brand)
-    for model in matched_models:
-        if model not in existing_words:
-            bert_entities.append({"word": model, "entity_group": "CAR_MODEL", "score": 1.0})
-            existing_words.add(model)
+    # Longest catalog matches; token_start/token_end index into the sentence tokens
+    for start, end, (entity_group, name) in get_car_gazetteer().iter_matches(words):
+        if name not in existing_words:
+            bert_entities.append({
+                "word": name, "entity_group": entity_group, "score": 1.0, "token_start": start, "token_end": end
+            })
+            existing_words.add(name)
 
     filtered_entities = []
     for ent in bert_entities:
@@ -124,7 +340,7 @@ def find_car_entities(text: str):
         if token.startswith("##"):
             continue
         if len(token) <= 2 or token in AMBIGUOUS_TOKENS:
-            if not is_valid_car_context(token, text, ent['entity_group']):
+            if not is_valid_car_context(token, words, ent['entity_group']):
                 continue
         if all(c in string.punctuation for c in token):
             continue
@@ -134,24 +350,108 @@ def find_car_entities(text: str):
 
     return filtered_entities
 
+# word_tokenize() of clean_text() output. Cleaned ASCII text holds only letters, digits, hyphens
+# and single spaces, where the Treebank rules reduce to splitting on spaces, "--" and a few
+# apostrophe-free contractions ("cannot", "gonna"), so the full tokenizer only runs on the rest.
+def tokenize_cleaned(cleaned: str):
+    if not cleaned.isascii() or "--" in cleaned:
+        from nltk.tokenize import word_tokenize
+        return word_tokenize(cleaned)
+    text = f" {cleaned} "
+    for regexp in CLEANED_CONTRACTIONS:
+        text = regexp.sub(r" \1 \2 ", text)
+    return text.split()
+
+# Cleaned, tokenized sentence without stopwords, before lemmatization.
+def normalize_sentence_tokens(sentence: str):
+    stop_words = get_stop_words()
+    return [token for token in tokenize_cleaned(clean_text(sentence)) if token not in stop_words]
+
+# Cleans, tokenizes, removes stopwords and lemmatizes a single sentence.
+def clean_sentence_tokens(sentence: str):
+    lemmatize = get_lemma_cache().lemmatize
+    return [lemmatize(token) for token in normalize_sentence_tokens(sentence)]
+
+# Preloads the lemma cache from a vocabulary snapshot. A missing snapshot is built first from
+# `sample_texts` (raw texts), if given. Returns the number of snapshot entries loaded.
+def enable_lemma_snapshot(path=LEMMA_SNAPSHOT_PATH, sample_texts=None):
+    lemmas = read_lemma_snapshot(path)
+    if lemmas is None and sample_texts is not None:
+        token_lists = (normalize_sentence_tokens(sentence) for text in sample_texts for sentence in split_sentences(text))
+        lemmas = build_lemma_snapshot(token_lists, get_lemma_cache().lemmatize_fn)
+        save_lemma_snapshot(lemmas, path)
+    if lemmas:
+        get_lemma_cache().load_snapshot(lemmas)
+    return len(lemmas or {})
+
+# Returns (tokens, entities) for one sentence, consulting the sentence cache when enabled.
+def analyze_sentence(sentence: str):
+    if sentence_cache is not None:
+        cached = sentence_cache.get(sentence)
+        if cached is not None:
+            return cached
+
+    tokens = clean_sentence_tokens(sentence)
+    entities = find_car_entities(sentence) if tokens else []
+
+    if sentence_cache is not None:
+        sentence_cache.put(sentence, tokens, entities)
+    return tokens, entities
+
+# Returns {sentence: (tokens, entities)} for many sentences; cache misses share batched NER passes.
+def analyze_sentences_batch(sentences, batch_size: int = NER_BATCH_SIZE, max_batch_tokens: int = NER_MAX_BATCH_TOKENS):
+    unique_sentences = list(dict.fromkeys(sentences))
+    results = sentence_cache.get_many(unique_sentences) if sentence_cache is not None else {}
+
+    missing = [s for s in unique_sentences if s not in results]
+    tokens = {s: clean_sentence_tokens(s) for s in missing}
+    ner_sentences = [s for s in missing if tokens[s]]
+    entities = find_car_entities_batch(ner_sentences, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    entities_by_sentence = dict(zip(ner_sentences, entities))
+
+    fresh = {s: (tokens[s], entities_by_sentence.get(s, [])) for s in missing}
+    if sentence_cache is not None:
+        sentence_cache.put_many(fresh)
+    results.update(fresh)
+    return results
+
 # Tokenizes, cleans, lemmatizes sentences and extracts named car entities per sentence.
 def preprocess_sentences(text: str):
-    sentences = sent_tokenize(text)
+    sentences = split_sentences(text)
     cleaned_sentences_tokens = []
     ner_entities_per_sentence = []
 
     for sentence in sentences:
-        cleaned = clean_text(sentence)
-        tokens = word_tokenize(cleaned)
-        tokens = [token for token in tokens if token not in stop_words]
-        tokens = [lemmatizer.lemmatize(token) for token in tokens]
+        tokens, entities = analyze_sentence(sentence)
 
         if tokens:
             cleaned_sentences_tokens.append(tokens)
-            entities = find_car_entities(sentence)
             ner_entities_per_sentence.append(entities)
 
     return {
         "cleaned_sentences_tokens": cleaned_sentences_tokens,
         "ner_entities": ner_entities_per_sentence
-    }
\ No newline at end of file
+    }
+
+# Batched variant of preprocess_sentences: sentences from all texts share NER forward passes.
+def preprocess_sentences_batch(texts, batch_size: int = NER_BATCH_SIZE, max_batch_tokens: int = NER_MAX_BATCH_TOKENS):
+    sentences_per_text = [split_sentences(text) for text in texts]
+    analyzed = analyze_sentences_batch(
+        [sentence for sentences in sentences_per_text for sentence in sentences],
+        batch_size=batch_size, max_batch_tokens=max_batch_tokens
+    )
+
+    results = []
+    for sentences in sentences_per_text:
+        cleaned_sentences_tokens = []
+        ner_entities_per_sentence = []
+        for sentence in sentences:
+            tokens, entities = analyzed[sentence]
+            if tokens:
+                cleaned_sentences_tokens.append(tokens)
+                ner_entities_per_sentence.append(entities)
+        results.append({
+            "cleaned_sentences_tokens": cleaned_sentences_tokens,
+            "ner_entities": ner_entities_per_sentence
+        })
+    return results
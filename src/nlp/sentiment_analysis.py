@@ -1,41 +1,56 @@
 import os
-import json
+import sys
+import argparse
 from pathlib import Path
+from functools import lru_cache
 from typing import Dict, List
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
 
-# Uncomment if running for the first time
-# nltk.download('vader_lexicon')
-
-# Initialize sentiment analyzer
-sia = SentimentIntensityAnalyzer()
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.car_relevance import is_car_related, iter_car_records
+from utils.checkpoint import ChunkCheckpoint, input_signature, run_fingerprint
+from utils.corpus_io import (
+    CORPUS_FORMATS, RecordWriter, corpus_files, corpus_path, corpus_stem, iter_chunks
+)
+from utils.sentiment_store import (
+    artifact_path, categorize_sentiment, entity_flags, post_sections, remove_other_sentiment_outputs,
+    save_sentiment_artifact
+)
+from sentiment_engine import (
+    SCORERS, DEFAULT_SCORER, SentimentEngine, scores_dict, reset_sentiment_stats, format_sentiment_report
+)
 
 # Paths
 INPUT_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path("data/sentiment_analysis")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def categorize_sentiment(compound_score: float, pos_threshold=0.05, neg_threshold=-0.05) -> str:
-    if compound_score >= pos_threshold:
-        return "positive"
-    elif compound_score <= neg_threshold:
-        return "negative"
-    else:
-        return "neutral"
+# Posts per checkpointed chunk
+CHECKPOINT_EVERY = 500
+# Scores only, referencing the preprocessed sentences (see utils/sentiment_store.py)
+COMPACT_FORMAT = "compact"
+OUTPUT_FORMATS = (COMPACT_FORMAT,) + CORPUS_FORMATS
+
+# Single-process engine used when no engine is passed in
+@lru_cache(maxsize=None)
+def get_engine() -> SentimentEngine:
+    return SentimentEngine()
 
-def analyze_tokenized_sentences(token_lists: List[List[str]]) -> Dict:
+# `scores` maps the joined sentences to score tuples from SentimentEngine.score(); without
+# it the sentences are scored here.
+def analyze_tokenized_sentences(token_lists: List[List[str]], scores=None) -> Dict:
     sentence_sentiments = []
     compound_scores = []
-
-    for tokens in token_lists:
-        sentence = " ".join(tokens)
-        scores = sia.polarity_scores(sentence)
-        compound_scores.append(scores["compound"])
-        category = categorize_sentiment(scores["compound"])
+    sentences = [" ".join(tokens) for tokens in token_lists]
+    if scores is None:
+        scores = get_engine().score(sentences)
+
+    for sentence in sentences:
+        sentence_scores = scores_dict(scores[sentence])
+        compound_scores.append(sentence_scores["compound"])
+        category = categorize_sentiment(sentence_scores["compound"])
         sentence_sentiments.append({
             "sentence": sentence,
-            "scores": scores,
+            "scores": sentence_scores,
             "category": category
         })
 
@@ -50,24 +65,15 @@ def analyze_tokenized_sentences(token_lists: List[List[str]]) -> Dict:
         }
     }
 
-def has_car_entity(ner_data: List[List[Dict]]) -> bool:
-    for sentence_entities in ner_data:
-        for ent in sentence_entities:
-            if ent.get("entity_group") in {"CAR_BRAND", "CAR_MODEL"}:
-                return True
-    return False
-
-def is_car_related(post: Dict) -> bool:
-    if has_car_entity(post.get("preprocessed_title", {}).get("ner_entities", [])):
-        return True
-    if has_car_entity(post.get("preprocessed_selftext", {}).get("ner_entities", [])):
-        return True
-    for comment in post.get("comments", []):
-        if has_car_entity(comment.get("preprocessed_body", {}).get("ner_entities", [])):
-            return True
-    return False
+# Joined sentences of a post's title, selftext and comments, in the order they are scored.
+def post_sentences(post: Dict):
+    fields = [post.get("preprocessed_title", {}), post.get("preprocessed_selftext", {})]
+    fields += [comment.get("preprocessed_body", {}) for comment in post.get("comments", [])]
+    for data in fields:
+        for tokens in data.get("cleaned_sentences_tokens", []):
+            yield " ".join(tokens)
 
-def analyze_post_sentiment(post: Dict) -> Dict:
+def analyze_post_sentiment(post: Dict, scores=None) -> Dict:
     result = {
         "id": post.get("id", ""),
         "title_sentiment": {},
@@ -79,18 +85,18 @@ def analyze_post_sentiment(post: Dict) -> Dict:
     selftext_data = post.get("preprocessed_selftext", {})
 
     result["title_sentiment"] = {
-        "sentiment": analyze_tokenized_sentences(title_data.get("cleaned_sentences_tokens", [])),
+        "sentiment": analyze_tokenized_sentences(title_data.get("cleaned_sentences_tokens", []), scores),
         "ner_entities": title_data.get("ner_entities", [])
     }
 
     result["selftext_sentiment"] = {
-        "sentiment": analyze_tokenized_sentences(selftext_data.get("cleaned_sentences_tokens", [])),
+        "sentiment": analyze_tokenized_sentences(selftext_data.get("cleaned_sentences_tokens", []), scores),
         "ner_entities": selftext_data.get("ner_entities", [])
     }
 
     for comment in post.get("comments", []):
         body_data = comment.get("preprocessed_body", {})
-        sentiment = analyze_tokenized_sentences(body_data.get("cleaned_sentences_tokens", []))
+        sentiment = analyze_tokenized_sentences(body_data.get("cleaned_sentences_tokens", []), scores)
         ner = body_data.get("ner_entities", [])
         result["comments_sentiment"].append({
             "id": comment.get("id", ""),
@@ -100,22 +106,91 @@ def analyze_post_sentiment(post: Dict) -> Dict:
 
     return result
 
-def process_file(input_file: Path):
+# All sentences of the car-related posts are scored in one engine call, so repeats within
+# the chunk are scored once and the rest can be spread over the engine's workers.
+def analyze_posts(posts, engine: SentimentEngine = None) -> List[Dict]:
+    car_posts = [post for post in posts if is_car_related(post)]
+    engine = engine or get_engine()
+    scores = engine.score(sentence for post in car_posts for sentence in post_sentences(post))
+    return [analyze_post_sentiment(post, scores) for post in car_posts]
+
+# Joined sentences of a post in post_sentences() order, with None in place of the sentences
+# without a car entity when `lazy`; those are scored later, when a reader needs them.
+def eager_sentences(post: Dict, lazy: bool = False):
+    for section in post_sections(post):
+        flags = entity_flags(section)
+        for tokens, flag in zip(section.get("cleaned_sentences_tokens", []), flags):
+            yield " ".join(tokens) if flag or not lazy else None
+
+# Compact counterpart of analyze_posts() for (index, post) pairs of car-related posts: the
+# post's position in the preprocessed file and its score tuples in post_sentences() order.
+def score_posts(indexed_posts, engine: SentimentEngine = None, lazy: bool = False) -> List[Dict]:
+    engine = engine or get_engine()
+    sentences = [(index, list(eager_sentences(post, lazy))) for index, post in indexed_posts]
+    scores = engine.score(sentence for _, post_sentences in sentences for sentence in post_sentences if sentence)
+    return [
+        {"post": index, "scores": [list(scores[sentence]) if sentence else None for sentence in post_sentences]}
+        for index, post_sentences in sentences
+    ]
+
+# Scores one preprocessed file, streaming posts in and results out. Results are committed
+# every `checkpoint_every` car-related posts, so an interrupted run picks up after the last committed chunk.
+def process_file(input_file: Path, checkpoint_every: int = CHECKPOINT_EVERY, fmt: str = COMPACT_FORMAT,
+                 engine: SentimentEngine = None, lazy: bool = False):
     print(f"📥 Processing {input_file.name}")
-    with open(input_file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-
-    results = []
-    for post in posts:
-        if is_car_related(post):
-            results.append(analyze_post_sentiment(post))
-
-    output_file = OUTPUT_DIR / input_file.name
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    reset_sentiment_stats()
+    stem = corpus_stem(input_file)
+    compact = fmt == COMPACT_FORMAT
+    output_file = artifact_path(OUTPUT_DIR, stem) if compact else corpus_path(OUTPUT_DIR, stem, fmt)
+    scorer = engine.scorer if engine else DEFAULT_SCORER
+    # "car-posts": chunks count car-related posts only, unlike checkpoints written before the relevance metadata
+    checkpoint = ChunkCheckpoint(output_file, run_fingerprint(input_signature(input_file), checkpoint_every, scorer,
+                                                              "car-posts", "lazy" if lazy else "eager"))
+    first_chunk = checkpoint.committed_count()
+    if first_chunk:
+        print(f"⏩ Resuming after {first_chunk:,} committed chunks")
+
+    # Chunks hold car-related posts only; the others are skipped while reading
+    for index, posts in enumerate(iter_chunks(iter_car_records(input_file, with_index=compact), checkpoint_every)):
+        if index < first_chunk:
+            continue
+        checkpoint.commit(index, score_posts(posts, engine, lazy) if compact else analyze_posts(posts, engine))
+
+    if compact:
+        records = ((record["post"], record["scores"]) for record in checkpoint.iter_records())
+        save_sentiment_artifact(output_file, input_file, records, scorer, lazy)
+    else:
+        with RecordWriter(output_file) as writer:
+            writer.write_all(checkpoint.iter_records())
+    remove_other_sentiment_outputs(OUTPUT_DIR, stem, output_file)
+    checkpoint.clear()
 
+    print(f"🧮 {format_sentiment_report()}")
     print(f"✅ Saved to {output_file}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score preprocessed posts with VADER sentiment.")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help="Posts per checkpointed chunk; a restarted run resumes after the last one.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes scoring the distinct sentences of each chunk.")
+    parser.add_argument("--scorer", choices=SCORERS, default=DEFAULT_SCORER,
+                        help="vader: nltk's polarity_scores() per sentence; vectorized: the NumPy port scoring whole "
+                             "batches, for bulk runs. See evaluate_vectorized_sentiment.py for their parity.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=COMPACT_FORMAT,
+                        help="Output format: compact float32 score arrays referencing the preprocessed sentences "
+                             "(default), or full records as a JSON array or one post per line, optionally gzipped.")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Score only the sentences with a car entity now; the rest are scored and cached when a "
+                             "reader first needs them. Compact format only.")
+    args = parser.parse_args()
+    if args.lazy and args.format != COMPACT_FORMAT:
+        parser.error("--lazy needs --format compact")
+    return args
+
 if __name__ == "__main__":
-    for input_file in INPUT_DIR.glob("*.json"):
-        process_file(input_file)
\ No newline at end of file
+    args = parse_args()
+    # One engine for all files, so its memo also covers sentences repeated across files
+    with SentimentEngine(args.workers, scorer=args.scorer) as engine:
+        for input_file in corpus_files(INPUT_DIR):
+            process_file(input_file, args.checkpoint_every, args.format, engine, args.lazy)
\ No newline at end of file
@@ -0,0 +1,124 @@
+# VADER scoring with deduplication, memoization and an optional process pool.
+#
+# Sentences are scored as the space-joined cleaned tokens, exactly as before, so scores are
+# unchanged. Each batch handed to SentimentEngine.score() is deduplicated first; scores of
+# sentences seen earlier in the run come from an LRU memo keyed by a 16-byte hash of the
+# sentence, and only the remaining sentences are scored, in slices spread over the worker
+# processes. Scores are kept as (neg, neu, pos, compound) tuples to keep the memo small.
+#
+# The "vader" scorer calls polarity_scores() sentence by sentence; "vectorized" scores whole
+# batches with the NumPy port in vader_vectorized.py, for bulk runs.
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict, List
+
+SCORE_KEYS = ("neg", "neu", "pos", "compound")
+SCORERS = ("vader", "vectorized")
+DEFAULT_SCORER = "vader"
+# Distinct sentences whose scores are remembered for the rest of the run
+SENTIMENT_MEMO_SIZE = 500_000
+# Sentences per task sent to a worker process
+SCORE_SLICE_SIZE = 2000
+
+# Running totals for the current run, reported after each file
+sentiment_stats = {"sentences": 0, "memo_hits": 0, "scored": 0}
+
+def reset_sentiment_stats():
+    for key in sentiment_stats:
+        sentiment_stats[key] = 0
+
+def format_sentiment_report() -> str:
+    total = sentiment_stats["sentences"]
+    repeated = total - sentiment_stats["scored"]
+    share = repeated / total if total else 0.0
+    return (
+        f"sentiment: {total:,} sentences, {sentiment_stats['scored']:,} scored by VADER, "
+        f"{repeated:,} repeats skipped ({share:.1%}), {sentiment_stats['memo_hits']:,} from earlier batches"
+    )
+
+def sentence_key(sentence: str) -> bytes:
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=16).digest()
+
+# Needs the VADER lexicon; on first use run nltk.download('vader_lexicon')
+@lru_cache(maxsize=None)
+def get_analyzer():
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+@lru_cache(maxsize=None)
+def get_vectorized():
+    from vader_vectorized import VectorizedVader
+    return VectorizedVader(get_analyzer())
+
+# Runs in the worker processes as well as in-process.
+def score_sentences(sentences: List[str], scorer: str = DEFAULT_SCORER) -> List[tuple]:
+    if scorer == "vectorized":
+        return get_vectorized().score(sentences)
+    sia = get_analyzer()
+    return [tuple(sia.polarity_scores(sentence)[key] for key in SCORE_KEYS) for sentence in sentences]
+
+def scores_dict(values: tuple) -> Dict[str, float]:
+    return dict(zip(SCORE_KEYS, values))
+
+class SentimentEngine:
+    def __init__(self, workers: int = 1, memo_size: int = SENTIMENT_MEMO_SIZE, slice_size: int = SCORE_SLICE_SIZE,
+                 scorer: str = DEFAULT_SCORER):
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown sentiment scorer '{scorer}', expected one of {SCORERS}")
+        self.scorer = scorer
+        self.memo = OrderedDict()
+        self.memo_size = memo_size
+        self.slice_size = slice_size
+        self.pool = None
+        if workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def remember(self, key: bytes, values: tuple):
+        self.memo[key] = values
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def score_missing(self, sentences: List[str]) -> List[tuple]:
+        if self.pool is None or len(sentences) <= self.slice_size:
+            return score_sentences(sentences, self.scorer)
+        slices = [sentences[i:i + self.slice_size] for i in range(0, len(sentences), self.slice_size)]
+        return [values for chunk in self.pool.map(score_sentences, slices, repeat(self.scorer)) for values in chunk]
+
+    # Score tuples of every distinct sentence in `sentences`, keyed by the sentence.
+    def score(self, sentences) -> Dict[str, tuple]:
+        sentences = list(sentences)
+        sentiment_stats["sentences"] += len(sentences)
+        scores = {}
+        missing = {}
+        for sentence in sentences:
+            if sentence in scores or sentence in missing:
+                continue
+            key = sentence_key(sentence)
+            values = self.memo.get(key)
+            if values is None:
+                missing[sentence] = key
+            else:
+                self.memo.move_to_end(key)
+                sentiment_stats["memo_hits"] += 1
+                scores[sentence] = values
+        if missing:
+            for (sentence, key), values in zip(missing.items(), self.score_missing(list(missing))):
+                self.remember(key, values)
+                scores[sentence] = values
+            sentiment_stats["scored"] += len(missing)
+        return scores
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,288 @@
+# Vectorized VADER: the rules of nltk's SentimentIntensityAnalyzer.polarity_scores() applied
+# to whole batches of sentences with NumPy.
+#
+# Every distinct whitespace token is mapped once to an id, with its VADER word (the token
+# without one leading/trailing punctuation mark, or nothing for 1-character tokens) and its
+# "!"/"?" counts. Every distinct word gets one row in lookup arrays: lexicon valence, booster
+# increment, negation, ALL CAPS and the few words the rules test by name ("kind", "of",
+# "least", "never", "so", "this", "but", ...). Idioms and multi-word boosters ("kind of")
+# become dense bigram/trigram tables over the handful of words they use. A batch is then a
+# padded [sentences x words] id matrix, and each rule is a masked array operation over it
+# with the neighbours at distance 1-3 as shifted copies of the matrix. That includes VADER's
+# quirk of giving a repeated word the valence computed at its first occurrence.
+#
+# Sums are accumulated word by word in the same order (and, on Python 3.12+, with the same
+# compensated summation) as the built-in sum() VADER uses, and the final rounding is Python's,
+# so scores should equal polarity_scores(); evaluate_vectorized_sentiment.py checks that.
+import sys
+from typing import List
+
+import numpy as np
+
+# Sentences per padded batch; sentences are grouped by length to keep padding small
+VECTOR_BATCH_SIZE = 4096
+
+class VectorizedVader:
+    def __init__(self, analyzer):
+        constants = analyzer.constants
+        self.lexicon = analyzer.lexicon
+        self.constants = constants
+        self.boosters = constants.BOOSTER_DICT
+        self.token_ids = {}
+        self.token_word, self.token_excl, self.token_qm = [], [], []
+        self.word_ids = {}
+        self.word_features = []
+        self.word(None)  # id 0: padding
+
+        # Multi-word idioms and boosters, compared word by word (exactly, as VADER does)
+        phrases = list(constants.SPECIAL_CASE_IDIOMS) + [key for key in self.boosters if " " in key]
+        phrase_words = sorted({word for phrase in phrases for word in phrase.split(" ")})
+        self.phrase_code = {word: code for code, word in enumerate(phrase_words, start=1)}
+        size = len(phrase_words) + 1
+        self.phrase_size = size
+        self.idiom2 = np.full(size ** 2, np.nan)
+        self.idiom3 = np.full(size ** 3, np.nan)
+        self.booster2 = np.zeros(size ** 2, dtype=bool)
+        for phrase, value in constants.SPECIAL_CASE_IDIOMS.items():
+            codes = [self.phrase_code[word] for word in phrase.split(" ")]
+            if len(codes) == 2:
+                self.idiom2[codes[0] * size + codes[1]] = value
+            elif len(codes) == 3:
+                self.idiom3[(codes[0] * size + codes[1]) * size + codes[2]] = value
+        for phrase in phrases[len(constants.SPECIAL_CASE_IDIOMS):]:
+            codes = [self.phrase_code[word] for word in phrase.split(" ")]
+            if len(codes) == 2:
+                self.booster2[codes[0] * size + codes[1]] = True
+        self.arrays = None
+
+    # Id of a VADER word, adding its lookup row on first sight.
+    def word(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.word_features)
+            self.word_ids[word] = word_id
+            self.word_features.append(self.features(word))
+            self.arrays = None
+        return word_id
+
+    def features(self, word):
+        if word is None:
+            return (0.0, False, 0.0, False, False, False, False, False, False, False, False, False, False, 0)
+        lower = word.lower()
+        return (
+            self.lexicon.get(lower, 0.0), lower in self.lexicon,
+            self.boosters.get(lower, 0.0), lower in self.boosters,
+            word.isupper(), self.constants.negated([word]),
+            lower == "kind", lower == "of", lower == "least", lower in ("at", "very"), lower == "but",
+            word == "never", word in ("so", "this"),
+            self.phrase_code.get(word, 0),
+        )
+
+    # VADER's word for a whitespace token: None for 1-character tokens, otherwise the token with
+    # one leading or trailing punctuation mark removed if what remains is a punctuation-free word.
+    def vader_word(self, token):
+        if len(token) <= 1:
+            return None
+        strip = self.constants.REGEX_REMOVE_PUNCTUATION
+        for punc in self.constants.PUNC_LIST:
+            if token.endswith(punc):
+                word = token[:-len(punc)]
+                if len(word) > 1 and word == strip.sub("", word):
+                    return word
+        for punc in self.constants.PUNC_LIST:
+            if token.startswith(punc):
+                word = token[len(punc):]
+                if len(word) > 1 and word == strip.sub("", word):
+                    return word
+        return token
+
+    def token(self, token):
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = len(self.token_word)
+            self.token_ids[token] = token_id
+            word = self.vader_word(token)
+            self.token_word.append(self.word(word) if word is not None else -1)
+            self.token_excl.append(token.count("!"))
+            self.token_qm.append(token.count("?"))
+            self.arrays = None
+        return token_id
+
+    def lookup_arrays(self):
+        if self.arrays is None:
+            columns = list(zip(*self.word_features))
+            dtypes = [float, bool, float, bool, bool, bool, bool, bool, bool, bool, bool, bool, bool, np.int64]
+            names = ["lex", "has_lex", "boost", "is_boost", "upper", "negated", "kind", "of", "least",
+                     "at_very", "but", "never", "so_this", "phrase"]
+            self.arrays = {name: np.array(column, dtype=dtype) for name, column, dtype in zip(names, columns, dtypes)}
+            self.arrays["token_word"] = np.array(self.token_word, dtype=np.int64)
+            self.arrays["token_excl"] = np.array(self.token_excl, dtype=np.int64)
+            self.arrays["token_qm"] = np.array(self.token_qm, dtype=np.int64)
+        return self.arrays
+
+    # Rounded (neg, neu, pos, compound) tuples for a list of sentences, in order.
+    def score(self, sentences: List[str]) -> List[tuple]:
+        token_lists = [sentence.split() for sentence in sentences]
+        results = np.zeros((len(sentences), 4))
+        order = np.argsort([len(tokens) for tokens in token_lists], kind="stable")
+        for start in range(0, len(order), VECTOR_BATCH_SIZE):
+            batch = order[start:start + VECTOR_BATCH_SIZE]
+            results[batch] = self.score_batch([token_lists[i] for i in batch])
+        results[:, :3] = python_round(results[:, :3], 3)
+        results[:, 3] = python_round(results[:, 3], 4)
+        return list(map(tuple, results.tolist()))
+
+    def score_batch(self, token_lists) -> np.ndarray:
+        tokens = [token for sentence_tokens in token_lists for token in sentence_tokens]
+        for token in set(tokens).difference(self.token_ids):
+            self.token(token)
+        token_ids = np.fromiter(map(self.token_ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        a = self.lookup_arrays()
+        c = self.constants
+        count = len(token_lists)
+        token_rows = np.repeat(np.arange(count), [len(tokens) for tokens in token_lists])
+        excl = np.bincount(token_rows, weights=a["token_excl"][token_ids], minlength=count)
+        qm = np.bincount(token_rows, weights=a["token_qm"][token_ids], minlength=count)
+
+        # Padded [sentence, position] matrix of word ids
+        words = a["token_word"][token_ids]
+        kept = words >= 0
+        words, rows = words[kept], token_rows[kept]
+        lengths = np.bincount(rows, minlength=count)
+        width = max(int(lengths.max(initial=0)), 1)
+        positions = np.arange(len(words)) - (np.cumsum(lengths) - lengths)[rows]
+        W = np.zeros((count, width), dtype=np.int64)
+        W[rows, positions] = words
+        pos = np.broadcast_to(np.arange(width), W.shape)
+        n = lengths[:, None]
+        valid = pos < n
+
+        def back(k):  # word ids k positions earlier (k < 0: later), padded
+            shifted = np.zeros_like(W)
+            if k > 0:
+                shifted[:, k:] = W[:, :-k]
+            else:
+                shifted[:, :k] = W[:, -k:]
+            return shifted
+        W1, W2, W3, Wn1, Wn2 = back(1), back(2), back(3), back(-1), back(-2)
+
+        uppers = (a["upper"][W] & valid).sum(axis=1)
+        cap_diff = ((uppers > 0) & (uppers < lengths))[:, None]
+
+        lexical = a["has_lex"][W] & valid
+        v = np.where(lexical, a["lex"][W], 0.0)
+        v = np.where(lexical & a["upper"][W] & cap_diff, np.where(v > 0, v + c.C_INCR, v - c.C_INCR), v)
+        for start_i, Wk in enumerate((W1, W2, W3)):
+            applies = lexical & (pos > start_i) & ~a["has_lex"][Wk]
+            s = np.where(v < 0, -a["boost"][Wk], a["boost"][Wk])
+            boost_caps = a["is_boost"][Wk] & a["upper"][Wk] & cap_diff
+            s = np.where(boost_caps, np.where(v > 0, s + c.C_INCR, s - c.C_INCR), s)
+            s = s * (1.0, 0.95, 0.9)[start_i]
+            v = np.where(applies, v + s, v)
+            if start_i == 0:
+                factor = np.where(a["negated"][W1], c.N_SCALAR, 1.0)
+            elif start_i == 1:
+                factor = np.where(a["never"][W2] & a["so_this"][W1], 1.5,
+                                  np.where(a["negated"][W2], c.N_SCALAR, 1.0))
+            else:
+                factor = np.where((a["never"][W3] & a["so_this"][W2]) | a["so_this"][W1], 1.25,
+                                  np.where(a["negated"][W3], c.N_SCALAR, 1.0))
+            v = np.where(applies, v * factor, v)
+            if start_i == 2:
+                v = np.where(applies, self.idioms(v, a["phrase"], W, W1, W2, W3, Wn1, Wn2), v)
+
+        least = a["least"][W1] & ~a["has_lex"][W1]
+        v = np.where(lexical & (pos > 1) & least & ~a["at_very"][W2], v * c.N_SCALAR, v)
+        v = np.where(lexical & (pos == 1) & least, v * c.N_SCALAR, v)
+
+        skipped = a["is_boost"][W] | (a["kind"][W] & a["of"][Wn1] & (pos < n - 1))
+        v = np.where(skipped | ~valid, 0.0, v)
+
+        # A repeated word takes the valence computed at its first occurrence
+        keys = (np.arange(count)[:, None] * len(self.word_features) + W)[valid]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        sentiments = np.zeros_like(v)
+        sentiments[valid] = v[valid][first[inverse.ravel()]]
+
+        # "but": halve the words before the first one and weigh the words after it by 1.5
+        is_but = a["but"][W] & valid
+        has_but = is_but.any(axis=1)[:, None]
+        but_at = np.argmax(is_but, axis=1)[:, None]
+        sentiments = np.where(has_but, sentiments * np.where(pos < but_at, 0.5, np.where(pos > but_at, 1.5, 1.0)),
+                              sentiments)
+
+        return self.score_valence(sentiments, valid, lengths, excl, qm)
+
+    def idioms(self, v, phrase, W, W1, W2, W3, Wn1, Wn2):
+        size = self.phrase_size
+        p, p1, p2, p3 = phrase[W], phrase[W1], phrase[W2], phrase[W3]
+        pn1, pn2 = phrase[Wn1], phrase[Wn2]
+        matched = np.zeros(v.shape, dtype=bool)
+        for table, code in (
+            (self.idiom2, p1 * size + p),
+            (self.idiom3, (p2 * size + p1) * size + p),
+            (self.idiom2, p2 * size + p1),
+            (self.idiom3, (p3 * size + p2) * size + p1),
+            (self.idiom2, p3 * size + p2),
+        ):
+            value = table[code]
+            hit = ~np.isnan(value) & ~matched
+            v = np.where(hit, value, v)
+            matched |= hit
+        # Idioms starting at the word itself override the ones before it
+        for value in (self.idiom2[p * size + pn1], self.idiom3[(p * size + pn1) * size + pn2]):
+            v = np.where(np.isnan(value), v, value)
+        booster_phrase = self.booster2[p3 * size + p2] | self.booster2[p2 * size + p1]
+        return np.where(booster_phrase, v + self.constants.B_DECR, v)
+
+    def score_valence(self, sentiments, valid, lengths, excl, qm) -> np.ndarray:
+        sum_s = python_sum(sentiments)
+        amplifier = np.minimum(excl, 4) * 0.292
+        amplifier += np.where(qm > 1, np.where(qm <= 3, qm * 0.18, 0.96), 0.0)
+        sum_s = np.where(sum_s > 0, sum_s + amplifier, np.where(sum_s < 0, sum_s - amplifier, sum_s))
+        compound = sum_s / np.sqrt(sum_s * sum_s + 15)
+
+        pos_sum = sequential_sum(np.where(sentiments > 0, sentiments + 1, 0.0))
+        neg_sum = sequential_sum(np.where(sentiments < 0, sentiments - 1, 0.0))
+        neu_count = ((sentiments == 0) & valid).sum(axis=1)
+        more_pos = pos_sum > np.abs(neg_sum)
+        more_neg = pos_sum < np.abs(neg_sum)
+        pos_sum = np.where(more_pos, pos_sum + amplifier, pos_sum)
+        neg_sum = np.where(more_neg, neg_sum - amplifier, neg_sum)
+        total = pos_sum + np.abs(neg_sum) + neu_count
+        total = np.where(total == 0, 1.0, total)
+
+        scores = np.stack([np.abs(neg_sum / total), np.abs(neu_count / total), np.abs(pos_sum / total), compound],
+                          axis=1)
+        scores[lengths == 0] = 0.0
+        return scores
+
+# round(value, digits) for every element. np.round() scales, rounds and scales back, which only
+# disagrees with Python's correctly rounded round() next to a tie, so those few go through round().
+def python_round(values: np.ndarray, digits: int) -> np.ndarray:
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(value, digits) for value in values[near_tie].tolist()]
+    return rounded
+
+# Row sums added left to right, like a plain Python loop.
+def sequential_sum(values: np.ndarray) -> np.ndarray:
+    total = np.zeros(values.shape[0])
+    for column in values.T:
+        total += column
+    return total
+
+# Row sums as the built-in sum() computes them: compensated (Neumaier) summation since
+# Python 3.12, a plain left-to-right loop before.
+def python_sum(values: np.ndarray) -> np.ndarray:
+    if sys.version_info < (3, 12):
+        return sequential_sum(values)
+    total = np.zeros(values.shape[0])
+    compensation = np.zeros(values.shape[0])
+    for column in values.T:
+        t = total + column
+        compensation += np.where(np.abs(total) >= np.abs(column), (total - t) + column, (column - t) + total)
+        total = t
+    return np.where(np.isfinite(compensation), total + compensation, total)
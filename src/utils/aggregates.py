@@ -0,0 +1,259 @@
+# Single-pass aggregation over the sentence-level corpus.
+#
+# The analysis and plotting scripts each need one aggregate (brand counts, brand x
+# sentiment counts, word frequencies, ...). Instead of every script walking the whole
+# corpus, each aggregate is an accumulator registered here; run_aggregates() streams
+# the sentences once (from the sentence table if it is current, otherwise straight
+# from the preprocessed and sentiment JSON) and feeds every row to every accumulator.
+# The results are saved as one bundle, and get_aggregate() hands scripts their piece,
+# refreshing the whole bundle in one pass when the inputs have changed.
+import json
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from utils.checkpoint import atomic_write_json
+from utils.problem_keywords import check_sentence_for_issue
+from utils.sentiment_store import categorize_sentiment
+from utils.sentence_table import (
+    PREPROCESSED_DIR, SENTIMENT_DIR, iter_row_groups, iter_sentence_rows, sentence_table_available, table_inputs
+)
+
+AGGREGATES_PATH = Path("data/cache/aggregates.json")
+
+# Bumped whenever an accumulator's result changes shape or meaning
+BUNDLE_VERSION = 1
+
+SECTION_COLUMNS = ("source", "post_id", "comment_id", "section")
+
+ACCUMULATORS = {}
+
+def register_accumulator(cls):
+    ACCUMULATORS[cls.name] = cls
+    return cls
+
+def get_month(utc_ts):
+    try:
+        return datetime.utcfromtimestamp(utc_ts).strftime("%Y-%m")
+    except Exception:
+        return None
+
+def lower_set(words):
+    return {word.lower() for word in words or []}
+
+# Base class: receives every sentence row in corpus order via add(), then finish() once.
+# `columns` lists the row fields the accumulator reads.
+class Accumulator:
+    name = ""
+    columns = ()
+
+    def add(self, row):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+    def result(self):
+        raise NotImplementedError
+
+# Accumulator over whole sections (a title, selftext or comment body). Rows of one section
+# are consecutive, so they are buffered until the section changes.
+class SectionAccumulator(Accumulator):
+    def __init__(self):
+        self.section_key = None
+        self.section_rows = []
+
+    def add(self, row):
+        key = tuple(row[column] for column in SECTION_COLUMNS)
+        if key != self.section_key:
+            self.flush()
+            self.section_key = key
+        self.section_rows.append(row)
+
+    def flush(self):
+        if self.section_rows:
+            self.add_section(self.section_rows)
+            self.section_rows = []
+
+    def finish(self):
+        self.flush()
+
+    def add_section(self, rows):
+        raise NotImplementedError
+
+# Every CAR_BRAND entity (plot_top_car_brands.py)
+@register_accumulator
+class BrandCounts(Accumulator):
+    name = "brand_counts"
+    columns = ("brands",)
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, row):
+        for brand in row["brands"] or []:
+            self.counts[brand.lower()] += 1
+
+    def result(self):
+        return dict(self.counts.most_common())
+
+# Sections mentioning each brand, per month of the post or comment (brand_mentions_over_time.py)
+@register_accumulator
+class BrandMonthCounts(SectionAccumulator):
+    name = "brand_month_counts"
+    columns = SECTION_COLUMNS + ("created_utc", "brands")
+
+    def __init__(self):
+        super().__init__()
+        self.counts = defaultdict(Counter)
+
+    def add_section(self, rows):
+        month = get_month(rows[0]["created_utc"])
+        if not month:
+            return
+        for brand in set().union(*(lower_set(row["brands"]) for row in rows)):
+            self.counts[brand][month] += 1
+
+    def result(self):
+        return {brand: dict(months) for brand, months in self.counts.items()}
+
+# Brands of each scored section by the section's overall sentiment (brand_sentiment_distribution.py)
+@register_accumulator
+class BrandSectionSentiment(SectionAccumulator):
+    name = "brand_section_sentiment"
+    columns = SECTION_COLUMNS + ("brands", "compound", "category")
+
+    def __init__(self):
+        super().__init__()
+        self.counts = defaultdict(Counter)
+
+    def add_section(self, rows):
+        # Posts without sentiment output (not car related) have no category
+        if rows[0]["category"] is None:
+            return
+        overall = categorize_sentiment(sum(row["compound"] for row in rows) / len(rows))
+        for brand in set().union(*(lower_set(row["brands"]) for row in rows)):
+            self.counts[brand][overall] += 1
+
+    def result(self):
+        return {brand: dict(categories) for brand, categories in self.counts.items()}
+
+# Brands of each scored sentence by the sentence's sentiment
+# (brand_sentiment_distribution_sentence_level.py, plot_top_*_sentiment_brands.py)
+@register_accumulator
+class BrandSentenceSentiment(Accumulator):
+    name = "brand_sentence_sentiment"
+    columns = ("brands", "category")
+
+    def __init__(self):
+        self.counts = defaultdict(Counter)
+
+    def add(self, row):
+        if row["category"] is None:
+            return
+        for brand in lower_set(row["brands"]):
+            self.counts[brand][row["category"]] += 1
+
+    def result(self):
+        return {brand: dict(categories) for brand, categories in self.counts.items()}
+
+# Compound scores of the scored sentences mentioning each brand (violin_sentiment_distribution.py)
+@register_accumulator
+class BrandCompoundScores(Accumulator):
+    name = "brand_compound_scores"
+    columns = ("brands", "compound")
+
+    def __init__(self):
+        self.scores = defaultdict(list)
+
+    def add(self, row):
+        if row["compound"] is None:
+            return
+        for brand in lower_set(row["brands"]):
+            self.scores[brand].append(row["compound"])
+
+    def result(self):
+        return dict(self.scores)
+
+# Cleaned token frequencies (generate_word_frequency.py)
+@register_accumulator
+class WordFrequencies(Accumulator):
+    name = "word_frequencies"
+    columns = ("tokens",)
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, row):
+        self.counts.update(row["tokens"] or [])
+
+    def result(self):
+        return dict(self.counts.most_common())
+
+# Problem keyword mentions (extract_problems.py)
+@register_accumulator
+class IssueCounts(Accumulator):
+    name = "issue_counts"
+    columns = ("tokens",)
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, row):
+        self.counts.update(check_sentence_for_issue(row["tokens"] or []))
+
+    def result(self):
+        return dict(self.counts.most_common())
+
+# Streams sentence rows with the given columns, from the sentence table when it is current.
+def iter_rows(columns, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    if sentence_table_available(preprocessed_dir=preprocessed_dir, sentiment_dir=sentiment_dir):
+        for _, table in iter_row_groups(columns):
+            yield from table.to_pylist()
+    else:
+        yield from iter_sentence_rows(preprocessed_dir, sentiment_dir)
+
+# Runs the named accumulators (all registered ones by default) in one pass over the corpus.
+def run_aggregates(names=None, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    accumulators = [ACCUMULATORS[name]() for name in (names or ACCUMULATORS)]
+    columns = sorted(set().union(*(acc.columns for acc in accumulators)))
+    for row in iter_rows(columns, preprocessed_dir, sentiment_dir):
+        for acc in accumulators:
+            acc.add(row)
+    for acc in accumulators:
+        acc.finish()
+    return {acc.name: acc.result() for acc in accumulators}
+
+def build_aggregates(path=AGGREGATES_PATH, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Signatures are taken before the pass so files changed mid-run mark the bundle stale
+    inputs = table_inputs(preprocessed_dir, sentiment_dir)
+    results = run_aggregates(None, preprocessed_dir, sentiment_dir)
+    atomic_write_json(path, {"bundle_version": BUNDLE_VERSION, "inputs": inputs, "results": results})
+    return results
+
+# Results of the saved bundle, or None if it is missing, stale or lacks a registered accumulator.
+def read_aggregates(path=AGGREGATES_PATH, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        bundle = json.load(f)
+    if bundle.get("bundle_version") != BUNDLE_VERSION:
+        return None
+    if bundle.get("inputs") != json.loads(json.dumps(table_inputs(preprocessed_dir, sentiment_dir))):
+        return None
+    if not set(ACCUMULATORS) <= set(bundle.get("results", {})):
+        return None
+    return bundle["results"]
+
+def load_aggregates(path=AGGREGATES_PATH):
+    results = read_aggregates(path)
+    if results is None:
+        print("🔄 Aggregates are missing or stale, rebuilding them in one pass over the corpus")
+        results = build_aggregates(path)
+    return results
+
+def get_aggregate(name, path=AGGREGATES_PATH):
+    return load_aggregates(path)[name]
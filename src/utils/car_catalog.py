@@ -0,0 +1,378 @@
+# Shared, precompiled index over data/car_data.json.
+#
+# car_data.json maps each brand to its models. CarCatalog gives every brand and every
+# distinct (lowercased) model name a numeric id, keeps the brand -> models and the
+# reverse model -> brands maps (a name like "500" or "Seven" belongs to several
+# brands), and an alias table keyed by a normalized form of each name, so "F150",
+# "f-150" and "F 150" all resolve to the catalog's "F-150".
+#
+# The catalog is compiled once into a compact binary file (data/cache/car_catalog.bin)
+# of uint32 arrays and a string table, which is memory-mapped on load. It is rebuilt
+# automatically whenever car_data.json changes. Use get_catalog() so every module in a
+# process shares one instance and matches brands and models the same way.
+import os
+import re
+import json
+import mmap
+import hashlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+CAR_DATA_PATH = Path("data/car_data.json")
+CATALOG_PATH = Path("data/cache/car_catalog.bin")
+
+# Bumped whenever the file layout changes
+CATALOG_VERSION = 1
+HEADER_SIZE_BYTES = 8
+# Alias targets are brand or model ids; brands carry this bit
+BRAND_FLAG = 1 << 31
+
+# Lowercase and drop everything but letters and digits: "F 150", "f-150" -> "f150".
+def normalize_alias(name: str) -> str:
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+# Short content hash of car_data.json; also used to version preprocessing caches.
+def source_version(path=CAR_DATA_PATH) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def source_signature(path):
+    stat = Path(path).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Alias spellings of a catalog name. Brands like "Ford (USA)" are also known without
+# the parenthesised market.
+def name_aliases(name: str):
+    aliases = {normalize_alias(name)}
+    without_market = re.sub(r"\s*\(.*?\)\s*", " ", name).strip()
+    if without_market and without_market != name:
+        aliases.add(normalize_alias(without_market))
+    aliases.discard("")
+    return aliases
+
+def uint32_array(values=()):
+    arr = array("I", values)
+    assert arr.itemsize == 4, "array('I') must be 32-bit"
+    return arr
+
+def compile_catalog(json_path=CAR_DATA_PATH, path=CATALOG_PATH):
+    with open(json_path, "r", encoding="utf-8") as f:
+        car_data = json.load(f)
+
+    strings = []
+    string_ids = {}
+    def intern(text):
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    brand_refs = uint32_array()
+    model_refs = uint32_array()
+    model_ids = {}
+    brand_model_lists = []
+    model_brand_lists = []
+    aliases = {}
+
+    for brand_id, (brand, models) in enumerate(car_data.get("brands", {}).items()):
+        brand_refs.append(intern(brand))
+        for alias in name_aliases(brand):
+            aliases.setdefault(alias, []).append(brand_id | BRAND_FLAG)
+        brand_models = []
+        for model in models:
+            key = model.lower()
+            if key not in model_ids:
+                model_ids[key] = len(model_refs)
+                model_refs.append(intern(model))
+                model_brand_lists.append([])
+                for alias in name_aliases(model):
+                    aliases.setdefault(alias, []).append(model_ids[key])
+            model_id = model_ids[key]
+            if model_id not in brand_models:
+                brand_models.append(model_id)
+                model_brand_lists[model_id].append(brand_id)
+        brand_model_lists.append(brand_models)
+
+    def csr(lists):
+        starts = uint32_array([0])
+        items = uint32_array()
+        for values in lists:
+            items.extend(values)
+            starts.append(len(items))
+        return starts, items
+
+    sorted_aliases = sorted(aliases)
+    alias_starts, alias_targets = csr([aliases[alias] for alias in sorted_aliases])
+    alias_refs = uint32_array(intern(alias) for alias in sorted_aliases)
+    brand_model_starts, brand_model_ids = csr(brand_model_lists)
+    model_brand_starts, model_brand_ids = csr(model_brand_lists)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_offsets = uint32_array([0])
+    for blob in encoded:
+        string_offsets.append(string_offsets[-1] + len(blob))
+
+    sections = {
+        "string_offsets": string_offsets.tobytes(),
+        "brand_refs": brand_refs.tobytes(),
+        "model_refs": model_refs.tobytes(),
+        "brand_model_starts": brand_model_starts.tobytes(),
+        "brand_model_ids": brand_model_ids.tobytes(),
+        "model_brand_starts": model_brand_starts.tobytes(),
+        "model_brand_ids": model_brand_ids.tobytes(),
+        "alias_refs": alias_refs.tobytes(),
+        "alias_starts": alias_starts.tobytes(),
+        "alias_targets": alias_targets.tobytes(),
+        "strings": b"".join(encoded),
+    }
+    # Byte offsets relative to the end of the header; uint32 sections stay 4-byte aligned
+    layout = {}
+    offset = 0
+    for name, blob in sections.items():
+        layout[name] = [offset, len(blob)]
+        offset += len(blob) + (-len(blob) % 4)
+
+    header = {
+        "catalog_version": CATALOG_VERSION,
+        "source_version": source_version(json_path),
+        "source_signature": source_signature(json_path),
+        "brands": len(brand_refs),
+        "models": len(model_refs),
+        "sections": layout,
+    }
+    write_catalog(path, header, (blob + b"\0" * (-len(blob) % 4) for blob in sections.values()))
+
+# Writes the header and the (already aligned) section blobs. Section offsets are relative to
+# the end of the header, so the header can change without moving the sections.
+def write_catalog(path, header, blobs):
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 4)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Per-process temporary name: several scripts or workers may compile at the same time
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(len(header_bytes).to_bytes(HEADER_SIZE_BYTES, "little"))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+
+def read_header(path):
+    with open(path, "rb") as f:
+        size = int.from_bytes(f.read(HEADER_SIZE_BYTES), "little")
+        return json.loads(f.read(size))
+
+# Stores a new source signature in the compiled catalog, keeping its sections as they are.
+def update_source_signature(path, signature):
+    with open(path, "rb") as f:
+        size = int.from_bytes(f.read(HEADER_SIZE_BYTES), "little")
+        header = json.loads(f.read(size))
+        body = f.read()
+    header["source_signature"] = signature
+    write_catalog(path, header, [body])
+
+# True if the compiled catalog exists and matches the current car_data.json. The size and
+# mtime are compared first; the content hash only when they differ (e.g. after a checkout).
+# When the hash still matches, the new size and mtime are saved so the next check is cheap again.
+def catalog_is_current(json_path=CAR_DATA_PATH, path=CATALOG_PATH) -> bool:
+    if not Path(path).exists():
+        return False
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return False
+    if header.get("catalog_version") != CATALOG_VERSION:
+        return False
+    signature = source_signature(json_path)
+    if header.get("source_signature") == signature:
+        return True
+    if header.get("source_version") != source_version(json_path):
+        return False
+    try:
+        update_source_signature(path, signature)
+    except OSError:
+        # Only a missed shortcut: the next check hashes the file again
+        pass
+    return True
+
+class CarCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_size = int.from_bytes(self.data[:HEADER_SIZE_BYTES], "little")
+        self.header = json.loads(self.data[HEADER_SIZE_BYTES:HEADER_SIZE_BYTES + header_size])
+        base = HEADER_SIZE_BYTES + header_size
+        # Views into the mapping are tracked so close() can release them before unmapping
+        self.views = [memoryview(self.data)]
+
+        def section(name, fmt="I"):
+            offset, length = self.header["sections"][name]
+            raw = self.views[0][base + offset:base + offset + length]
+            self.views.append(raw)
+            if fmt:
+                raw = raw.cast(fmt)
+                self.views.append(raw)
+            return raw
+
+        self.string_offsets = section("string_offsets")
+        self.strings = section("strings", fmt=None)
+        self.brand_refs = section("brand_refs")
+        self.model_refs = section("model_refs")
+        self.brand_model_starts = section("brand_model_starts")
+        self.brand_model_ids = section("brand_model_ids")
+        self.model_brand_starts = section("model_brand_starts")
+        self.model_brand_ids = section("model_brand_ids")
+        self.alias_refs = section("alias_refs")
+        self.alias_starts = section("alias_starts")
+        self.alias_targets = section("alias_targets")
+
+        self._brand_ids = None
+        self._model_ids = None
+        self._brand_names = None
+        self._model_names = None
+
+    # Opens the compiled catalog, compiling it first if car_data.json changed.
+    @classmethod
+    def load(cls, json_path=CAR_DATA_PATH, path=CATALOG_PATH):
+        if not catalog_is_current(json_path, path):
+            compile_catalog(json_path, path)
+        return cls(path)
+
+    @property
+    def version(self) -> str:
+        return self.header["source_version"]
+
+    @property
+    def brand_count(self) -> int:
+        return self.header["brands"]
+
+    @property
+    def model_count(self) -> int:
+        return self.header["models"]
+
+    def string(self, index: int) -> str:
+        return bytes(self.strings[self.string_offsets[index]:self.string_offsets[index + 1]]).decode("utf-8")
+
+    # Canonical spelling of a brand or model, as in car_data.json.
+    def brand_name(self, brand_id: int) -> str:
+        return self.string(self.brand_refs[brand_id])
+
+    def model_name(self, model_id: int) -> str:
+        return self.string(self.model_refs[model_id])
+
+    # Exact (case-insensitive) name -> id maps, built on first use
+    @property
+    def brand_ids(self):
+        if self._brand_ids is None:
+            self._brand_ids = {self.brand_name(i).lower(): i for i in range(self.brand_count)}
+        return self._brand_ids
+
+    @property
+    def model_ids(self):
+        if self._model_ids is None:
+            self._model_ids = {self.model_name(i).lower(): i for i in range(self.model_count)}
+        return self._model_ids
+
+    # Lowercased brand and model names, the sets used for dictionary matching
+    @property
+    def brand_names(self):
+        if self._brand_names is None:
+            self._brand_names = frozenset(self.brand_ids)
+        return self._brand_names
+
+    @property
+    def model_names(self):
+        if self._model_names is None:
+            self._model_names = frozenset(self.model_ids)
+        return self._model_names
+
+    def brand_id(self, name: str):
+        return self.brand_ids.get(name.lower())
+
+    def model_id(self, name: str):
+        return self.model_ids.get(name.lower())
+
+    def models_of_brand(self, brand_id: int):
+        return list(self.brand_model_ids[self.brand_model_starts[brand_id]:self.brand_model_starts[brand_id + 1]])
+
+    def brands_of_model(self, model_id: int):
+        return list(self.model_brand_ids[self.model_brand_starts[model_id]:self.model_brand_starts[model_id + 1]])
+
+    # Lowercased names of every brand that has a model with this name, e.g. "500" -> ["abarth", "fiat", ...]
+    def brands_for_model(self, model: str):
+        model_id = self.model_id(model)
+        if model_id is None:
+            return []
+        return [self.brand_name(brand_id).lower() for brand_id in self.brands_of_model(model_id)]
+
+    def is_brand_model(self, brand: str, model: str) -> bool:
+        brand_id, model_id = self.brand_id(brand), self.model_id(model)
+        return brand_id is not None and model_id is not None and brand_id in self.brands_of_model(model_id)
+
+    # Brand and model ids whose normalized name equals the normalized text, found by binary
+    # search over the sorted alias table. Returns (brand_ids, model_ids).
+    def lookup_alias(self, text: str):
+        alias = normalize_alias(text)
+        aliases = _AliasView(self)
+        index = bisect_left(aliases, alias)
+        if index == len(aliases) or aliases[index] != alias:
+            return [], []
+        targets = self.alias_targets[self.alias_starts[index]:self.alias_starts[index + 1]]
+        brands = [target & ~BRAND_FLAG for target in targets if target & BRAND_FLAG]
+        models = [target for target in targets if not target & BRAND_FLAG]
+        return brands, models
+
+    # Lowercased canonical brand for user input ("Mercedes-Benz", "mercedes benz"), or the
+    # lowercased input itself if it is unknown or ambiguous.
+    def canonical_brand(self, text: str) -> str:
+        if self.brand_id(text) is not None:
+            return text.lower()
+        brands, _ = self.lookup_alias(text)
+        return self.brand_name(brands[0]).lower() if len(brands) == 1 else text.lower()
+
+    # Lowercased canonical model for user input ("f150" -> "f-150"). With a brand, spellings
+    # belonging to that brand win when several models share the normalized name.
+    def canonical_model(self, text: str, brand: str = "") -> str:
+        if self.model_id(text) is not None:
+            return text.lower()
+        _, models = self.lookup_alias(text)
+        brand_id = self.brand_id(brand) if brand else None
+        if brand_id is not None:
+            models = [m for m in models if brand_id in self.brands_of_model(m)] or models
+        return self.model_name(models[0]).lower() if len(set(models)) == 1 else text.lower()
+
+    # {brand: [models]} with canonical spellings, in catalog order.
+    def brands(self):
+        return {
+            self.brand_name(brand_id): [self.model_name(m) for m in self.models_of_brand(brand_id)]
+            for brand_id in range(self.brand_count)
+        }
+
+    def close(self):
+        for view in reversed(self.views):
+            view.release()
+        self.data.close()
+        self.file.close()
+
+# Sorted alias strings of a catalog as a sequence, so bisect can search them in place.
+class _AliasView:
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.catalog.alias_refs)
+
+    def __getitem__(self, index):
+        return self.catalog.string(self.catalog.alias_refs[index])
+
+_catalogs = {}
+
+# Shared catalog per car_data.json path, compiled on first use if needed.
+def get_catalog(json_path=CAR_DATA_PATH, path=CATALOG_PATH) -> CarCatalog:
+    key = (str(json_path), str(path))
+    if key not in _catalogs:
+        _catalogs[key] = CarCatalog.load(json_path, path)
+    return _catalogs[key]
@@ -0,0 +1,78 @@
+# Car-relevance metadata of preprocessed threads.
+#
+# Preprocessing stores a "car_relevance" entry as the first key of every thread record and
+# of every comment in it:
+#
+#   {"car_relevance": {"has_car_entity": true, "brands": ["toyota"], "models": ["camry"]}, "id": ...}
+#
+# brands/models are the canonical (lowercased catalog) names of the CAR_BRAND/CAR_MODEL
+# entities found; a thread's entry covers its title, selftext and all comments. Readers filter
+# on it with a dictionary lookup instead of walking every entity list. Because the entry comes
+# first and JSON Lines writes one record per line, iter_car_records() recognizes irrelevant
+# threads of .jsonl/.jsonl.gz files by their line prefix and skips them without parsing.
+import json
+
+from utils.car_catalog import get_catalog
+from utils.corpus_io import iter_indexed_records
+
+# How an irrelevant record's line starts in .jsonl output (json.dumps() default separators)
+IRRELEVANT_LINE_PREFIX = json.dumps({"car_relevance": {"has_car_entity": False}})[:-2]
+CAR_ENTITY_GROUPS = ("CAR_BRAND", "CAR_MODEL")
+
+def car_relevance(*entity_lists) -> dict:
+    catalog = get_catalog()
+    brands, models = set(), set()
+    for sentence_entities in entity_lists:
+        # Some older outputs hold a flat list of entities instead of one list per sentence
+        if isinstance(sentence_entities, dict):
+            sentence_entities = [sentence_entities]
+        for ent in sentence_entities:
+            if ent.get("entity_group") == "CAR_BRAND":
+                brands.add(catalog.canonical_brand(ent.get("word", "")))
+            elif ent.get("entity_group") == "CAR_MODEL":
+                models.add(catalog.canonical_model(ent.get("word", "")))
+    return {"has_car_entity": bool(brands or models), "brands": sorted(brands), "models": sorted(models)}
+
+# True if one sentence's entity list holds a CAR_BRAND or CAR_MODEL entity.
+def has_car_entity(sentence_entities) -> bool:
+    if isinstance(sentence_entities, dict):
+        sentence_entities = [sentence_entities]
+    return any(ent.get("entity_group") in CAR_ENTITY_GROUPS for ent in sentence_entities)
+
+def with_relevance_first(record: dict, relevance: dict) -> dict:
+    return {"car_relevance": relevance, **{key: value for key, value in record.items() if key != "car_relevance"}}
+
+# A preprocessed thread record with car_relevance entries (re)computed for it and its comments.
+def add_car_relevance(record: dict) -> dict:
+    comments = []
+    entity_lists = []
+    for comment in record.get("comments", []):
+        body_entities = comment.get("preprocessed_body", {}).get("ner_entities", [])
+        entity_lists.extend(body_entities)
+        comments.append(with_relevance_first(comment, car_relevance(*body_entities)))
+    entity_lists.extend(record.get("preprocessed_title", {}).get("ner_entities", []))
+    entity_lists.extend(record.get("preprocessed_selftext", {}).get("ner_entities", []))
+    record = with_relevance_first(record, car_relevance(*entity_lists))
+    if "comments" in record:
+        record["comments"] = comments
+    return record
+
+# Relevance entry of a thread or comment, computed on the fly for files preprocessed before
+# the metadata existed.
+def record_relevance(record: dict) -> dict:
+    relevance = record.get("car_relevance")
+    if relevance is None:
+        relevance = add_car_relevance(record)["car_relevance"] if "comments" in record else car_relevance(
+            *record.get("preprocessed_body", {}).get("ner_entities", [])
+        )
+    return relevance
+
+def is_car_related(record: dict) -> bool:
+    return record_relevance(record)["has_car_entity"]
+
+# Car-related threads of a preprocessed file; irrelevant JSON Lines records are never parsed.
+# With `with_index`, yields (position in the file, record) pairs.
+def iter_car_records(path, with_index=False):
+    for index, record in iter_indexed_records(path, skip_prefix=IRRELEVANT_LINE_PREFIX):
+        if is_car_related(record):
+            yield (index, record) if with_index else record
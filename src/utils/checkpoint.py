@@ -0,0 +1,82 @@
+# Crash-safe chunked checkpointing for long-running pipeline stages.
+#
+# A stage splits its input into fixed-size chunks and commits the output of each
+# chunk as it finishes. Committing writes the chunk file atomically and then an
+# atomic ".done" marker; only chunks with a marker count as committed, so a crash
+# mid-write never leaves a half chunk behind. A restarted run with the same inputs
+# and settings resumes after the last committed chunk. Checkpoints live in a
+# hidden ".checkpoints/<output name>/" directory next to the final output and are
+# removed once the final output has been written.
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+CHECKPOINT_DIR_NAME = ".checkpoints"
+
+# Size and modification time of an input file, enough to notice it was replaced.
+def input_signature(path):
+    stat = Path(path).stat()
+    return [str(path), stat.st_size, stat.st_mtime_ns]
+
+# Stable hash of everything that determines a run's chunking and output.
+def run_fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+# Writes JSON so that readers see either the previous file or the complete new one.
+def atomic_write_json(path, data, **dump_kwargs):
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ChunkCheckpoint:
+    def __init__(self, output_path, run_key):
+        output_path = Path(output_path)
+        self.dir = output_path.parent / CHECKPOINT_DIR_NAME / output_path.name
+        self.run_key = run_key
+        meta_path = self.dir / "checkpoint.json"
+
+        meta = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta is None or meta.get("run_key") != run_key:
+            # Inputs or settings changed: chunks from the old run cannot be reused
+            self.clear()
+            self.dir.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(meta_path, {"run_key": run_key})
+
+    def chunk_path(self, index: int) -> Path:
+        return self.dir / f"chunk_{index:06d}.json"
+
+    def marker_path(self, index: int) -> Path:
+        return self.dir / f"chunk_{index:06d}.done"
+
+    # Number of chunks committed without gaps from the start; the run resumes from here.
+    def committed_count(self) -> int:
+        count = 0
+        while self.marker_path(count).exists():
+            count += 1
+        return count
+
+    def commit(self, index: int, records, **dump_kwargs):
+        atomic_write_json(self.chunk_path(index), records, **dump_kwargs)
+        atomic_write_json(self.marker_path(index), {"records": len(records)})
+
+    def load_chunk(self, index: int):
+        with open(self.chunk_path(index), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # Yields the records of all committed chunks in order.
+    def iter_records(self):
+        for index in range(self.committed_count()):
+            yield from self.load_chunk(index)
+
+    def clear(self):
+        if self.dir.exists():
+            shutil.rmtree(self.dir)
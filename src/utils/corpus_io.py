@@ -0,0 +1,224 @@
+# Streaming reader/writer for thread record files.
+#
+# Pipeline stages exchange lists of thread records (raw, preprocessed or sentiment).
+# Three on-disk formats are supported and chosen by file suffix:
+#   .json      one JSON array (the original format, still the default)
+#   .jsonl     one record per line
+#   .jsonl.gz  the same, gzip-compressed
+# iter_records() yields records one at a time for all three (JSON arrays are parsed
+# incrementally too), and RecordWriter writes them one at a time, so memory use is
+# bounded by the largest single record rather than by the size of the file.
+import os
+import gzip
+import json
+from pathlib import Path
+
+CORPUS_FORMATS = ("json", "jsonl", "jsonl.gz")
+CORPUS_SUFFIXES = tuple(f".{fmt}" for fmt in CORPUS_FORMATS)
+
+READ_SIZE = 1 << 20
+
+def corpus_format(path) -> str:
+    name = Path(path).name
+    for fmt in sorted(CORPUS_FORMATS, key=len, reverse=True):
+        if name.endswith(f".{fmt}"):
+            return fmt
+    raise ValueError(f"Unsupported corpus file: {path}")
+
+# File name without its corpus suffix, e.g. "reddit_carquestions" for any of the formats.
+def corpus_stem(path) -> str:
+    name = Path(path).name
+    return name[:-len(corpus_format(path)) - 1]
+
+def corpus_path(directory, stem: str, fmt: str = "json") -> Path:
+    return Path(directory) / f"{stem}.{fmt}"
+
+# Corpus files in a directory, one per stem. If a stem exists in several formats
+# (e.g. after switching --format) the most recently written one wins.
+def corpus_files(directory):
+    newest = {}
+    for path in Path(directory).iterdir():
+        if path.name.startswith(".") or not path.is_file() or not path.name.endswith(CORPUS_SUFFIXES):
+            continue
+        stem = corpus_stem(path)
+        if stem not in newest or path.stat().st_mtime > newest[stem].stat().st_mtime:
+            newest[stem] = path
+    return [newest[stem] for stem in sorted(newest)]
+
+# Existing corpus file for a stem in any format, or None.
+def find_corpus_file(directory, stem: str):
+    for path in corpus_files(directory):
+        if corpus_stem(path) == stem:
+            return path
+    return None
+
+def open_text(path, mode="r", compressed=None):
+    if compressed is None:
+        compressed = str(path).endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+# Incrementally parses a top-level JSON array, yielding one element at a time.
+def iter_json_array(f, read_size=READ_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            skip_whitespace()
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end >= len(buffer) and not eof:
+            # A scalar cut at the buffer edge can decode "successfully"; read more and retry
+            fill()
+            continue
+        yield item
+        pos = end
+        if pos > read_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+# Yields (index, record) pairs from a .json, .jsonl or .jsonl.gz file without loading the
+# whole file. With `skip_prefix`, JSON Lines records whose line starts with it are skipped
+# unparsed (JSON arrays are still parsed in full); skipped records still count towards the index.
+def iter_indexed_records(path, skip_prefix=None):
+    fmt = corpus_format(path)
+    with open_text(path) as f:
+        if fmt == "json":
+            yield from enumerate(iter_json_array(f))
+        else:
+            index = 0
+            for line in f:
+                if skip_prefix is not None and line.startswith(skip_prefix):
+                    index += 1
+                    continue
+                if line.strip():
+                    yield index, json.loads(line)
+                    index += 1
+
+def iter_records(path, skip_prefix=None):
+    for _, record in iter_indexed_records(path, skip_prefix):
+        yield record
+
+def load_records(path):
+    return list(iter_records(path))
+
+# JSON encoder fallback for numpy scalars (e.g. NER scores), so no converted copy of the tree is needed.
+def json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Writes records one at a time. The file is written under a temporary name and moved into
+# place on close, so readers never see a partially written output.
+class RecordWriter:
+    def __init__(self, path, indent=2):
+        self.path = Path(path)
+        self.format = corpus_format(path)
+        self.indent = indent
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.file = None
+        self.count = 0
+
+    def __enter__(self):
+        self.file = open_text(self.tmp_path, "w", compressed=self.format.endswith(".gz"))
+        if self.format == "json":
+            self.file.write("[")
+        return self
+
+    def write(self, record):
+        if self.format == "json":
+            text = json.dumps(record, ensure_ascii=False, indent=self.indent, default=json_default)
+            if self.indent:
+                text = "\n".join(" " * self.indent + line for line in text.split("\n"))
+            self.file.write(("," if self.count else "") + "\n" + text)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.format == "json":
+            self.file.write("\n]" if self.count else "]")
+        self.file.flush()
+        if not self.format.endswith(".gz"):
+            os.fsync(self.file.fileno())
+        self.file.close()
+        if exc_type is not None:
+            self.tmp_path.unlink(missing_ok=True)
+            return False
+        os.replace(self.tmp_path, self.path)
+        remove_other_formats(self.path)
+        return False
+
+def write_records(path, records, indent=2):
+    with RecordWriter(path, indent=indent) as writer:
+        writer.write_all(records)
+        return writer.count
+
+# Deletes copies of the same stem in other formats so readers never count a file twice.
+def remove_other_formats(path):
+    path = Path(path)
+    stem = corpus_stem(path)
+    for fmt in CORPUS_FORMATS:
+        other = corpus_path(path.parent, stem, fmt)
+        if other != path and other.exists():
+            other.unlink()
+
+# Yields lists of up to `size` items from any iterable.
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Yields every record of every corpus file in a directory.
+def iter_corpus(directory):
+    for path in corpus_files(directory):
+        yield from iter_records(path)
@@ -1,16 +1,19 @@
 import os
-import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.corpus_io import corpus_files, iter_records
+
 RAW_DATA_DIR = Path("data/raw_data")
 PREPROCESSED_DIR = Path("data/old_preprocessed_data")
 
 def count_posts_and_comments(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    num_posts = len(data)
-    num_comments = sum(len(thread.get("comments", [])) for thread in data)
+    num_posts = 0
+    num_comments = 0
+    for thread in iter_records(file_path):
+        num_posts += 1
+        num_comments += len(thread.get("comments", []))
 
     return num_posts, num_comments
 
@@ -19,7 +22,7 @@ def main():
     print(f"{'File':<40} {'Posts':>10} {'Comments':>12}")
     print("-" * 65)
 
-    for file in RAW_DATA_DIR.glob("*.json"):
+    for file in corpus_files(RAW_DATA_DIR):
         num_posts, num_comments = count_posts_and_comments(file)
         print(f"{file.name:<40} {num_posts:>10,} {num_comments:>12,}")
 
@@ -28,7 +31,7 @@ def main():
     print(f"{'File':<40} {'Posts':>10} {'Comments':>12}")
     print("-" * 65)
 
-    for file in PREPROCESSED_DIR.glob("*.json"):
+    for file in corpus_files(PREPROCESSED_DIR):
         num_posts, num_comments = count_posts_and_comments(file)
         print(f"{file.name:<40} {num_posts:>10,} {num_comments:>12,}")
 
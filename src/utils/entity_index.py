@@ -0,0 +1,252 @@
+# Inverted index from NER entities to the sentences, sections and posts that mention them.
+#
+# Built from the sentence table (utils/sentence_table.py), whose row numbers serve as
+# sentence ids. Sections (a title, selftext or comment body) and posts are numbered in
+# table order too, and each covers a contiguous range of rows, so any posting list
+# can be turned back into the rows to read. Posting lists are sorted arrays of uint32
+# keyed by (entity_group, lowercased word), e.g. ("CAR_BRAND", "toyota"), and are
+# stored back to back in one binary file that is memory-mapped on load.
+#
+# A per-brand query therefore reads two posting lists and the matching rows instead of
+# scanning every post of every file:
+#
+#   index = EntityIndex()
+#   sections = index.query("section", all_of=[brand_term("toyota"), model_term("camry")])
+#   rows = index.post_rows(index.sections_to_posts(sections))
+#   tokens = read_sentence_rows(rows, ["tokens"])
+import json
+import mmap
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from pathlib import Path
+
+from utils.sentence_table import (
+    SENTENCE_TABLE_PATH, iter_row_groups, read_sentence_rows, sentence_table_available, table_metadata
+)
+
+ENTITY_INDEX_PATH = Path("data/cache/entity_index.bin")
+
+# Bumped whenever the file layout changes
+INDEX_VERSION = 1
+LEVELS = ("sentence", "section", "post")
+HEADER_SIZE_BYTES = 8
+
+def brand_term(name: str):
+    return ("CAR_BRAND", name.lower())
+
+def model_term(name: str):
+    return ("CAR_MODEL", name.lower())
+
+def uint32_array(values=()):
+    arr = array("I", values)
+    assert arr.itemsize == 4, "array('I') must be 32-bit"
+    return arr
+
+# Intersection of two sorted arrays. Walks the shorter one and binary-searches the longer,
+# which stays cheap when a rare model is intersected with a common brand.
+def intersect_sorted(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    result = uint32_array()
+    lo = 0
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == len(b):
+            break
+        if b[lo] == value:
+            result.append(value)
+            lo += 1
+    return result
+
+def union_sorted(lists):
+    result = uint32_array()
+    for value in heapq.merge(*lists):
+        if not result or result[-1] != value:
+            result.append(value)
+    return result
+
+def read_header(path=ENTITY_INDEX_PATH):
+    with open(path, "rb") as f:
+        size = int.from_bytes(f.read(HEADER_SIZE_BYTES), "little")
+        return json.loads(f.read(size))
+
+# True if the index exists and was built from the current sentence table.
+def entity_index_available(path=ENTITY_INDEX_PATH, table_path=SENTENCE_TABLE_PATH):
+    if not Path(path).exists() or not sentence_table_available(table_path):
+        return False
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return False
+    return header.get("index_version") == INDEX_VERSION and header.get("table_inputs") == table_metadata(table_path).get("inputs")
+
+def build_entity_index(path=ENTITY_INDEX_PATH, table_path=SENTENCE_TABLE_PATH):
+    postings = {level: defaultdict(uint32_array) for level in LEVELS}
+    section_start = uint32_array()
+    post_start = uint32_array()
+    previous_section = previous_post = None
+    row = 0
+
+    def add(level, term, item_id):
+        posting = postings[level][term]
+        # Ids only grow, so skipping repeats keeps every list sorted and unique
+        if not posting or posting[-1] != item_id:
+            posting.append(item_id)
+
+    for _, table in iter_row_groups(["source", "post_id", "comment_id", "section", "entities"], table_path):
+        columns = table.to_pydict()
+        for i in range(table.num_rows):
+            post_key = (columns["source"][i], columns["post_id"][i])
+            section_key = post_key + (columns["comment_id"][i], columns["section"][i])
+            if post_key != previous_post:
+                post_start.append(row)
+                previous_post = post_key
+            if section_key != previous_section:
+                section_start.append(row)
+                previous_section = section_key
+
+            for ent in columns["entities"][i] or []:
+                term = (ent["entity_group"] or "", (ent["word"] or "").lower())
+                add("sentence", term, row)
+                add("section", term, len(section_start) - 1)
+                add("post", term, len(post_start) - 1)
+            row += 1
+    section_start.append(row)
+    post_start.append(row)
+
+    # Lay every array out back to back; the header records (offset, length) in items
+    blobs = []
+    offset = 0
+    def place(arr):
+        nonlocal offset
+        blobs.append(arr.tobytes())
+        location = [offset, len(arr)]
+        offset += len(arr)
+        return location
+
+    header = {
+        "index_version": INDEX_VERSION,
+        "table_inputs": table_metadata(table_path).get("inputs"),
+        "sentences": row,
+        "section_start": place(section_start),
+        "post_start": place(post_start),
+        "postings": {level: {} for level in LEVELS},
+    }
+    for level in LEVELS:
+        for (group, word), posting in sorted(postings[level].items()):
+            header["postings"][level].setdefault(group, {})[word] = place(posting)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    with open(tmp_path, "wb") as f:
+        f.write(len(header_bytes).to_bytes(HEADER_SIZE_BYTES, "little"))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+    return header
+
+class EntityIndex:
+    def __init__(self, path=ENTITY_INDEX_PATH):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_size = int.from_bytes(self.data[:HEADER_SIZE_BYTES], "little")
+        self.header = json.loads(self.data[HEADER_SIZE_BYTES:HEADER_SIZE_BYTES + header_size])
+        self.base = HEADER_SIZE_BYTES + header_size
+        self.section_start = self.load_array(self.header["section_start"])
+        self.post_start = self.load_array(self.header["post_start"])
+
+    def load_array(self, location):
+        offset, length = location
+        arr = uint32_array()
+        arr.frombytes(self.data[self.base + offset * 4:self.base + (offset + length) * 4])
+        return arr
+
+    @property
+    def sentence_count(self) -> int:
+        return self.header["sentences"]
+
+    @property
+    def section_count(self) -> int:
+        return len(self.section_start) - 1
+
+    @property
+    def post_count(self) -> int:
+        return len(self.post_start) - 1
+
+    # Words indexed for an entity group, e.g. every brand seen in the corpus.
+    def terms(self, entity_group: str, level="sentence"):
+        return sorted(self.header["postings"][level].get(entity_group, {}))
+
+    def postings(self, level, term):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level '{level}', expected one of {LEVELS}")
+        group, word = term
+        location = self.header["postings"][level].get(group, {}).get(word.lower())
+        return self.load_array(location) if location else uint32_array()
+
+    # Sorted ids at `level` that mention every term in `all_of` and at least one in `any_of`.
+    def query(self, level, all_of=(), any_of=()):
+        if not all_of and not any_of:
+            raise ValueError("query() needs at least one term")
+        result = None
+        # Intersecting the shortest lists first keeps intermediate results small
+        for posting in sorted((self.postings(level, term) for term in all_of), key=len):
+            result = posting if result is None else intersect_sorted(result, posting)
+            if not result:
+                return uint32_array()
+        if any_of:
+            either = union_sorted([self.postings(level, term) for term in any_of])
+            result = either if result is None else intersect_sorted(result, either)
+        return result
+
+    def rows_for(self, starts, ids):
+        rows = uint32_array()
+        for item_id in ids:
+            rows.extend(range(starts[item_id], starts[item_id + 1]))
+        return rows
+
+    # Sorted sentence (row) ids of whole posts or sections.
+    def post_rows(self, post_ids):
+        return self.rows_for(self.post_start, post_ids)
+
+    def section_rows(self, section_ids):
+        return self.rows_for(self.section_start, section_ids)
+
+    # Posts containing the given sections, sorted and unique.
+    def sections_to_posts(self, section_ids):
+        posts = uint32_array()
+        for section_id in section_ids:
+            post_id = bisect_right(self.post_start, self.section_start[section_id]) - 1
+            if not posts or posts[-1] != post_id:
+                posts.append(post_id)
+        return posts
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+# Rows (as dicts of `columns`) of the sentences matching an index query.
+def matching_sentences(all_of=(), any_of=(), columns=("tokens",), index_path=ENTITY_INDEX_PATH,
+                       table_path=SENTENCE_TABLE_PATH):
+    index = EntityIndex(index_path)
+    try:
+        rows = index.query("sentence", all_of, any_of)
+    finally:
+        index.close()
+    return read_sentence_rows(rows, columns, table_path).to_pylist()
+
+# Tokens of every sentence of the posts in which one section (title, selftext or a comment)
+# mentions the brand, and the model if one is given.
+def matching_post_sentences(brand, model="", index_path=ENTITY_INDEX_PATH, table_path=SENTENCE_TABLE_PATH):
+    terms = [brand_term(brand)] + ([model_term(model)] if model else [])
+    index = EntityIndex(index_path)
+    try:
+        rows = index.post_rows(index.sections_to_posts(index.query("section", all_of=terms)))
+    finally:
+        index.close()
+    return read_sentence_rows(rows, ["tokens"], table_path).column("tokens").to_pylist()
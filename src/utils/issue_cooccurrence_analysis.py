@@ -1,12 +1,21 @@
 import os
+import sys
 import json
 from pathlib import Path
 from collections import Counter, defaultdict
 from itertools import combinations
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.car_catalog import get_catalog
+from utils.car_relevance import iter_car_records
+from utils.corpus_io import corpus_files
+from utils.entity_index import entity_index_available, matching_post_sentences
+
 # === Config ===
-brand = input("Enter car brand (e.g., toyota): ").strip().lower()
-model = input("Enter car model (leave blank for whole brand): ").strip().lower()
+catalog = get_catalog()
+brand = catalog.canonical_brand(input("Enter car brand (e.g., toyota): ").strip())
+model = input("Enter car model (leave blank for whole brand): ").strip()
+model = catalog.canonical_model(model, brand) if model else ""
 
 INPUT_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path(f"data/issue_analysis/{brand}")
@@ -69,11 +78,14 @@ def process_post(post):
             for issue_pair in combinations(sorted(issues_found), 2):
                 cooccurrence_counter[issue_pair] += 1
 
-# === Run on all preprocessed files ===
-for file in INPUT_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
+# === Run on the posts the entity index points to, or on all preprocessed files ===
+if entity_index_available():
+    for tokens in matching_post_sentences(brand, model):
+        for issue_pair in combinations(sorted(find_issues_in_tokens(tokens)), 2):
+            cooccurrence_counter[issue_pair] += 1
+else:
+    for file in corpus_files(INPUT_DIR):
+        for post in iter_car_records(file):
             process_post(post)
 
 # === Save co-occurrence counts ===
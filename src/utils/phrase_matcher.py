@@ -0,0 +1,214 @@
+# Multi-pattern phrase matching with an Aho-Corasick automaton.
+#
+# Counting brand and model mentions used to compile one `\b<name>\b` regex per catalog
+# entry and run every one of them over every text, so the cost grew with
+# patterns x texts. PhraseMatcher compiles all phrases into a single automaton and
+# finds every occurrence of every phrase in one left-to-right pass over the text.
+# Word boundaries are checked on each occurrence with the same rule as the regex
+# `\b`: a boundary sits between a word character (alphanumeric or "_") and a
+# non-word character or the edge of the text.
+from collections import deque
+
+def is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+# True where regex `\b` would match at `pos` in `text`.
+def at_word_boundary(text: str, pos: int) -> bool:
+    before = pos > 0 and is_word_char(text[pos - 1])
+    after = pos < len(text) and is_word_char(text[pos])
+    return before != after
+
+class PhraseMatcher:
+    def __init__(self, phrases=()):
+        # Trie states: outgoing edges, failure link and the phrase ids that end here
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.phrases = []
+        self.phrase_ids = {}
+        self.compiled = False
+        for phrase in phrases:
+            self.add(phrase)
+
+    # Adds a phrase (matched lowercased) and returns its id. Adding the same phrase twice is a no-op.
+    def add(self, phrase: str) -> int:
+        phrase = phrase.lower()
+        if not phrase:
+            raise ValueError("Cannot match an empty phrase")
+        if phrase in self.phrase_ids:
+            return self.phrase_ids[phrase]
+        state = 0
+        for ch in phrase:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        phrase_id = len(self.phrases)
+        self.phrases.append(phrase)
+        self.phrase_ids[phrase] = phrase_id
+        self.output[state].append(phrase_id)
+        self.compiled = False
+        return phrase_id
+
+    # Computes failure links breadth-first and merges the outputs of each state's failure chain.
+    def compile(self):
+        queue = deque()
+        for next_state in self.goto[0].values():
+            self.fail[next_state] = 0
+            queue.append(next_state)
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        self.compiled = True
+
+    # Yields (start, end, phrase_id) for every occurrence in the lowercased text, including
+    # overlapping ones. With word_boundaries the occurrence must start and end on a boundary.
+    def iter_matches(self, text: str, word_boundaries=True):
+        if not self.compiled:
+            self.compile()
+        text = text.lower()
+        goto, fail, output, phrases = self.goto, self.fail, self.output, self.phrases
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for phrase_id in output[state]:
+                start = i + 1 - len(phrases[phrase_id])
+                if word_boundaries and not (at_word_boundary(text, start) and at_word_boundary(text, i + 1)):
+                    continue
+                yield start, i + 1, phrase_id
+
+    # Distinct phrases found in the text.
+    def find(self, text: str, word_boundaries=True):
+        return {self.phrases[phrase_id] for _, _, phrase_id in self.iter_matches(text, word_boundaries)}
+
+# Brand, model and "brand model" mentions of a car catalog ({brand: [models]}), found in one
+# scan per text. Pairs follow the regex `\b<brand>\s+<model>\b`: a brand starting on a word
+# boundary, one or more whitespace characters, then one of that brand's models ending on one.
+class CarMentionMatcher:
+    def __init__(self, brands):
+        self.matcher = PhraseMatcher()
+        self.brand_ids = set()
+        self.model_ids = set()
+        # Position of each lowercased (brand, model) pair in catalog order
+        self.pair_order = {}
+        self.brand_models = {}
+        for brand, models in brands.items():
+            brand_lc = brand.lower()
+            self.brand_ids.add(self.matcher.add(brand_lc))
+            for model in models:
+                model_lc = model.lower()
+                self.model_ids.add(self.matcher.add(model_lc))
+                self.brand_models.setdefault(brand_lc, set()).add(model_lc)
+                self.pair_order.setdefault((brand_lc, model_lc), len(self.pair_order))
+        self.matcher.compile()
+
+    # Returns (brands, models, pairs) mentioned in the text as sets of lowercased names.
+    def match(self, text: str):
+        text = text.lower()
+        phrases = self.matcher.phrases
+        brands, models, pairs = set(), set(), set()
+        brand_ends = {}
+        model_starts = {}
+        for start, end, phrase_id in self.matcher.iter_matches(text, word_boundaries=False):
+            starts_on_boundary = at_word_boundary(text, start)
+            ends_on_boundary = at_word_boundary(text, end)
+            if phrase_id in self.brand_ids and starts_on_boundary:
+                if ends_on_boundary:
+                    brands.add(phrases[phrase_id])
+                brand_ends.setdefault(end, []).append(phrases[phrase_id])
+            if phrase_id in self.model_ids and ends_on_boundary:
+                if starts_on_boundary:
+                    models.add(phrases[phrase_id])
+                model_starts.setdefault(start, []).append(phrases[phrase_id])
+
+        for end, brand_names in brand_ends.items():
+            gap_end = end
+            while gap_end < len(text) and text[gap_end].isspace():
+                gap_end += 1
+            if gap_end == end:
+                continue
+            for brand in brand_names:
+                for model in model_starts.get(gap_end, []):
+                    if model in self.brand_models.get(brand, ()):
+                        pairs.add((brand, model))
+        return brands, models, pairs
+
+# Phrase matching over token sequences with a token trie. Where PhraseMatcher scans
+# characters, TokenPhraseMatcher works on already tokenized sentences (e.g. word_tokenize
+# output), so multi-word names like "land cruiser" or "model 3" match as one phrase and
+# each match carries token offsets. Matching is leftmost-longest and non-overlapping: at
+# each position the trie is walked as far as the tokens allow, the longest phrase found
+# is emitted and the scan resumes after it. Each position costs at most the length of the
+# longest phrase, so a sentence is scanned in linear time.
+class TokenPhraseMatcher:
+    def __init__(self):
+        # Trie states: outgoing edges keyed by token and the value of the phrase ending here
+        self.children = [{}]
+        self.values = [None]
+        self.phrase_count = 0
+
+    # Adds a phrase given as tokens (matched lowercased). The first value added for a phrase wins.
+    def add(self, tokens, value):
+        tokens = [token.lower() for token in tokens]
+        if not tokens:
+            raise ValueError("Cannot match an empty phrase")
+        state = 0
+        for token in tokens:
+            next_state = self.children[state].get(token)
+            if next_state is None:
+                next_state = len(self.children)
+                self.children[state][token] = next_state
+                self.children.append({})
+                self.values.append(None)
+            state = next_state
+        if self.values[state] is None:
+            self.values[state] = value
+            self.phrase_count += 1
+
+    # Yields (start, end, value) for the leftmost-longest phrase matches in the token list;
+    # tokens[start:end] is the matched phrase.
+    def iter_matches(self, tokens):
+        tokens = [token.lower() for token in tokens]
+        children, values = self.children, self.values
+        start = 0
+        while start < len(tokens):
+            state = 0
+            match_end = None
+            position = start
+            while position < len(tokens):
+                state = children[state].get(tokens[position])
+                if state is None:
+                    break
+                position += 1
+                if values[state] is not None:
+                    match_end = position
+                    match_value = values[state]
+            if match_end is None:
+                start += 1
+            else:
+                yield start, match_end, match_value
+                start = match_end
+
+# Token trie over every brand and model of a CarCatalog. Values are (entity_group, name)
+# with the lowercased catalog name; a name that is both a brand and a model is a brand.
+# `tokenize` must split names the same way sentences are split before matching.
+def build_car_gazetteer(catalog, tokenize) -> TokenPhraseMatcher:
+    gazetteer = TokenPhraseMatcher()
+    for names, entity_group in ((catalog.brand_names, "CAR_BRAND"), (catalog.model_names, "CAR_MODEL")):
+        for name in sorted(names):
+            tokens = tokenize(name)
+            if tokens:
+                gazetteer.add(tokens, (entity_group, name))
+    return gazetteer
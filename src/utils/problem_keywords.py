@@ -0,0 +1,21 @@
+# Keywords that mark a sentence as describing a vehicle problem.
+PROBLEM_KEYWORDS = {
+    "stall", "leak", "fail", "noise", "noisy", "grind", "overheat", "jerk",
+    "won't start", "not starting", "dies", "check engine", "misfire",
+    "vibration", "rattle", "burning", "smell", "warning light", "drain", "hard shift"
+}
+
+single_keywords = {kw for kw in PROBLEM_KEYWORDS if " " not in kw}
+multi_keywords = {kw for kw in PROBLEM_KEYWORDS if " " in kw}
+
+# Problem keywords found in one tokenized sentence, once per matching token or phrase.
+def check_sentence_for_issue(tokens):
+    joined = " ".join(tokens)
+    found = []
+    for phrase in multi_keywords:
+        if phrase in joined:
+            found.append(phrase)
+    for token in tokens:
+        if token in single_keywords:
+            found.append(token)
+    return found
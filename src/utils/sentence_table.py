@@ -0,0 +1,257 @@
+# Columnar sentence-level view of the preprocessed and sentiment output.
+#
+# Every analysis script walks the same nested records (title, selftext and
+# comments, each holding per-sentence tokens and NER entities), re-parsing every
+# JSON file to do so. build_sentence_table() flattens them once into a Parquet
+# file with one row per sentence, and scripts read back only the columns they
+# need. The table records the size and mtime of the files it was built from;
+# when any of them changes it is considered stale and scripts fall back to the
+# JSON records until it is rebuilt (src/nlp/export_sentence_table.py).
+#
+# pyarrow is optional: without it sentence_table_available() is False and
+# everything keeps working from the JSON records. Sentiment comes from the compact
+# artifact of sentiment_store.py where there is one, otherwise from the JSON records.
+# The table carries scores for every sentence of the sections with a car entity; with a
+# lazy artifact, sentences of the other sections may have none.
+import os
+import json
+from collections import Counter
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from utils.checkpoint import input_signature
+from utils.corpus_io import corpus_files, corpus_stem, find_corpus_file, iter_records
+from utils.sentiment_store import iter_posts_with_artifact, sentiment_artifacts, sentiment_output_files
+
+PREPROCESSED_DIR = Path("data/preprocessed_data")
+SENTIMENT_DIR = Path("data/sentiment_analysis")
+SENTENCE_TABLE_PATH = Path("data/cache/sentence_table.parquet")
+
+# Bumped whenever the columns or their meaning change
+TABLE_VERSION = 2
+ROW_GROUP_SIZE = 100_000
+
+def table_schema():
+    return pa.schema([
+        ("source", pa.string()),
+        ("post_id", pa.string()),
+        ("comment_id", pa.string()),
+        ("section", pa.string()),
+        ("sentence_idx", pa.int32()),
+        ("created_utc", pa.float64()),
+        ("tokens", pa.list_(pa.string())),
+        ("brands", pa.list_(pa.string())),
+        ("models", pa.list_(pa.string())),
+        ("entities", pa.list_(pa.struct([("word", pa.string()), ("entity_group", pa.string())]))),
+        ("neg", pa.float64()),
+        ("neu", pa.float64()),
+        ("pos", pa.float64()),
+        ("compound", pa.float64()),
+        ("category", pa.string()),
+    ])
+
+COLUMNS = (
+    "source", "post_id", "comment_id", "section", "sentence_idx", "created_utc", "tokens",
+    "brands", "models", "entities", "neg", "neu", "pos", "compound", "category"
+)
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The sentence table needs pyarrow: pip install pyarrow")
+
+# Signatures of every file the table is built from, in a stable order.
+def table_inputs(preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    inputs = [input_signature(path) for path in corpus_files(preprocessed_dir)]
+    if Path(sentiment_dir).exists():
+        inputs += [input_signature(path) for path in sentiment_output_files(sentiment_dir)]
+    return inputs
+
+def table_metadata(path=SENTENCE_TABLE_PATH):
+    metadata = pq.read_schema(path).metadata or {}
+    return {key: json.loads(metadata[key.encode("utf-8")]) for key in ("table_version", "inputs")
+            if key.encode("utf-8") in metadata}
+
+# True if the table can be used in place of the JSON records: pyarrow is installed, the table
+# exists, and it was built from the files currently on disk.
+def sentence_table_available(path=SENTENCE_TABLE_PATH, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    if pa is None or not Path(path).exists():
+        return False
+    try:
+        metadata = table_metadata(path)
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return False
+    if metadata.get("table_version") != TABLE_VERSION:
+        return False
+    return metadata.get("inputs") == json.loads(json.dumps(table_inputs(preprocessed_dir, sentiment_dir)))
+
+def entity_words(sentence_entities, entity_group):
+    return [ent.get("word", "") for ent in sentence_entities if ent.get("entity_group") == entity_group]
+
+# Sentiment scope of the table: every consumer reads car entity sentences or the sections holding them
+TABLE_SENTIMENT_SCOPE = "sections"
+
+# Rows for one section (title, selftext or a comment body) of a post.
+def iter_section_rows(source, post_id, comment_id, section, created_utc, preprocessed, sentiment):
+    token_lists = preprocessed.get("cleaned_sentences_tokens", [])
+    ner_entities = preprocessed.get("ner_entities", [])
+    sentence_sentiments = sentiment.get("sentiment", {}).get("sentence_sentiments", []) if sentiment else []
+
+    for idx, tokens in enumerate(token_lists):
+        sentence_entities = ner_entities[idx] if idx < len(ner_entities) else []
+        scored = sentence_sentiments[idx] if idx < len(sentence_sentiments) else None
+        scores = scored["scores"] if scored and scored["scores"] else {}
+        yield {
+            "source": source,
+            "post_id": post_id,
+            "comment_id": comment_id,
+            "section": section,
+            "sentence_idx": idx,
+            "created_utc": created_utc,
+            "tokens": tokens,
+            "brands": entity_words(sentence_entities, "CAR_BRAND"),
+            "models": entity_words(sentence_entities, "CAR_MODEL"),
+            "entities": [
+                {"word": ent.get("word", ""), "entity_group": ent.get("entity_group", "")} for ent in sentence_entities
+            ],
+            "neg": scores.get("neg"),
+            "neu": scores.get("neu"),
+            "pos": scores.get("pos"),
+            "compound": scores.get("compound"),
+            "category": scored["category"] if scored else None,
+        }
+
+# Rows for every sentence of one preprocessed post. `sentiment` is the matching record from the
+# sentiment output, or None for posts that were not scored (not car related).
+def iter_post_rows(source, post, sentiment=None):
+    post_id = str(post.get("id", ""))
+    created_utc = post.get("created_utc")
+    sentiment = sentiment or {}
+
+    yield from iter_section_rows(source, post_id, None, "title", created_utc,
+                                 post.get("preprocessed_title", {}), sentiment.get("title_sentiment"))
+    yield from iter_section_rows(source, post_id, None, "selftext", created_utc,
+                                 post.get("preprocessed_selftext", {}), sentiment.get("selftext_sentiment"))
+
+    comment_sentiments = {str(c.get("id", "")): c for c in sentiment.get("comments_sentiment", [])}
+    for comment in post.get("comments", []):
+        comment_id = str(comment.get("id", ""))
+        yield from iter_section_rows(source, post_id, comment_id, "comment", comment.get("created_utc"),
+                                     comment.get("preprocessed_body", {}), comment_sentiments.get(comment_id))
+
+# Pairs each preprocessed post with its sentiment record. The sentiment output is the car-related
+# subset of the preprocessed file in the same order, so both files are walked in lockstep.
+def iter_posts_with_sentiment(preprocessed_file, sentiment_file):
+    sentiments = iter_records(sentiment_file) if sentiment_file else iter([])
+    pending = next(sentiments, None)
+    for post in iter_records(preprocessed_file):
+        if pending is not None and pending.get("id", "") == post.get("id", ""):
+            yield post, pending
+            pending = next(sentiments, None)
+        else:
+            yield post, None
+
+def iter_sentence_rows(preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    for preprocessed_file in corpus_files(preprocessed_dir):
+        source = corpus_stem(preprocessed_file)
+        artifact_file = sentiment_artifacts(sentiment_dir).get(source)
+        sentiment_file = artifact_file
+        if sentiment_file is None and Path(sentiment_dir).exists():
+            sentiment_file = find_corpus_file(sentiment_dir, source)
+        print(f"📥 Flattening {preprocessed_file.name}" + (f" + {sentiment_file.name}" if sentiment_file else ""))
+        if artifact_file is not None:
+            posts = iter_posts_with_artifact(preprocessed_file, artifact_file, TABLE_SENTIMENT_SCOPE)
+        else:
+            posts = iter_posts_with_sentiment(preprocessed_file, sentiment_file)
+        for post, sentiment in posts:
+            yield from iter_post_rows(source, post, sentiment)
+
+# Writes the sentence table in row groups, so memory stays bounded by ROW_GROUP_SIZE rows.
+def build_sentence_table(path=SENTENCE_TABLE_PATH, preprocessed_dir=PREPROCESSED_DIR, sentiment_dir=SENTIMENT_DIR):
+    require_pyarrow()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    # Signatures are taken before reading so a file changed mid-build marks the table stale
+    metadata = {
+        "table_version": json.dumps(TABLE_VERSION),
+        "inputs": json.dumps(table_inputs(preprocessed_dir, sentiment_dir)),
+    }
+    schema = table_schema().with_metadata(metadata)
+
+    columns = {name: [] for name in COLUMNS}
+    rows = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        def flush():
+            if columns["source"]:
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                for values in columns.values():
+                    values.clear()
+
+        for row in iter_sentence_rows(preprocessed_dir, sentiment_dir):
+            for name in COLUMNS:
+                columns[name].append(row[name])
+            rows += 1
+            if len(columns["source"]) >= ROW_GROUP_SIZE:
+                flush()
+        flush()
+
+    os.replace(tmp_path, path)
+    return rows
+
+# Reads the given columns as a pyarrow Table. `filters` is passed to pyarrow, e.g.
+# [("section", "=", "comment")], and skips row groups that cannot match.
+def read_sentence_table(columns=None, filters=None, path=SENTENCE_TABLE_PATH):
+    require_pyarrow()
+    return pq.read_table(path, columns=list(columns) if columns else None, filters=filters)
+
+def load_sentence_table(columns=None, filters=None, path=SENTENCE_TABLE_PATH):
+    return read_sentence_table(columns, filters, path).to_pandas()
+
+# Counts the values of a list column (tokens, brands, models) over all rows.
+def list_value_counts(table, column, lower=False) -> Counter:
+    values = pc.list_flatten(table[column])
+    if lower:
+        values = pc.utf8_lower(values)
+    counts = pc.value_counts(values)
+    return Counter(dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())))
+
+# Yields (first row id, pyarrow Table) for each row group, reading only the given columns.
+def iter_row_groups(columns=None, path=SENTENCE_TABLE_PATH):
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    start = 0
+    for group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(group, columns=list(columns) if columns else None)
+        yield start, table
+        start += table.num_rows
+
+# Reads the rows with the given sorted row ids. Only the row groups that contain them are
+# decoded, so a selective query (e.g. from the entity index) touches a fraction of the file.
+def read_sentence_rows(row_ids, columns=None, path=SENTENCE_TABLE_PATH):
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    columns = list(columns) if columns else None
+    pieces = []
+    group_start = 0
+    position = 0
+    for group in range(parquet_file.num_row_groups):
+        group_end = group_start + parquet_file.metadata.row_group(group).num_rows
+        local = []
+        while position < len(row_ids) and row_ids[position] < group_end:
+            local.append(row_ids[position] - group_start)
+            position += 1
+        if local:
+            pieces.append(parquet_file.read_row_group(group, columns=columns).take(pa.array(local, pa.int64())))
+        if position >= len(row_ids):
+            break
+        group_start = group_end
+    if not pieces:
+        return parquet_file.schema_arrow.empty_table().select(columns) if columns else parquet_file.schema_arrow.empty_table()
+    return pa.concat_tables(pieces)
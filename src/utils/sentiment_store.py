@@ -0,0 +1,335 @@
+# Compact sentiment artifact and the loader that serves it in the original record shape.
+#
+# The sentiment output used to repeat every section's ner_entities and joined sentences next
+# to the scores. The compact artifact (<stem>.sentiment.npz in data/sentiment_analysis/) keeps
+# only what the preprocessed file does not already have:
+#
+#   posts         uint32   index of each scored (car-related) post in the preprocessed file
+#   post_offsets  uint32   CSR offsets: the scores of posts[i] are rows post_offsets[i]:post_offsets[i + 1]
+#   neg neu pos compound  float32, one row per sentence of the post, in sentence table order
+#                 (title, selftext, then every comment)
+#   category      int8     index into CATEGORIES, PENDING_CATEGORY for rows not scored yet
+#   meta          JSON: artifact version, signature of the preprocessed file, scorer, lazy
+#
+# A row is thus a reference to a preprocessed sentence: (post index, n-th sentence of the post).
+# The artifact is only valid for the preprocessed file it was built from; the loader refuses a
+# stale one. iter_sentiment_records() rebuilds the original records (sentence strings, score
+# dicts, aggregate_sentiment, ner_entities) from the two files, so readers of the old JSON output
+# keep working, and iter_sentiment_posts() serves either kind of output.
+#
+# Lazy artifacts (sentiment_analysis.py --lazy) hold scores for the sentences with a CAR_BRAND or
+# CAR_MODEL entity only; the other rows are NaN. Readers pass the scope they need: "entities"
+# (those sentences), "sections" (every sentence of a section that has one) or "all". Pending rows
+# inside the scope are scored on first access, with the artifact's scorer, and kept in
+# data/cache/sentiment/ so later reads find them. A section's aggregate_sentiment is derived only
+# once all its rows are scored, and is None before that.
+import os
+import sys
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from utils.car_relevance import IRRELEVANT_LINE_PREFIX, has_car_entity
+from utils.checkpoint import input_signature
+from utils.corpus_io import corpus_files, corpus_stem, find_corpus_file, iter_chunks, iter_indexed_records, iter_records
+
+PREPROCESSED_DIR = Path("data/preprocessed_data")
+SENTIMENT_DIR = Path("data/sentiment_analysis")
+MATERIALIZED_DIR = Path("data/cache/sentiment")
+SENTIMENT_ARTIFACT_SUFFIX = ".sentiment.npz"
+
+# Bumped whenever the arrays or their meaning change
+ARTIFACT_VERSION = 1
+CATEGORIES = ("negative", "neutral", "positive")
+PENDING_CATEGORY = -1
+SCORE_COLUMNS = ("neg", "neu", "pos", "compound")
+# Decimals polarity_scores() rounds to; float32 values are rounded back to them on load
+SCORE_DIGITS = {"neg": 3, "neu": 3, "pos": 3, "compound": 4}
+SCOPES = ("entities", "sections", "all")
+# Posts whose pending rows are scored together on access
+MATERIALIZE_CHUNK_SIZE = 500
+
+def categorize_sentiment(compound_score: float, pos_threshold=0.05, neg_threshold=-0.05) -> str:
+    if compound_score >= pos_threshold:
+        return "positive"
+    elif compound_score <= neg_threshold:
+        return "negative"
+    else:
+        return "neutral"
+
+# Category codes of float32 compound scores; NaN (not scored yet) gets PENDING_CATEGORY.
+def category_codes(compound):
+    codes = np.where(compound >= np.float32(0.05), 2, np.where(compound <= np.float32(-0.05), 0, 1))
+    codes[np.isnan(compound)] = PENDING_CATEGORY
+    return codes.astype(np.int8)
+
+def artifact_path(directory, stem: str) -> Path:
+    return Path(directory) / f"{stem}{SENTIMENT_ARTIFACT_SUFFIX}"
+
+# {stem: path} of the compact artifacts in a directory.
+def sentiment_artifacts(directory=SENTIMENT_DIR):
+    directory = Path(directory)
+    if not directory.exists():
+        return {}
+    return {
+        path.name[:-len(SENTIMENT_ARTIFACT_SUFFIX)]: path
+        for path in sorted(directory.glob(f"*{SENTIMENT_ARTIFACT_SUFFIX}")) if not path.name.startswith(".")
+    }
+
+# Every sentiment output file of a directory, artifacts and JSON records alike.
+def sentiment_output_files(directory=SENTIMENT_DIR):
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(list(sentiment_artifacts(directory).values()) + corpus_files(directory))
+
+# Deletes the other kind of output for a stem, so readers never see a post twice.
+def remove_other_sentiment_outputs(directory, stem: str, keep: Path):
+    artifact = artifact_path(directory, stem)
+    if artifact != Path(keep) and artifact.exists():
+        artifact.unlink()
+    records = find_corpus_file(directory, stem)
+    while records is not None and records != Path(keep):
+        records.unlink()
+        records = find_corpus_file(directory, stem)
+
+# Preprocessed title, selftext and comment bodies of a post, in row order.
+def post_sections(post):
+    yield post.get("preprocessed_title", {})
+    yield post.get("preprocessed_selftext", {})
+    for comment in post.get("comments", []):
+        yield comment.get("preprocessed_body", {})
+
+# Flags of one section's sentences: True where the sentence has a car entity.
+def entity_flags(section):
+    ner_entities = section.get("ner_entities", [])
+    return [
+        has_car_entity(ner_entities[idx]) if idx < len(ner_entities) else False
+        for idx in range(len(section.get("cleaned_sentences_tokens", [])))
+    ]
+
+# Writes the artifact for `post_scores`: (post index, [(neg, neu, pos, compound) or None, ...])
+# pairs in file order, with one entry per sentence of the post; None marks a sentence left for
+# later (lazy runs).
+def save_sentiment_artifact(path, preprocessed_file, post_scores, scorer: str, lazy: bool = False):
+    pending = (np.nan,) * len(SCORE_COLUMNS)
+    posts, offsets, rows = [], [0], []
+    for post_index, scores in post_scores:
+        posts.append(post_index)
+        rows.extend(pending if values is None else values for values in scores)
+        offsets.append(len(rows))
+    scores = np.array(rows, dtype=np.float32).reshape(-1, len(SCORE_COLUMNS))
+    meta = {"artifact_version": ARTIFACT_VERSION, "preprocessed": input_signature(preprocessed_file),
+            "scorer": scorer, "lazy": lazy}
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            posts=np.array(posts, dtype=np.uint32),
+            post_offsets=np.array(offsets, dtype=np.uint32),
+            category=category_codes(scores[:, SCORE_COLUMNS.index("compound")]),
+            meta=np.array(json.dumps(meta)),
+            **{name: np.ascontiguousarray(scores[:, i]) for i, name in enumerate(SCORE_COLUMNS)},
+        )
+    os.replace(tmp_path, path)
+    return len(posts), len(rows)
+
+# Engine scoring pending rows, loaded on first use (src/nlp/sentiment_engine.py)
+@lru_cache(maxsize=None)
+def get_engine(scorer: str):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "nlp"))
+    from sentiment_engine import SentimentEngine
+    return SentimentEngine(scorer=scorer)
+
+class SentimentArtifact:
+    def __init__(self, path, materialized_dir=MATERIALIZED_DIR):
+        self.path = Path(path)
+        with np.load(path) as data:
+            self.meta = json.loads(str(data["meta"]))
+            self.posts = data["posts"]
+            self.post_offsets = data["post_offsets"]
+            self.category = data["category"]
+            self.scores = {name: data[name] for name in SCORE_COLUMNS}
+        if self.meta.get("artifact_version") != ARTIFACT_VERSION:
+            raise ValueError(f"{path} has artifact version {self.meta.get('artifact_version')}, "
+                             f"expected {ARTIFACT_VERSION}; rerun sentiment_analysis.py")
+        self.cache_path = Path(materialized_dir) / f"{self.path.name[:-len(SENTIMENT_ARTIFACT_SUFFIX)]}.npz"
+        self.cached_rows = np.array([], dtype=np.int64)
+        self.materialized = []
+        if self.meta.get("lazy"):
+            self.load_materialized()
+
+    # Raises if the preprocessed file changed since the artifact was written.
+    def check_source(self, preprocessed_file):
+        if json.loads(json.dumps(input_signature(preprocessed_file))) != self.meta["preprocessed"]:
+            raise ValueError(f"Sentiment artifact is stale for {preprocessed_file}; rerun sentiment_analysis.py")
+
+    def __len__(self):
+        return len(self.posts)
+
+    def has_pending(self) -> bool:
+        return bool((self.category == PENDING_CATEGORY).any())
+
+    # Fills in rows scored on earlier accesses, if they were scored for this very artifact.
+    def load_materialized(self):
+        if not self.cache_path.exists():
+            return
+        with np.load(self.cache_path) as data:
+            if json.loads(str(data["artifact"])) != json.loads(json.dumps(input_signature(self.path))):
+                return
+            rows = data["rows"].astype(np.int64)
+            for name in SCORE_COLUMNS:
+                self.scores[name][rows] = data[name]
+        self.category[rows] = category_codes(self.scores["compound"][rows])
+        self.cached_rows = rows
+
+    # Scores the given pending rows; `sentences` holds their joined cleaned sentences.
+    def materialize(self, rows, sentences):
+        scores = get_engine(self.meta["scorer"]).score(sentences)
+        values = np.array([scores[sentence] for sentence in sentences], dtype=np.float32).reshape(-1, len(SCORE_COLUMNS))
+        for i, name in enumerate(SCORE_COLUMNS):
+            self.scores[name][rows] = values[:, i]
+        self.category[rows] = category_codes(values[:, SCORE_COLUMNS.index("compound")])
+        self.materialized.extend(rows)
+
+    # Saves every row scored on access so far, written atomically like the artifact.
+    def save_materialized(self):
+        if not self.materialized:
+            return
+        rows = np.union1d(self.cached_rows, np.array(self.materialized, dtype=np.int64))
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, artifact=np.array(json.dumps(input_signature(self.path))), rows=rows.astype(np.uint32),
+                     **{name: self.scores[name][rows] for name in SCORE_COLUMNS})
+        os.replace(tmp_path, self.cache_path)
+        print(f"🧮 Scored {len(self.materialized):,} sentences of {self.path.name} on first access")
+        self.cached_rows = rows
+        self.materialized = []
+
+    # Pending rows of the i-th scored post inside `scope`, with their sentences.
+    def pending_rows(self, i: int, post, scope: str):
+        row = int(self.post_offsets[i])
+        rows, sentences = [], []
+        for section in post_sections(post):
+            flags = entity_flags(section)
+            in_section_scope = scope == "all" or (scope == "sections" and any(flags))
+            for tokens, flag in zip(section.get("cleaned_sentences_tokens", []), flags):
+                if self.category[row] == PENDING_CATEGORY and (in_section_scope or flag):
+                    rows.append(row)
+                    sentences.append(" ".join(tokens))
+                row += 1
+        return rows, sentences
+
+    # Score dicts (rounded like polarity_scores()) and categories of the i-th scored post's
+    # sentences; (None, None) for rows not scored yet.
+    def post_sentences(self, i: int):
+        start, end = int(self.post_offsets[i]), int(self.post_offsets[i + 1])
+        columns = {name: self.scores[name][start:end].tolist() for name in SCORE_COLUMNS}
+        categories = self.category[start:end].tolist()
+        for row in range(end - start):
+            if categories[row] == PENDING_CATEGORY:
+                yield None, None
+                continue
+            scores = {name: round(columns[name][row], SCORE_DIGITS[name]) for name in SCORE_COLUMNS}
+            yield scores, CATEGORIES[categories[row]]
+
+# {"sentence_sentiments": [...], "aggregate_sentiment": {...}} for one section, as sentiment_analysis.py
+# builds it. The aggregate is None while some of the section's sentences are not scored.
+def section_sentiment(token_lists, scored):
+    sentence_sentiments = []
+    for tokens, (scores, category) in zip(token_lists, scored):
+        sentence_sentiments.append({"sentence": " ".join(tokens), "scores": scores, "category": category})
+    if any(s["scores"] is None for s in sentence_sentiments):
+        return {"sentence_sentiments": sentence_sentiments, "aggregate_sentiment": None}
+    compound_scores = [s["scores"]["compound"] for s in sentence_sentiments]
+    avg_compound = sum(compound_scores) / len(compound_scores) if compound_scores else 0.0
+    return {
+        "sentence_sentiments": sentence_sentiments,
+        "aggregate_sentiment": {
+            "average_compound": round(avg_compound, 4),
+            "overall_category": categorize_sentiment(avg_compound)
+        }
+    }
+
+# The original sentiment record of a preprocessed post from its artifact rows.
+def build_sentiment_record(post, scored):
+    scored = iter(scored)
+    def section(data):
+        token_lists = data.get("cleaned_sentences_tokens", [])
+        rows = [next(scored) for _ in token_lists]
+        return {"sentiment": section_sentiment(token_lists, rows), "ner_entities": data.get("ner_entities", [])}
+
+    record = {"id": post.get("id", "")}
+    record["title_sentiment"] = section(post.get("preprocessed_title", {}))
+    record["selftext_sentiment"] = section(post.get("preprocessed_selftext", {}))
+    record["comments_sentiment"] = []
+    for comment in post.get("comments", []):
+        body = section(comment.get("preprocessed_body", {}))
+        record["comments_sentiment"].append({"id": comment.get("id", ""), **body})
+    return record
+
+# (post, sentiment record or None) for the posts of a preprocessed file, from its artifact.
+# Pending rows inside `scope` are scored a chunk of posts at a time before the records are built.
+def iter_artifact_posts(preprocessed_file, artifact_file, scope="all", skip_prefix=None):
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown sentiment scope '{scope}', expected one of {SCOPES}")
+    artifact = SentimentArtifact(artifact_file)
+    artifact.check_source(preprocessed_file)
+    lazy = artifact.has_pending()
+
+    def matched():
+        position = 0
+        for index, post in iter_indexed_records(preprocessed_file, skip_prefix=skip_prefix):
+            if position < len(artifact) and artifact.posts[position] == index:
+                yield post, position
+                position += 1
+            else:
+                yield post, None
+
+    try:
+        for chunk in iter_chunks(matched(), MATERIALIZE_CHUNK_SIZE):
+            if lazy:
+                rows, sentences = [], []
+                for post, position in chunk:
+                    if position is not None:
+                        post_rows, post_sentences = artifact.pending_rows(position, post, scope)
+                        rows += post_rows
+                        sentences += post_sentences
+                if rows:
+                    artifact.materialize(rows, sentences)
+            for post, position in chunk:
+                if position is None:
+                    yield post, None
+                else:
+                    yield post, build_sentiment_record(post, artifact.post_sentences(position))
+    finally:
+        artifact.save_materialized()
+
+def iter_posts_with_artifact(preprocessed_file, artifact_file, scope="all"):
+    yield from iter_artifact_posts(preprocessed_file, artifact_file, scope)
+
+# Sentiment records of a preprocessed file's scored posts, from its artifact. Irrelevant
+# JSON Lines posts are skipped unparsed, as they were never scored.
+def iter_sentiment_records(preprocessed_file, artifact_file, scope="all"):
+    for _, record in iter_artifact_posts(preprocessed_file, artifact_file, scope, skip_prefix=IRRELEVANT_LINE_PREFIX):
+        if record is not None:
+            yield record
+
+# Sentiment records of every stem: built from the artifact where there is one, read from the
+# JSON records otherwise.
+def iter_sentiment_posts(sentiment_dir=SENTIMENT_DIR, preprocessed_dir=PREPROCESSED_DIR, scope="all"):
+    artifacts = sentiment_artifacts(sentiment_dir)
+    for path in corpus_files(sentiment_dir) if Path(sentiment_dir).exists() else []:
+        if corpus_stem(path) not in artifacts:
+            yield from iter_records(path)
+    for stem, artifact_file in artifacts.items():
+        preprocessed_file = find_corpus_file(preprocessed_dir, stem)
+        if preprocessed_file is None:
+            raise FileNotFoundError(f"No preprocessed file for the sentiment artifact {artifact_file}")
+        yield from iter_sentiment_records(preprocessed_file, artifact_file, scope)
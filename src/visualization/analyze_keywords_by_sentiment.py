@@ -1,17 +1,23 @@
 import os
+import sys
 import json
 from pathlib import Path
 from collections import defaultdict, Counter
-import matplotlib.pyplot as plt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.car_catalog import get_catalog
+from utils.sentiment_store import iter_sentiment_posts
+from utils.entity_index import brand_term, entity_index_available, matching_sentences, model_term
 
 # Constants
 SENTIMENT_DIR = Path("data/sentiment_analysis")
-CAR_DATA_PATH = Path("data/car_data.json")
 TOP_N = 10
 
-# Input
-brand_input = input("Enter car brand: ").strip().lower()
-model_input = input("Enter model (leave blank to include all models): ").strip().lower() or None
+# Input, resolved to the catalog's spelling ("f150" -> "f-150")
+catalog = get_catalog()
+brand_input = catalog.canonical_brand(input("Enter car brand: ").strip())
+model_input = input("Enter model (leave blank to include all models): ").strip()
+model_input = catalog.canonical_model(model_input, brand_input) if model_input else None
 
 # Track keywords by sentiment
 keywords_by_sentiment = {
@@ -20,12 +26,9 @@ keywords_by_sentiment = {
     "negative": Counter()
 }
 
-# Load known car brand/model names
-with open(CAR_DATA_PATH, "r", encoding="utf-8") as f:
-    car_data = json.load(f)
-
-brand_names = set(brand.lower() for brand in car_data.get("brands", {}))
-model_names = set(model.lower() for models in car_data.get("brands", {}).values() for model in models)
+# Known car brand/model names
+brand_names = catalog.brand_names
+model_names = catalog.model_names
 
 # Words to exclude manually
 MANUAL_EXCLUDES = {"car", "im", "dont", "get", "want", "would", "lol", "yeah", "oh", "like", "thing", "know"}
@@ -58,29 +61,38 @@ def extract_keywords_by_sentiment(section):
                 mentioned_model = True
 
         if mentioned_brand and mentioned_model:
-            # Exclude known brand/model words and other irrelevant tokens
-            for token in sentence_tokens:
-                token_lower = token.lower()
-                if (
-                    token_lower not in brand_names and
-                    token_lower not in model_names and
-                    token_lower not in MANUAL_EXCLUDES and
-                    len(token_lower) > 2 and
-                    not token_lower.isdigit()
-                ):
-                    keywords_by_sentiment[sentiment_category][token_lower] += 1
-
-# Process all files
-for file in SENTIMENT_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            extract_keywords_by_sentiment(post.get("title_sentiment"))
-            extract_keywords_by_sentiment(post.get("selftext_sentiment"))
-            for comment in post.get("comments_sentiment", []):
-                extract_keywords_by_sentiment(comment)
+            count_keywords(sentiment_category, sentence_tokens)
+
+def count_keywords(sentiment_category, sentence_tokens):
+    # Exclude known brand/model words and other irrelevant tokens
+    for token in sentence_tokens:
+        token_lower = token.lower()
+        if (
+            token_lower not in brand_names and
+            token_lower not in model_names and
+            token_lower not in MANUAL_EXCLUDES and
+            len(token_lower) > 2 and
+            not token_lower.isdigit()
+        ):
+            keywords_by_sentiment[sentiment_category][token_lower] += 1
+
+# Read only the matching sentences via the entity index, or process all files
+if entity_index_available():
+    terms = [brand_term(brand_input)] + ([model_term(model_input)] if model_input else [])
+    for row in matching_sentences(all_of=terms, columns=["tokens", "category"]):
+        if row["category"] and row["tokens"]:
+            count_keywords(row["category"], row["tokens"])
+else:
+    # Only sentences with car entities are read, so lazily stored sentiment is not scored further
+    for post in iter_sentiment_posts(SENTIMENT_DIR, scope="entities"):
+        extract_keywords_by_sentiment(post.get("title_sentiment"))
+        extract_keywords_by_sentiment(post.get("selftext_sentiment"))
+        for comment in post.get("comments_sentiment", []):
+            extract_keywords_by_sentiment(comment)
 
 # Plot separate figure for each sentiment, sorted by frequency
+import matplotlib.pyplot as plt
+
 output_dir = Path("data/visualizations/keywords") / brand_input.lower()
 output_dir.mkdir(parents=True, exist_ok=True)
 
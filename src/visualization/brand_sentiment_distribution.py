@@ -1,52 +1,14 @@
 import os
-import json
+import sys
 from pathlib import Path
-from collections import defaultdict, Counter
 import matplotlib.pyplot as plt
 import pandas as pd
 
-# Path to sentiment analysis data
-SENTIMENT_DIR = Path("data/sentiment_analysis")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.aggregates import get_aggregate
 
-# Collect brand sentiment counts
-brand_sentiments = defaultdict(Counter)
-
-def extract_brands(ner_entities):
-    brands = set()
-    for sentence_entities in ner_entities:
-        for ent in sentence_entities:
-            if ent.get("entity_group") == "CAR_BRAND":
-                brands.add(ent["word"].lower())
-    return brands
-
-def process_post(post):
-    # Sentiment sections
-    sections = [
-        ("title_sentiment", post.get("title_sentiment")),
-        ("selftext_sentiment", post.get("selftext_sentiment")),
-    ]
-
-    for section_key, section in sections:
-        if not section:
-            continue
-        sentiment = section.get("sentiment", {}).get("aggregate_sentiment", {}).get("overall_category")
-        entities = section.get("ner_entities", [])
-        for brand in extract_brands(entities):
-            brand_sentiments[brand][sentiment] += 1
-
-    for comment in post.get("comments_sentiment", []):
-        sentiment = comment.get("sentiment", {}).get("aggregate_sentiment", {}).get("overall_category")
-        entities = comment.get("ner_entities", [])
-        for brand in extract_brands(entities):
-            brand_sentiments[brand][sentiment] += 1
-
-# Load all JSON files
-for file in SENTIMENT_DIR.glob("*.json"):
-    print(f"📥 Processing {file.name}")
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            process_post(post)
+# Brand sentiment counts per section (overall section sentiment), from the shared aggregates bundle
+brand_sentiments = get_aggregate("brand_section_sentiment")
 
 # Convert to DataFrame
 df = pd.DataFrame(brand_sentiments).T.fillna(0).astype(int)
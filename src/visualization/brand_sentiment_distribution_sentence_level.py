@@ -1,53 +1,14 @@
 import os
-import json
+import sys
 from pathlib import Path
-from collections import defaultdict, Counter
 import matplotlib.pyplot as plt
 import pandas as pd
 
-# Path to sentiment analysis data
-SENTIMENT_DIR = Path("data/sentiment_analysis")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.aggregates import get_aggregate
 
-# Collect brand sentiment counts
-brand_sentiments = defaultdict(Counter)
-
-def extract_brands_from_sentence(entities):
-    return {ent["word"].lower() for ent in entities if ent.get("entity_group") == "CAR_BRAND"}
-
-def process_section(sentiments, entities):
-    # Match sentence sentiment to sentence NER entities
-    for sent_data, ner_data in zip(sentiments, entities):
-        sentiment = sent_data.get("category")
-        brands = extract_brands_from_sentence(ner_data)
-        for brand in brands:
-            brand_sentiments[brand][sentiment] += 1
-
-def process_post(post):
-    # Process title
-    title_data = post.get("title_sentiment", {})
-    title_sentiments = title_data.get("sentiment", {}).get("sentence_sentiments", [])
-    title_entities = title_data.get("ner_entities", [])
-    process_section(title_sentiments, title_entities)
-
-    # Process selftext
-    selftext_data = post.get("selftext_sentiment", {})
-    selftext_sentiments = selftext_data.get("sentiment", {}).get("sentence_sentiments", [])
-    selftext_entities = selftext_data.get("ner_entities", [])
-    process_section(selftext_sentiments, selftext_entities)
-
-    # Process comments
-    for comment in post.get("comments_sentiment", []):
-        sentiments = comment.get("sentiment", {}).get("sentence_sentiments", [])
-        entities = comment.get("ner_entities", [])
-        process_section(sentiments, entities)
-
-# Load all JSON files
-for file in SENTIMENT_DIR.glob("*.json"):
-    print(f"📥 Processing {file.name}")
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            process_post(post)
+# Brand sentiment counts per sentence, from the shared aggregates bundle
+brand_sentiments = get_aggregate("brand_sentence_sentiment")
 
 # Convert to DataFrame
 df = pd.DataFrame(brand_sentiments).T.fillna(0).astype(int)
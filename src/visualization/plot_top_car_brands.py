@@ -1,33 +1,18 @@
 import os
-import json
+import sys
 from pathlib import Path
 from collections import Counter
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.aggregates import get_aggregate
+
 # Paths
-DATA_DIR = Path("data/preprocessed_data")
 OUTPUT_DIR = Path("data/visualizations")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Counter for car brands
-brand_counter = Counter()
-
-def extract_brands_from_entities(entities):
-    for sentence_entities in entities:
-        for ent in sentence_entities:
-            if ent.get("entity_group") == "CAR_BRAND":
-                brand = ent.get("word", "").lower()
-                brand_counter[brand] += 1
-
-# Process each file
-for file in DATA_DIR.glob("*.json"):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            extract_brands_from_entities(post.get("preprocessed_title", {}).get("ner_entities", []))
-            extract_brands_from_entities(post.get("preprocessed_selftext", {}).get("ner_entities", []))
-            for comment in post.get("comments", []):
-                extract_brands_from_entities(comment.get("preprocessed_body", {}).get("ner_entities", []))
+# Counter for car brands, from the shared aggregates bundle
+brand_counter = Counter(get_aggregate("brand_counts"))
 
 # Top 10 brands
 top_brands = brand_counter.most_common(10)
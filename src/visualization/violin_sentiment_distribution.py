@@ -1,56 +1,19 @@
 import os
-import json
+import sys
 from pathlib import Path
-from collections import defaultdict
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-from tqdm import tqdm
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.aggregates import get_aggregate
 
 # Paths
-SENTIMENT_DIR = Path("data/sentiment_analysis")
 OUTPUT_PATH = Path("data/visualizations")
 OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
 
-# Collect compound scores per brand
-brand_scores = defaultdict(list)
-
-def extract_brands(entities):
-    return {ent["word"].lower() for ent in entities if ent.get("entity_group") == "CAR_BRAND"}
-
-def process_section(sentiments, entities):
-    for sent_data, ner_data in zip(sentiments, entities):
-        compound = sent_data.get("scores", {}).get("compound")
-        if compound is None:
-            continue
-        brands = extract_brands(ner_data)
-        for brand in brands:
-            brand_scores[brand].append(compound)
-
-def process_post(post):
-    title = post.get("title_sentiment", {})
-    selftext = post.get("selftext_sentiment", {})
-    process_section(
-        title.get("sentiment", {}).get("sentence_sentiments", []),
-        title.get("ner_entities", []),
-    )
-    process_section(
-        selftext.get("sentiment", {}).get("sentence_sentiments", []),
-        selftext.get("ner_entities", []),
-    )
-    for comment in post.get("comments_sentiment", []):
-        process_section(
-            comment.get("sentiment", {}).get("sentence_sentiments", []),
-            comment.get("ner_entities", []),
-        )
-
-# Load and process all sentiment data
-print("📊 Collecting sentiment scores...")
-for file in tqdm(SENTIMENT_DIR.glob("*.json")):
-    with open(file, "r", encoding="utf-8") as f:
-        posts = json.load(f)
-        for post in posts:
-            process_post(post)
+# Compound scores per brand, from the shared aggregates bundle
+brand_scores = get_aggregate("brand_compound_scores")
 
 # Get top 10 brands by volume
 top_brands = sorted(brand_scores.items(), key=lambda x: len(x[1]), reverse=True)[:10]
@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "nlp" / "preprocess"))
+from ner_cascade import might_carry_entities
+from utils.phrase_matcher import TokenPhraseMatcher
+
+COMMON_WORDS = frozenset({"i", "is", "a", "the", "just", "my", "it", "to", "was", "of"})
+
+def gazetteer():
+    matcher = TokenPhraseMatcher()
+    matcher.add(["toyota"], ("CAR_BRAND", "toyota"))
+    matcher.add(["camry"], ("CAR_MODEL", "camry"))
+    matcher.add(["land", "cruiser"], ("CAR_MODEL", "land cruiser"))
+    matcher.add(["is"], ("CAR_MODEL", "is"))
+    return matcher
+
+def carries(sentence):
+    return might_carry_entities(sentence.split(), gazetteer(), COMMON_WORDS)
+
+def test_ordinary_sentences_skip_bert():
+    for sentence in [
+        "Just bought a set of tires yesterday",
+        "Bought new brakes and they squeal",
+        "Honestly the dealer was great",
+        "Anyone else hear a rattle when braking ?",
+        '" Thanks for the help everyone',
+        "It is what it is",
+        "I think I need new wipers",
+    ]:
+        assert not carries(sentence), sentence
+
+def test_capitalized_words_after_the_first_go_to_bert():
+    assert carries("Took it to Jiffy Lube last week")
+    assert carries("We drove up to Denver")
+
+def test_sentence_initial_names_go_to_bert():
+    assert carries("BMW parts are expensive")
+    assert carries("McLaren service costs a fortune")
+    assert carries("Toyota makes reliable cars")
+    assert carries("Land Cruiser prices are wild")
+
+def test_digits_and_catalog_matches_go_to_bert():
+    assert carries("bought it in 2019")
+    assert carries("my camry needs brakes")
@@ -0,0 +1,25 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "nlp" / "preprocess"))
+from sentence_cache import SentenceCache
+
+def last_used(path, cache, sentence):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT last_used FROM sentences WHERE key = ?", (cache.key(sentence),)).fetchone()[0]
+
+def test_hit_is_saved_on_close(tmp_path, monkeypatch):
+    path = tmp_path / "cache.sqlite"
+    cache = SentenceCache(path, namespace="test")
+    monkeypatch.setattr("sentence_cache.time.time", lambda: 1000.0)
+    cache.put("The Camry is great", ["camry", "great"], [["CAR_MODEL", "camry"]])
+    cache.close()
+
+    cache = SentenceCache(path, namespace="test")
+    monkeypatch.setattr("sentence_cache.time.time", lambda: 2000.0)
+    assert cache.get("The Camry is great") == (["camry", "great"], [["CAR_MODEL", "camry"]])
+    assert last_used(path, cache, "The Camry is great") == 1000.0
+    cache.close()
+
+    assert last_used(path, cache, "The Camry is great") == 2000.0